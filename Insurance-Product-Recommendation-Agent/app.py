@@ -1,7 +1,4 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from recommendation_engine import InsuranceRecommendationEngine
 from genai_agent import GenAIAgent
 import os
@@ -850,15 +847,21 @@ st.markdown("""
     }
 </style>""", unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    """Load insurance products data"""
-    return pd.read_csv('insurance_products.csv')
+# CSV, or a columnar copy made with: python product_catalog.py convert insurance_products.csv insurance_products.arrow
+CATALOG_PATH = os.getenv('CATALOG_PATH', 'insurance_products.csv')
+# Seconds between catalog file checks; edits go live without a restart (0 disables)
+CATALOG_POLL_SECONDS = float(os.getenv('CATALOG_POLL_SECONDS', '5'))
+
+def load_data(engine):
+    """Insurance products data, shared with the engine rather than loaded a second time"""
+    return engine.catalog
 
 @st.cache_resource
 def initialize_engines():
     """Initialize recommendation engine and GenAI agent"""
-    engine = InsuranceRecommendationEngine('insurance_products.csv')
+    engine = InsuranceRecommendationEngine(CATALOG_PATH)
+    if CATALOG_POLL_SECONDS > 0:
+        engine.watch_catalog(CATALOG_POLL_SECONDS)
     ai_agent = GenAIAgent()
     return engine, ai_agent
 
@@ -974,6 +977,10 @@ def create_comparison_chart(recommendations):
     if not recommendations:
         return None
     
+    # Imported on first chart so the page renders before pandas/plotly load
+    import pandas as pd
+    import plotly.graph_objects as go
+    
     df = pd.DataFrame(recommendations)
     
     fig = go.Figure()
@@ -1097,7 +1104,7 @@ def main():
     # Initialize engines
     try:
         engine, ai_agent = initialize_engines()
-        data = load_data()
+        data = load_data(engine)
     except Exception as e:
         st.error(f"⚠️ Error initializing application: {str(e)}")
         st.info("Please ensure all required files are present and API keys are configured.")
@@ -1170,6 +1177,17 @@ def main():
             </div>
             """, unsafe_allow_html=True)
         
+        # Catalog stats come from the engine's own catalog arrays
+        st.markdown(f"""
+        <div class='info-item'>
+            <div class='info-icon'>📦</div>
+            <div>
+                <strong style='color: white; font-size: 0.9rem;'>{len(data)} Products</strong><br>
+                <span class='info-text' style='font-size: 0.8rem;'>{int(data.is_health.sum())} health plans, ages {int(data.age_min.min())}-{int(data.age_max.max())}</span>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+        
         # Quick Tips
         st.markdown("""
         <div class='sidebar-info-box'>
@@ -1397,54 +1415,50 @@ def main():
             import time
             start_time = time.time()
             
-            # Get AI analysis
-            ai_analysis = ai_agent.enhance_query_understanding(user_query)
+            # Parse the query once and share it with every stage
+            parsed_query = engine.parse_query(user_query)
             
-            # Get recommendations
-            recommendations = engine.get_recommendations(user_query, top_n=num_recommendations)
+            # Stage 1: rule-based recommendations (milliseconds)
+            recommendations = engine.get_recommendations(parsed_query, top_n=num_recommendations)
+            
+            # GenAI analysis, explanation and comparison run in the background
+            # while the cards render; their placeholders fill in as they finish
+            insights = ai_agent.stream_insights(recommendations, parsed_query) if recommendations else None
             
             processing_time = time.time() - start_time
             
             # Clear loading animation
             progress_placeholder.empty()
             
-            # Success message
-            st.markdown(f'''
-                <div class="success-message">
-                    ✅ Perfect! Found {len(recommendations)} personalized recommendations in {processing_time:.2f} seconds
-                </div>
-            ''', unsafe_allow_html=True)
+            # Success message, with time to first card and to first AI token once known
+            success_placeholder = st.empty()
+            timings = {}
             
-            if recommendations:
-                # Display AI analysis with enhanced styling
-                with st.expander("🧠 AI Analysis of Your Query", expanded=True):
-                    st.markdown(f'''
-                        <div class="ai-analysis">
-                            <h4>🤖 What Our AI Understood:</h4>
-                            {ai_analysis.get('ai_analysis', 'Analysis not available')}
-                        </div>
-                    ''', unsafe_allow_html=True)
-                
-                # Generate personalized explanation
-                personalized_explanation = ai_agent.generate_personalized_explanation(
-                    recommendations, user_query
-                )
-                
-                # Display explanation with enhanced styling
-                
-                st.markdown(f'''
-                    <div class="explanation-box">
-                        <h4>📋 Recommendation Summary:</h4>
-                        {personalized_explanation}
+            def show_success():
+                details = ""
+                if 'first_card' in timings:
+                    details += f" · first card after {timings['first_card']:.2f}s"
+                if 'first_token' in timings:
+                    details += f" · first AI token after {timings['first_token']:.2f}s"
+                success_placeholder.markdown(f'''
+                    <div class="success-message">
+                        ✅ Perfect! Found {len(recommendations)} personalized recommendations in {processing_time:.2f} seconds{details}
                     </div>
                 ''', unsafe_allow_html=True)
+            
+            show_success()
+            
+            if recommendations:
+                # Stage 2 slots: AI analysis and summary, above the cards
+                analysis_placeholder = st.empty()
+                analysis_placeholder.info("🧠 AI analysis of your query is on its way...")
+                explanation_placeholder = st.empty()
+                explanation_placeholder.info("📋 Personalized summary is on its way...")
                 
                 # Display recommendations with better separation
                 st.markdown('<h3 class="sub-header">🏆 Your Personalized Recommendations</h3>', 
                            unsafe_allow_html=True)
                 
-                user_prefs = engine.parse_user_query(user_query)
-                
                 for i, product in enumerate(recommendations, 1):
                     # Create clear separation between recommendations
                     st.markdown(f"""
@@ -1455,14 +1469,18 @@ def main():
                         </h2>
                     </div>
                     """, unsafe_allow_html=True)
-                    explanation = engine.explain_recommendation(product, user_prefs)
+                    explanation = engine.explain_recommendation(product, parsed_query)
                     display_product_card(product, explanation)
+                    if i == 1:
+                        timings['first_card'] = time.time() - start_time
+                        show_success()
                     
                     # Add visual separator between recommendations
                     if i < len(recommendations):
                         st.markdown('<div class="product-separator"></div>', unsafe_allow_html=True)
                 
                 # Enhanced Comparison Chart
+                comparison_placeholder = None
                 if len(recommendations) > 1:
                     st.markdown('<h3 class="sub-header">📊 Interactive Product Comparison</h3>', 
                                unsafe_allow_html=True)
@@ -1471,16 +1489,8 @@ def main():
                     if chart:
                         st.plotly_chart(chart, use_container_width=True)
                     st.markdown('</div>', unsafe_allow_html=True)
-                    # AI comparison analysis with enhanced styling
-                    comparison_analysis = ai_agent.generate_comparative_analysis(recommendations)
-                    if comparison_analysis:
-                        st.markdown("### 🤔 AI-Powered Comparison Analysis")
-                        st.markdown(f'''
-                            <div class="ai-analysis">
-                                <h4>🔍 Detailed Product Comparison:</h4>
-                                {comparison_analysis}
-                            </div>
-                        ''', unsafe_allow_html=True)
+                    # Slot for the AI comparison analysis
+                    comparison_placeholder = st.empty()
                 
                 # Enhanced Additional insights
                 with st.expander("📈 Advanced Insights & Analytics", expanded=True):
@@ -1513,6 +1523,47 @@ def main():
                         st.write(f"{product['name']}: ₹{value_ratio:.0f} coverage per rupee premium")
                     
                     st.markdown('</div>', unsafe_allow_html=True)
+                
+                # Stage 3: fill the AI slots as the background calls finish
+                ai_analysis = insights['ai_analysis'].result()
+                with analysis_placeholder.container():
+                    # Display AI analysis with enhanced styling
+                    with st.expander("🧠 AI Analysis of Your Query", expanded=True):
+                        st.markdown(f'''
+                            <div class="ai-analysis">
+                                <h4>🤖 What Our AI Understood:</h4>
+                                {ai_analysis.get('ai_analysis', 'Analysis not available')}
+                            </div>
+                        ''', unsafe_allow_html=True)
+                
+                # Display explanation with enhanced styling, growing as chunks arrive
+                personalized_explanation = ""
+                for chunk in insights['explanation']:
+                    if not personalized_explanation:
+                        timings['first_token'] = time.time() - start_time
+                        show_success()
+                    personalized_explanation += chunk
+                    explanation_placeholder.markdown(f'''
+                        <div class="explanation-box">
+                            <h4>📋 Recommendation Summary:</h4>
+                            {personalized_explanation}
+                        </div>
+                    ''', unsafe_allow_html=True)
+                
+                # AI comparison analysis with enhanced styling
+                comparison_analysis = ""
+                for chunk in insights['comparison']:
+                    comparison_analysis += chunk
+                    if comparison_placeholder is None:
+                        continue
+                    with comparison_placeholder.container():
+                        st.markdown("### 🤔 AI-Powered Comparison Analysis")
+                        st.markdown(f'''
+                            <div class="ai-analysis">
+                                <h4>🔍 Detailed Product Comparison:</h4>
+                                {comparison_analysis}
+                            </div>
+                        ''', unsafe_allow_html=True)
         
             # Check if no recommendations found
             if not recommendations:
@@ -0,0 +1,673 @@
+"""
+Performance benchmarks for the recommendation engine
+Run: python benchmark.py age --sizes 10000 100000 1000000
+     python benchmark.py parse
+     python benchmark.py topn --sizes 10000 100000 1000000
+     python benchmark.py memory --sizes 10000 100000 1000000
+     python benchmark.py load --sizes 10000 100000 1000000
+     python benchmark.py snapshot --sizes 10000 100000
+     python benchmark.py reload --sizes 100000 1000000 --changes 100
+     python benchmark.py updates --sizes 100000 1000000 --readers 4
+     python benchmark.py streaming --sizes 200000 1000000 --chunk-size 100000
+     python benchmark.py shards --sizes 100000 1000000 --workers 1 2 4 8 16 32
+     python benchmark.py churn --products 3000 --readers 8 --workers 4 --duration 5
+     python benchmark.py genai --latency lognormal:0.8:0.5 --queries 10
+     python benchmark.py imports
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from product_catalog import ProductCatalog
+from product_index import AgeEligibilityIndex
+from query_parser import QueryParser, parse_user_query_legacy
+from recommendation_engine import CatalogState, InsuranceRecommendationEngine, select_top
+
+CATALOG_PATH = 'insurance_products.csv'
+
+# Realistic user queries (README examples and app sample queries)
+QUERY_CORPUS = [
+    "College student, 20, looking for affordable health insurance with accident coverage",
+    "Recent graduate, 23, starting first job, needs basic health plan under ₹800",
+    "Engineering student, 19, wants accident coverage for bike riding",
+    "Software developer, 28, comprehensive tech professional health plan with critical illness",
+    "Data scientist, 31, wants high coverage health plan with mental health support",
+    "IT consultant, 35, needs flexible health plan for frequent travel",
+    "Uber driver, 35, accident coverage with vehicle-specific benefits and low premium",
+    "Truck driver, 42, long-distance transport, needs comprehensive accident protection",
+    "Delivery executive, 26, two-wheeler accident coverage with quick claim process",
+    "New mother, 26, maternity support with newborn care and family coverage",
+    "Pregnant woman, 29, first pregnancy, comprehensive maternity benefits",
+    "Couple planning second child, 32, enhanced maternity with twin coverage",
+    "Senior citizen, 68, with diabetes, health insurance for pre-existing conditions",
+    "Retired person, 72, comprehensive senior care with no co-pay",
+    "Elderly couple, 75, joint health plan with critical illness coverage",
+    "Startup founder, 32, executive health plan with high coverage and critical illness",
+    "Business owner, 45, premium family coverage with international treatment",
+    "Corporate executive, 38, comprehensive health plan with stress-related coverage",
+    "Doctor, 30, comprehensive professional coverage with malpractice protection",
+    "Nurse, 27, healthcare worker plan with occupational hazard coverage",
+    "Medical resident, 25, affordable health plan with study-abroad coverage",
+    "Single parent, 29, family health plan with children coverage and maternity",
+    "Divorced mother, 35, affordable family coverage for 2 children",
+    "Widower, 45, comprehensive family protection with dependent coverage",
+    "27-year-old software engineer, unmarried, diabetic, wants comprehensive health plan with critical illness under ₹2000/month",
+    "Single mother, 31, teacher, 2 children, needs family health coverage with maternity benefits and accident protection, budget ₹1500/month",
+    "Senior couple, husband 68 (heart patient), wife 65 (diabetic), need joint health plan with pre-existing condition coverage, premium flexible",
+    "Military officer, 29, posted in high-risk area, needs comprehensive health and accident coverage with family benefits",
+    "Commercial pilot, 35, frequent flyer, wants health plan with aviation-specific benefits and international coverage",
+    "Construction worker, 40, high-risk job, needs accident coverage with occupational hazard benefits, affordable premium",
+    "Cancer survivor, 38, remission for 2 years, looking for health plan that covers follow-up care and potential recurrence",
+    "Heart patient, 55, recent bypass surgery, needs specialized cardiac care coverage with no waiting period",
+    "Pregnant woman, 28, high-risk pregnancy, twins expected, comprehensive maternity coverage needed"
+]
+
+
+def make_synthetic_catalog(n_products: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a large catalog by resampling the bundled products and jittering
+    their numeric columns, so name keywords and value ranges stay realistic
+    """
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(CATALOG_PATH)
+    catalog = base.iloc[rng.integers(0, len(base), n_products)].reset_index(drop=True)
+
+    age_min = np.clip(catalog['age_min'].to_numpy() + rng.integers(-3, 4, n_products), 0, 99)
+    age_span = np.maximum(catalog['age_max'].to_numpy() - catalog['age_min'].to_numpy(), 1)
+    catalog['age_min'] = age_min
+    catalog['age_max'] = np.clip(age_min + age_span + rng.integers(-3, 4, n_products), age_min, 120)
+    catalog['monthly_premium'] = np.maximum(
+        (catalog['monthly_premium'].to_numpy() * rng.uniform(0.8, 1.2, n_products)).astype(np.int64), 100)
+    catalog['coverage'] = (catalog['coverage'].to_numpy() * rng.uniform(0.8, 1.2, n_products)).astype(np.int64)
+    catalog['co_pay'] = np.clip(catalog['co_pay'].to_numpy() + rng.integers(-5, 6, n_products), 0, 50)
+    catalog['id'] = np.arange(1, n_products + 1)
+    return catalog
+
+
+def time_call(fn: Callable, repeat: int = 20) -> float:
+    """Median wall time of fn() in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def benchmark_age_filter(sizes):
+    """Per-query DataFrame age filtering vs the precomputed AgeEligibilityIndex"""
+    ages = [None, 5, 19, 24, 35, 47, 62, 85]
+    print(f"{'products':>10} {'filter+copy':>13} {'index mask':>12} {'speedup':>9} {'build':>10} "
+          f"{'index MB':>9} {'unpacked MB':>12}")
+    for n_products in sizes:
+        catalog = make_synthetic_catalog(n_products)
+
+        def legacy_filter():
+            # filter_by_age followed by the copy get_recommendations made
+            for age in ages:
+                if age is None:
+                    eligible = catalog
+                else:
+                    eligible = catalog[(catalog['age_min'] <= age) & (catalog['age_max'] >= age)]
+                eligible.copy()
+
+        start = time.perf_counter()
+        index = AgeEligibilityIndex(catalog['age_min'].to_numpy(), catalog['age_max'].to_numpy())
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def index_lookup():
+            for age in ages:
+                index.mask(age)
+
+        legacy_ms = time_call(legacy_filter) / len(ages)
+        index_ms = time_call(index_lookup) / len(ages)
+        print(f"{n_products:>10,} {legacy_ms:>10.3f} ms {index_ms:>9.5f} ms {legacy_ms / index_ms:>8.0f}x "
+              f"{build_ms:>7.1f} ms {index.nbytes / 1e6:>9.1f} {index.unpacked_nbytes / 1e6:>12.1f}")
+
+
+# Ages written with non-ASCII digits, which the single-pass pattern hands to the legacy parser
+UNICODE_DIGIT_QUERIES = [
+    "उम्र ४५ साल, married, need health cover",
+    "١٢ year old child, accident plan",
+    "I am ４５ and a software engineer",
+    "4٥ year old teacher looking for cheap critical illness cover"
+]
+
+
+def benchmark_query_parser(repeat: int):
+    """Original multi-scan parse_user_query vs the compiled single-pass QueryParser"""
+    parser = QueryParser()
+    single_pass = QueryParser(max_single_pass_chars=None)
+    paragraphs = [' '.join(QUERY_CORPUS[i:i + 8]) for i in range(0, len(QUERY_CORPUS), 8)]
+
+    for corpus in (QUERY_CORPUS, paragraphs, UNICODE_DIGIT_QUERIES):
+        mismatches = [query for query in corpus if single_pass.parse(query) != parse_user_query_legacy(query)]
+        if mismatches:
+            raise AssertionError(f"QueryParser output differs for: {mismatches}")
+
+    print(f"{'corpus':>10} {'avg chars':>10} {'legacy':>10} {'single pass':>12} {'QueryParser':>12}")
+    for label, corpus in (('queries', QUERY_CORPUS), ('paragraphs', paragraphs)):
+        timings = [time_call(lambda: [parse(q) for q in corpus], repeat) * 1000 / len(corpus)
+                   for parse in (parse_user_query_legacy, single_pass.parse, parser.parse)]
+        avg_chars = sum(len(q) for q in corpus) / len(corpus)
+        print(f"{label:>10} {avg_chars:>10.0f} " + ' '.join(f"{us:>9.2f} us" for us in timings))
+
+
+def benchmark_top_n(sizes, top_n: int):
+    """Copy + nlargest + iterrows vs argpartition selection on the raw score array"""
+    print(f"{'products':>10} {'nlargest':>12} {'select_top':>12} {'speedup':>9}")
+    for n_products in sizes:
+        catalog = make_synthetic_catalog(n_products)
+        # Half-point scores plus a small co-pay term, so ties are as common as in real queries
+        rng = np.random.default_rng(1)
+        scores = rng.integers(0, 12, n_products) * 0.5 + (50 - catalog['co_pay'].to_numpy()) / 100
+        ids = catalog['id'].to_numpy()
+        columns = {column: catalog[column].to_numpy() for column in catalog.columns}
+
+        def legacy_top():
+            ranked = catalog.copy()
+            ranked['relevance_score'] = scores
+            return [product.to_dict() for _, product in ranked.nlargest(top_n, 'relevance_score').iterrows()]
+
+        def array_top():
+            top = select_top(scores, ids, top_n)
+            return {column: values[top].tolist() for column, values in columns.items()}
+
+        legacy_ms = time_call(legacy_top)
+        select_ms = time_call(array_top)
+        print(f"{n_products:>10,} {legacy_ms:>9.3f} ms {select_ms:>9.3f} ms {legacy_ms / select_ms:>8.0f}x")
+
+
+def benchmark_catalog_memory(sizes):
+    """Deep DataFrame footprint vs the typed ProductCatalog"""
+    print(f"{'products':>10} {'names':>8} {'DataFrame MB':>13} {'catalog MB':>11} {'ratio':>7} {'build':>10}")
+    for n_products in sizes:
+        catalog = make_synthetic_catalog(n_products)
+        # Resampled names repeat the bundled 150; real catalogs have one name per product
+        unique_names = catalog.assign(name=catalog['name'] + ' ' + catalog['id'].astype(str))
+        for label, df in (('resample', catalog), ('unique', unique_names)):
+            df_bytes = df.memory_usage(deep=True, index=False).sum()
+            start = time.perf_counter()
+            product_catalog = ProductCatalog.from_dataframe(df)
+            build_ms = (time.perf_counter() - start) * 1000
+            print(f"{n_products:>10,} {label:>8} {df_bytes / 1e6:>13.1f} {product_catalog.nbytes / 1e6:>11.2f} "
+                  f"{df_bytes / product_catalog.nbytes:>6.1f}x {build_ms:>7.0f} ms")
+
+
+def benchmark_catalog_load(sizes):
+    """Cold catalog load from CSV vs the converted Parquet and memory-mapped Arrow files"""
+    formats = ('csv', 'parquet', 'arrow')
+    print(f"{'products':>10} " + ' '.join(f"{label:>12}" for label in formats))
+    with tempfile.TemporaryDirectory() as directory:
+        for n_products in sizes:
+            paths = {label: os.path.join(directory, f"catalog_{n_products}.{label}") for label in formats}
+            make_synthetic_catalog(n_products).to_csv(paths['csv'], index=False)
+            catalog = ProductCatalog.from_csv(paths['csv'])
+            catalog.save(paths['parquet'])
+            catalog.save(paths['arrow'])
+            timings = [time_call(lambda: ProductCatalog.from_file(paths[label]), repeat=5) for label in formats]
+            print(f"{n_products:>10,} " + ' '.join(f"{ms:>9.1f} ms" for ms in timings))
+
+
+def benchmark_cold_start(sizes):
+    """Engine construction from CSV and Arrow catalogs vs load_snapshot"""
+    print(f"{'products':>10} {'csv':>12} {'arrow':>12} {'snapshot':>12} {'snapshot MB':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for n_products in sizes:
+            csv_path = os.path.join(directory, f"catalog_{n_products}.csv")
+            arrow_path = os.path.join(directory, f"catalog_{n_products}.arrow")
+            snapshot_path = os.path.join(directory, f"catalog_{n_products}.snapshot")
+            make_synthetic_catalog(n_products).to_csv(csv_path, index=False)
+            ProductCatalog.from_csv(csv_path).save(arrow_path)
+            InsuranceRecommendationEngine(csv_path).save_snapshot(snapshot_path)
+
+            timings = [time_call(lambda: InsuranceRecommendationEngine(csv_path), repeat=3),
+                       time_call(lambda: InsuranceRecommendationEngine(arrow_path), repeat=3),
+                       time_call(lambda: InsuranceRecommendationEngine.load_snapshot(snapshot_path), repeat=10)]
+            print(f"{n_products:>10,} " + ' '.join(f"{ms:>9.1f} ms" for ms in timings) +
+                  f" {os.path.getsize(snapshot_path) / 1e6:>12.1f}")
+
+
+def benchmark_reload(sizes, changes: int):
+    """Applying an edited catalog as a diff vs deriving every structure again"""
+    print(f"{'products':>10} {'changes':>8} {'rebuild':>12} {'incremental':>12} {'speedup':>8}")
+    rng = np.random.default_rng(1)
+    for n_products in sizes:
+        df = make_synthetic_catalog(n_products)
+        state = CatalogState.build(ProductCatalog.from_dataframe(df), 'substring')
+
+        # A third each of price edits, renames, removals; plus as many new products
+        edited = df.copy()
+        rows = rng.choice(n_products, changes, replace=False)
+        third = max(changes // 3, 1)
+        edited.loc[rows[:third], 'monthly_premium'] += 50
+        edited.loc[rows[third:2 * third], 'name'] = 'Senior Family Care Plus'
+        added = df.iloc[rows[2 * third:]].copy()
+        added['id'] = np.arange(n_products + 1, n_products + 1 + len(added))
+        edited = pd.concat([edited.drop(rows[2 * third:]), added], ignore_index=True)
+        catalog = ProductCatalog.from_dataframe(edited)
+
+        rebuild_ms = time_call(lambda: CatalogState.build(catalog, 'substring'), repeat=3)
+        update_ms = time_call(lambda: state.updated(catalog), repeat=5)
+        print(f"{n_products:>10,} {changes:>8,} {rebuild_ms:>9.1f} ms {update_ms:>9.1f} ms "
+              f"{rebuild_ms / update_ms:>7.1f}x")
+
+
+def benchmark_updates(sizes, readers: int, duration: float):
+    """Premium upserts per second vs reader latency, alone and under contention"""
+    print(f"{'products':>10} {'mode':>16} {'updates/s':>10} {'read p50':>10} {'read p99':>10}")
+    for n_products in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'catalog.csv')
+            make_synthetic_catalog(n_products).to_csv(csv_path, index=False)
+            # No result cache: every read scores the catalog version it holds
+            engine = InsuranceRecommendationEngine(csv_path, cache_size=0)
+        parsed = [engine.parse_query(query) for query in QUERY_CORPUS]
+        rng = np.random.default_rng(0)
+
+        def run(n_readers: int, writer: bool):
+            stop = threading.Event()
+            latencies = [[] for _ in range(n_readers)]
+            updates = [0]
+
+            def read(slot):
+                for i in range(slot, 1 << 62):
+                    if stop.is_set():
+                        return
+                    start = time.perf_counter()
+                    engine.get_recommendations(parsed[i % len(parsed)], top_n=5)
+                    latencies[slot].append(time.perf_counter() - start)
+
+            def write():
+                while not stop.is_set():
+                    product = engine.catalog[int(rng.integers(len(engine.catalog)))].to_dict()
+                    product['monthly_premium'] = int(product['monthly_premium'] * rng.uniform(0.95, 1.05)) + 1
+                    engine.upsert_product(product)
+                    updates[0] += 1
+
+            threads = [threading.Thread(target=read, args=(slot,)) for slot in range(n_readers)]
+            if writer:
+                threads.append(threading.Thread(target=write))
+            for thread in threads:
+                thread.start()
+            time.sleep(duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            rate = f"{updates[0] / duration:>10.0f}" if writer else f"{'-':>10}"
+            if n_readers:
+                samples = np.concatenate([np.array(slot) for slot in latencies]) * 1000
+                return rate + f" {np.percentile(samples, 50):>7.2f} ms {np.percentile(samples, 99):>7.2f} ms"
+            return rate + f" {'-':>10} {'-':>10}"
+
+        for label, n_readers, writer in (('writer only', 0, True), (f'{readers} readers', readers, False),
+                                         (f'{readers} readers + 1w', readers, True)):
+            print(f"{n_products:>10,} {label:>16} {run(n_readers, writer)}")
+
+
+# Child process for benchmark_streaming: prints wall time and peak RSS (KB).
+# VmHWM starts afresh at exec, unlike ru_maxrss which inherits the parent's peak
+STREAMING_PROBE = '''
+import os, resource, sys, time
+from benchmark import QUERY_CORPUS
+from recommendation_engine import InsuranceRecommendationEngine
+from streaming_engine import StreamingRecommendationEngine
+mode, path, chunk_size = sys.argv[1], sys.argv[2], int(sys.argv[3])
+start = time.perf_counter()
+if mode == 'in-memory':
+    InsuranceRecommendationEngine(path, cache_size=0).get_recommendations_batch(QUERY_CORPUS, top_n=5)
+elif mode == 'streaming':
+    StreamingRecommendationEngine(path, chunk_size, cache_size=0).get_recommendations_batch(QUERY_CORPUS, top_n=5)
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if os.path.exists('/proc/self/status'):
+    with open('/proc/self/status') as status:
+        peak_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM'))
+print(time.perf_counter() - start, peak_kb)
+'''
+
+
+def benchmark_streaming(sizes, chunk_size: int):
+    """Peak memory and time of one query batch: whole catalog in memory vs streamed in chunks"""
+    from streaming_engine import compute_statistics, save_statistics
+    modes = ('baseline', 'in-memory', 'streaming')
+    print(f"{'products':>10} " + ' '.join(f"{mode:>22}" for mode in modes))
+    with tempfile.TemporaryDirectory() as directory:
+        for n_products in sizes:
+            csv_path = os.path.join(directory, f"catalog_{n_products}.csv")
+            make_synthetic_catalog(n_products).to_csv(csv_path, index=False)
+            # Stored statistics, so streaming makes a single pass
+            save_statistics(csv_path, compute_statistics(csv_path, chunk_size))
+
+            cells = []
+            for mode in modes:
+                result = subprocess.run([sys.executable, '-c', STREAMING_PROBE, mode, csv_path, str(chunk_size)],
+                                        capture_output=True, text=True, check=True)
+                seconds, peak_kb = result.stdout.split()
+                cells.append(f"{float(seconds):>6.1f} s {int(peak_kb) / 1024:>7.0f} MB RSS")
+            print(f"{n_products:>10,} " + ' '.join(f"{cell:>22}" for cell in cells))
+
+
+def benchmark_shards(sizes, workers, batch: int):
+    """Single-query latency and batch throughput, in-process (1 worker) vs sharded over N processes"""
+    from sharded_executor import ShardedExecutor
+    print(f"{'products':>10} {'workers':>8} {'query p50':>12} {'batch q/s':>10} {'speedup':>8}")
+    queries = (QUERY_CORPUS * (batch // len(QUERY_CORPUS) + 1))[:batch]
+    for n_products in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'catalog.csv')
+            make_synthetic_catalog(n_products).to_csv(csv_path, index=False)
+            engine = InsuranceRecommendationEngine(csv_path, cache_size=0)
+        parsed = [engine.parse_query(query) for query in queries]
+
+        baseline = None
+        for n_workers in workers:
+            # min_products=0: measure sharding even where the threshold would fall back
+            executor = ShardedExecutor(n_workers, min_products=0) if n_workers > 1 else None
+            engine.use_executor(executor)
+            # Warm-up: spawns the workers and publishes the catalog
+            engine.get_recommendations_batch(parsed[:n_workers], top_n=5)
+
+            latencies = []
+            for user_prefs in parsed[:20]:
+                start = time.perf_counter()
+                engine.get_recommendations(user_prefs, top_n=5)
+                latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            engine.get_recommendations_batch(parsed, top_n=5)
+            throughput = len(parsed) / (time.perf_counter() - start)
+            baseline = baseline or throughput
+            print(f"{n_products:>10,} {n_workers:>8} {np.median(latencies) * 1000:>9.1f} ms "
+                  f"{throughput:>10.0f} {throughput / baseline:>7.1f}x")
+            if executor is not None:
+                executor.close()
+        engine.use_executor(None)
+
+
+def benchmark_shard_churn(n_products: int, readers: int, workers: int, duration: float):
+    """
+    Sharded reads racing upserts and file reloads: every read must succeed, and
+    the final catalog must rank the same sharded and in-process
+    """
+    from sharded_executor import ShardedExecutor
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'catalog.csv')
+        catalog = make_synthetic_catalog(n_products)
+        catalog.to_csv(csv_path, index=False)
+        engine = InsuranceRecommendationEngine(csv_path, cache_size=0)
+        parsed = [engine.parse_query(query) for query in QUERY_CORPUS]
+        executor = ShardedExecutor(workers, min_products=0)
+        engine.use_executor(executor)
+
+        counts = {'reads': 0, 'errors': 0, 'fallbacks': 0, 'upserts': 0, 'reloads': 0}
+        counts_lock = threading.Lock()
+        rank = executor.rank
+
+        def counted_rank(*args):
+            ranked = rank(*args)
+            if ranked is None:
+                with counts_lock:
+                    counts['fallbacks'] += 1
+            return ranked
+
+        executor.rank = counted_rank
+        stop = threading.Event()
+
+        def read(slot):
+            for i in range(slot, 1 << 62):
+                if stop.is_set():
+                    return
+                try:
+                    engine.get_recommendations(parsed[i % len(parsed)], top_n=5)
+                    outcome = 'reads'
+                except Exception as e:
+                    print(f"❌ Read failed: {e!r}")
+                    outcome = 'errors'
+                with counts_lock:
+                    counts[outcome] += 1
+
+        def write():
+            rng = np.random.default_rng(0)
+            while not stop.is_set():
+                row = int(rng.integers(n_products))
+                if counts['upserts'] % 4 == 3:
+                    # Every fourth change goes through the file, as a catalog refresh would
+                    catalog.loc[row, 'monthly_premium'] += 1
+                    catalog.to_csv(csv_path, index=False)
+                    counts['reloads'] += engine.reload_if_changed()
+                else:
+                    product = engine.catalog[row].to_dict()
+                    product['monthly_premium'] += 1
+                    engine.upsert_product(product)
+                counts['upserts'] += 1
+
+        threads = [threading.Thread(target=read, args=(slot,)) for slot in range(readers)]
+        threads.append(threading.Thread(target=write))
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        sharded = engine.get_recommendations_batch(parsed, top_n=5)
+        engine.use_executor(None)
+        executor.close()
+        in_process = engine.get_recommendations_batch(parsed, top_n=5)
+        same = [[rec['id'] for rec in recs] for recs in sharded] == [[rec['id'] for rec in recs] for recs in in_process]
+        print(f"{n_products:,} products, {readers} readers, {workers} workers, {duration:g}s: "
+              f"{counts['reads']} reads, {counts['errors']} errors, {counts['fallbacks']} in-process fallbacks, "
+              f"{counts['upserts']} catalog versions ({counts['reloads']} reloads)")
+        print(f"{'✅' if same and not counts['errors'] else '❌'} {counts['errors']} failed reads, final catalog "
+              f"ranks {'the same' if same else 'differently'} sharded and in-process")
+
+
+def benchmark_genai(latency: str, n_queries: int, token_interval: float):
+    """GenAI layer against the local OpenAI stub: concurrency, combined mode, cache, circuit breaker and streaming"""
+    import genai_agent
+    from circuit_breaker import CircuitBreaker
+    from llm_cache import LLMResponseCache
+    from openai_stub import StubSettings, start_stub_server
+
+    settings = StubSettings(latency, token_interval=token_interval)
+    server = start_stub_server(settings)
+    os.environ['OPENAI_API_BASE'] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ['OPENAI_API_KEY'] = 'stub'
+    engine = InsuranceRecommendationEngine(CATALOG_PATH)
+    queries = [engine.parse_query(query) for query in QUERY_CORPUS[:n_queries]]
+    recommendations = [engine.get_recommendations(query, top_n=3) for query in queries]
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LLMResponseCache(os.path.join(directory, 'llm_cache.sqlite'), bypass=True)
+        agent = genai_agent.GenAIAgent(cache=cache)
+        if not agent.use_openai:
+            print("❌ The openai package is needed to benchmark the GenAI layer")
+            server.shutdown()
+            return
+
+        def sequential(query, recs):
+            agent.enhance_query_understanding(query)
+            agent.generate_personalized_explanation(recs, query)
+            agent.generate_comparative_analysis(recs)
+
+        def first_chunk(query, recs):
+            next(iter(agent.stream_personalized_explanation(recs, query)))
+
+        def run(label: str, call):
+            latencies = []
+            for query, recs in zip(queries, recommendations):
+                start = time.perf_counter()
+                call(query, recs)
+                latencies.append(time.perf_counter() - start)
+            latencies = np.array(latencies) * 1000
+            print(f"{label:>22} {np.percentile(latencies, 50):>9.0f} ms {np.percentile(latencies, 95):>9.0f} ms")
+
+        def run_metered(label: str, combined: bool):
+            """run generate_insights, then the OpenAI requests and prompt tokens it took per query"""
+            agent.combined = combined
+            before = agent.token_usage()
+            run(label, lambda query, recs: agent.generate_insights(recs, query))
+            after = agent.token_usage()
+            agent.combined = False
+            print(f"{'':>22} {(after['requests'] - before['requests']) / n_queries:.1f} requests, "
+                  f"{(after['prompt_tokens'] - before['prompt_tokens']) / n_queries:.0f} prompt tokens per query")
+
+        print(f"stub latency {latency}, {n_queries} queries")
+        print(f"{'mode':>22} {'p50':>12} {'p95':>12}")
+        run('sequential (3 calls)', sequential)
+        run_metered('concurrent', combined=False)
+        run_metered('combined (1 call)', combined=True)
+        run('stream first chunk', first_chunk)
+
+        cache.bypass = False
+        run('concurrent, cold cache', lambda query, recs: agent.generate_insights(recs, query))
+        run('concurrent, warm cache', lambda query, recs: agent.generate_insights(recs, query))
+        print(f"{'':>22} cache hit rate {cache.stats()['hit_rate']:.0%}")
+
+        cache.bypass = True
+        settings.error_500 = 0.5
+        # A fresh breaker, so the window holds this phase's calls only
+        agent.breaker = CircuitBreaker()
+        run('50% server errors', lambda query, recs: agent.generate_insights(recs, query))
+        breaker = agent.breaker_stats()
+        print(f"{'':>22} breaker {breaker['state']}, opened {breaker['times_opened']}x, "
+              f"{breaker['rejected']} calls answered locally")
+    server.shutdown()
+
+
+# Import paths measured by benchmark_imports
+IMPORT_TARGETS = {
+    'core': 'import recommendation_engine, fallback_agent',
+    'cli': 'import demo',
+    'app': 'import app'
+}
+HEAVY_MODULES = ['pandas', 'pyarrow', 'openai', 'dotenv', 'plotly', 'streamlit']
+
+
+def parse_importtime(stderr: str):
+    """(module, cumulative us, depth) rows from python -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(cumulative), len(name) - len(name.lstrip())))
+    return rows
+
+
+def benchmark_imports(top: int):
+    """Cold import time of the core engine, the CLI demo and the Streamlit app"""
+    for label, statement in IMPORT_TARGETS.items():
+        probe = f"{statement}; import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'
+            print(f"{label:>5}: ❌ {error}")
+            continue
+
+        rows = parse_importtime(result.stderr)
+        top_level = min(depth for _, _, depth in rows)
+        total_ms = sum(cumulative for _, cumulative, depth in rows if depth == top_level) / 1000
+        heavy = result.stdout.strip() or 'none'
+        print(f"{label:>5}: {total_ms:8.1f} ms  heavy modules loaded: {heavy}")
+        for name, cumulative, depth in sorted(rows, key=lambda row: -row[1])[:top]:
+            print(f"{'':>7}{cumulative / 1000:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    age_parser = subparsers.add_parser('age', help='age eligibility filtering')
+    age_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+
+    parse_parser = subparsers.add_parser('parse', help='query parsing')
+    parse_parser.add_argument('--repeat', type=int, default=200)
+
+    topn_parser = subparsers.add_parser('topn', help='top-N selection')
+    topn_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    topn_parser.add_argument('--top-n', type=int, default=5)
+
+    memory_parser = subparsers.add_parser('memory', help='catalog memory footprint')
+    memory_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+
+    load_parser = subparsers.add_parser('load', help='catalog load time per file format')
+    load_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='engine cold start')
+    snapshot_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+
+    reload_parser = subparsers.add_parser('reload', help='incremental catalog reload')
+    reload_parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    reload_parser.add_argument('--changes', type=int, default=100)
+
+    updates_parser = subparsers.add_parser('updates', help='upsert throughput vs read latency')
+    updates_parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    updates_parser.add_argument('--readers', type=int, default=4)
+    updates_parser.add_argument('--duration', type=float, default=3.0)
+
+    streaming_parser = subparsers.add_parser('streaming', help='out-of-core scoring memory')
+    streaming_parser.add_argument('--sizes', type=int, nargs='+', default=[200_000, 1_000_000])
+    streaming_parser.add_argument('--chunk-size', type=int, default=100_000)
+
+    shards_parser = subparsers.add_parser('shards', help='multi-process sharded scoring scaling')
+    shards_parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    shards_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    shards_parser.add_argument('--batch', type=int, default=200)
+
+    churn_parser = subparsers.add_parser('churn', help='sharded reads during upserts and catalog reloads')
+    # Small catalog, many versions: reads still in flight when their version is replaced
+    churn_parser.add_argument('--products', type=int, default=3_000)
+    churn_parser.add_argument('--readers', type=int, default=8)
+    churn_parser.add_argument('--workers', type=int, default=4)
+    churn_parser.add_argument('--duration', type=float, default=5.0)
+
+    genai_parser = subparsers.add_parser('genai', help='GenAI layer against the local OpenAI stub')
+    genai_parser.add_argument('--latency', default='lognormal:0.8:0.5', help='stub latency spec (openai_stub.py)')
+    genai_parser.add_argument('--queries', type=int, default=10)
+    genai_parser.add_argument('--token-interval', type=float, default=0.02)
+
+    imports_parser = subparsers.add_parser('imports', help='import time of the core, CLI and app')
+    imports_parser.add_argument('--top', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.benchmark == 'age':
+        benchmark_age_filter(args.sizes)
+    elif args.benchmark == 'parse':
+        benchmark_query_parser(args.repeat)
+    elif args.benchmark == 'topn':
+        benchmark_top_n(args.sizes, args.top_n)
+    elif args.benchmark == 'memory':
+        benchmark_catalog_memory(args.sizes)
+    elif args.benchmark == 'load':
+        benchmark_catalog_load(args.sizes)
+    elif args.benchmark == 'snapshot':
+        benchmark_cold_start(args.sizes)
+    elif args.benchmark == 'reload':
+        benchmark_reload(args.sizes, args.changes)
+    elif args.benchmark == 'updates':
+        benchmark_updates(args.sizes, args.readers, args.duration)
+    elif args.benchmark == 'streaming':
+        benchmark_streaming(args.sizes, args.chunk_size)
+    elif args.benchmark == 'shards':
+        benchmark_shards(args.sizes, args.workers, args.batch)
+    elif args.benchmark == 'churn':
+        benchmark_shard_churn(args.products, args.readers, args.workers, args.duration)
+    elif args.benchmark == 'genai':
+        benchmark_genai(args.latency, args.queries, args.token_interval)
+    elif args.benchmark == 'imports':
+        benchmark_imports(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Circuit breaker for calls to an external service
+Closed: calls go through and outcomes are counted over a sliding window.
+Open: calls are refused until a cooldown has passed. Half-open: a single
+probe call decides between closing again and another cooldown; a probe that
+ends without an outcome is released, or expires after another cooldown.
+"""
+
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Tuple
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Breaker settings for the OpenAI calls in genai_agent.py
+BREAKER_WINDOW = float(os.getenv('BREAKER_WINDOW', '60'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '5'))
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', '0.5'))
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '30'))
+
+# Upper bounds (seconds) of the latency histogram buckets; the last one catches the rest
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, float('inf'))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose breaker is open"""
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency counts"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+
+    def stats(self) -> Dict:
+        count = sum(self.counts)
+        return {
+            'count': count,
+            'mean': self.total / count if count else 0.0,
+            'buckets': {f"le_{bound:g}": n for bound, n in zip(self.buckets, self.counts)}
+        }
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker with timed half-open probes
+    Opens once at least min_calls calls in the last window seconds failed at
+    error_rate or more; after cooldown seconds one probe is let through.
+    """
+
+    def __init__(self, window: float = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, cooldown: float = BREAKER_COOLDOWN,
+                 clock=time.monotonic):
+        if not 0 < error_rate <= 1:
+            raise ValueError(f"error_rate must be in (0, 1], got {error_rate}")
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+
+        self.state = CLOSED
+        self._outcomes = deque()  # (time, succeeded) within the window
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._probe_started = None
+
+        self.times_opened = 0
+        self.rejected = 0
+        self.successes = LatencyHistogram()
+        self.failures = LatencyHistogram()
+
+    def _prune(self, now: float):
+        while self._outcomes and self._outcomes[0][0] <= now - self.window:
+            _, succeeded = self._outcomes.popleft()
+            if not succeeded:
+                self._failures -= 1
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self._probing = False
+        self.times_opened += 1
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; a True in half-open reserves the probe"""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self._opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probing and self.clock() - self._probe_started >= self.cooldown:
+                # The probe never reported back (e.g. its caller was killed); let another one through
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                self._probe_started = self.clock()
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Hand back a half-open probe whose call ended with neither success nor failure"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            self.successes.record(seconds)
+            now = self.clock()
+            if self.state == HALF_OPEN:
+                # The probe got through: start over with a clean window
+                self.state = CLOSED
+                self._probing = False
+                self._outcomes.clear()
+                self._failures = 0
+            self._outcomes.append((now, True))
+            self._prune(now)
+
+    def record_failure(self, seconds: float) -> bool:
+        """Count a failed call; True if it opened the breaker"""
+        with self._lock:
+            self.failures.record(seconds)
+            now = self.clock()
+            if self.state == HALF_OPEN:
+                self._open(now)
+                return True
+            if self.state == OPEN:
+                return False
+            self._outcomes.append((now, False))
+            self._failures += 1
+            self._prune(now)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._failures / calls >= self.error_rate:
+                self._open(now)
+                return True
+            return False
+
+    def stats(self) -> Dict:
+        """Breaker state, window error rate and latency histograms for monitoring"""
+        with self._lock:
+            self._prune(self.clock())
+            calls = len(self._outcomes)
+            return {
+                'state': self.state,
+                'window_calls': calls,
+                'window_error_rate': self._failures / calls if calls else 0.0,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'latency_success': self.successes.stats(),
+                'latency_failure': self.failures.stats()
+            }
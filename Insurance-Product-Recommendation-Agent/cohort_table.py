@@ -0,0 +1,275 @@
+"""
+Precomputed cohort lookup table
+Every ranking-relevant profile the query parser can produce is scored offline
+and its top-K products are stored on disk, so a recommendation becomes a
+parse plus one array lookup
+Build:  python cohort_table.py build --out cohort_table.npz
+Verify: python cohort_table.py verify --table cohort_table.npz
+"""
+
+import argparse
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from query_parser import ParsedQuery
+from recommendation_engine import (InsuranceRecommendationEngine, PROFESSION_MATCHES, SITUATION_MATCHES,
+                                   RANKING_FLAGS, BATCH_SCORE_CELLS, get_age_band)
+
+# The parser only reads one- or two-digit ages
+MAX_PARSED_AGE = 99
+DEFAULT_TOP_K = 5
+
+
+class CohortTable:
+    """
+    Top-K product ids and scores per profile
+    Profiles are (age class, profession, life situation, wants_* flags).
+    Ages that share age-band and eligibility rank identically, so they share
+    an age class; class 0 is 'no age given' and -1 marks ages not built.
+    """
+
+    def __init__(self, product_ids: np.ndarray, scores: np.ndarray, age_to_class: np.ndarray,
+                 professions: List[str], situations: List[str], catalog_version: str, keyword_match: str):
+        self.product_ids = product_ids
+        self.scores = scores
+        self.age_to_class = age_to_class
+        self.professions = list(professions)
+        self.situations = list(situations)
+        self.catalog_version = catalog_version
+        self.keyword_match = keyword_match
+        self.top_k = product_ids.shape[1]
+
+        # None and values without name keywords score alike, so they share index 0
+        self.profession_index = {value: i + 1 for i, value in enumerate(self.professions)}
+        self.situation_index = {value: i + 1 for i, value in enumerate(self.situations)}
+        self.positions = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.product_ids.nbytes + self.scores.nbytes + self.age_to_class.nbytes
+
+    def row(self, user_prefs: Union[Dict, ParsedQuery]) -> Optional[int]:
+        """Table row for a profile, None if its age was not built"""
+        age = user_prefs.get('age')
+        if age is None:
+            age_class = 0
+        elif 0 <= age <= MAX_PARSED_AGE:
+            age_class = int(self.age_to_class[age])
+            if age_class < 0:
+                return None
+        else:
+            return None
+
+        flags = 0
+        for bit, flag in enumerate(RANKING_FLAGS):
+            if user_prefs.get(flag):
+                flags |= 1 << bit
+
+        row = age_class
+        row = row * (len(self.professions) + 1) + self.profession_index.get(user_prefs.get('profession'), 0)
+        row = row * (len(self.situations) + 1) + self.situation_index.get(user_prefs.get('life_situation'), 0)
+        return (row << len(RANKING_FLAGS)) | flags
+
+    def bind(self, engine: InsuranceRecommendationEngine):
+        """Check the table was built for this engine's catalog and map product ids to positions"""
+        if self.catalog_version != engine.catalog_version:
+            raise ValueError(f"Cohort table was built for catalog {self.catalog_version}, "
+                             f"engine has {engine.catalog_version}")
+        if self.keyword_match != engine.keyword_match:
+            raise ValueError(f"Cohort table uses '{self.keyword_match}' keyword matching, "
+                             f"engine uses '{engine.keyword_match}'")
+
+        catalog_ids = engine.catalog.id
+        order = np.argsort(catalog_ids, kind='stable')
+        valid = self.product_ids >= 0
+        self.positions = np.full(self.product_ids.shape, -1, dtype=np.int64)
+        self.positions[valid] = order[np.searchsorted(catalog_ids, self.product_ids[valid], sorter=order)]
+
+    def lookup(self, user_prefs: Union[Dict, ParsedQuery], top_n: int,
+               catalog_version: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Catalog positions and scores of the top_n products, None when the table can't answer"""
+        if self.positions is None or catalog_version != self.catalog_version or top_n > self.top_k:
+            return None
+        row = self.row(user_prefs)
+        if row is None:
+            return None
+        positions = self.positions[row, :max(top_n, 0)]
+        positions = positions[positions >= 0]
+        return positions, self.scores[row, :len(positions)]
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            product_ids=self.product_ids,
+            scores=self.scores,
+            age_to_class=self.age_to_class,
+            professions=np.array(self.professions),
+            situations=np.array(self.situations),
+            catalog_version=np.array(self.catalog_version),
+            keyword_match=np.array(self.keyword_match)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'CohortTable':
+        with np.load(path) as data:
+            return cls(
+                product_ids=data['product_ids'],
+                scores=data['scores'],
+                age_to_class=data['age_to_class'],
+                professions=data['professions'].tolist(),
+                situations=data['situations'].tolist(),
+                catalog_version=str(data['catalog_version']),
+                keyword_match=str(data['keyword_match'])
+            )
+
+
+def age_classes(engine: InsuranceRecommendationEngine, ages) -> Tuple[np.ndarray, List[Optional[int]]]:
+    """
+    Group ages that rank identically (same eligibility mask and age band)
+    Returns age -> class for 0..MAX_PARSED_AGE and one representative age per class
+    """
+    age_to_class = np.full(MAX_PARSED_AGE + 1, -1, dtype=np.int16)
+    representatives = [None]
+    classes = {}
+    for age in ages:
+        key = (engine.age_index.mask(age).tobytes(), get_age_band(age))
+        if key not in classes:
+            classes[key] = len(representatives)
+            representatives.append(age)
+        age_to_class[age] = classes[key]
+    return age_to_class, representatives
+
+
+def build_cohort_table(engine: InsuranceRecommendationEngine, top_k: int = DEFAULT_TOP_K,
+                       ages=range(MAX_PARSED_AGE + 1)) -> CohortTable:
+    """Score every profile in the (optionally restricted) age range with the batch scorer"""
+    age_to_class, representatives = age_classes(engine, ages)
+    professions = list(PROFESSION_MATCHES)
+    situations = list(SITUATION_MATCHES)
+
+    catalog_ids = engine.catalog.id
+    id_dtype = np.int32 if catalog_ids.max(initial=0) < np.iinfo(np.int32).max else np.int64
+    n_rows = len(representatives) * (len(professions) + 1) * (len(situations) + 1) << len(RANKING_FLAGS)
+    product_ids = np.full((n_rows, top_k), -1, dtype=id_dtype)
+    scores = np.full((n_rows, top_k), np.nan, dtype=np.float64)
+
+    table = CohortTable(product_ids, scores, age_to_class, professions, situations,
+                        engine.catalog_version, engine.keyword_match)
+    flag_combinations = list(itertools.product([False, True], repeat=len(RANKING_FLAGS)))
+    block_size = max(1, BATCH_SCORE_CELLS // max(len(catalog_ids), 1))
+
+    for age in representatives:
+        positions = engine.age_index.positions(age)
+        profiles = [ParsedQuery('', age=age, profession=profession, life_situation=situation,
+                                **dict(zip(RANKING_FLAGS, flags)))
+                    for profession in [None] + professions
+                    for situation in [None] + situations
+                    for flags in flag_combinations]
+        rows = np.array([table.row(profile) for profile in profiles])
+
+        for start in range(0, len(profiles), block_size):
+            block_scores = engine.score_products_batch(profiles[start:start + block_size])[:, positions]
+            # Same order as get_recommendations: descending score, then ascending product id
+            block_ids = np.broadcast_to(catalog_ids[positions], block_scores.shape)
+            top = np.lexsort((block_ids, -block_scores), axis=1)[:, :top_k]
+            block_rows = rows[start:start + block_size]
+            product_ids[block_rows, :top.shape[1]] = catalog_ids[positions[top]]
+            scores[block_rows, :top.shape[1]] = np.take_along_axis(block_scores, top, axis=1)
+
+    return table
+
+
+def random_profile(rng: np.random.Generator) -> ParsedQuery:
+    """A random ranking profile, about one in ten without an age"""
+    age = None if rng.random() < 0.1 else int(rng.integers(0, MAX_PARSED_AGE + 1))
+    professions = [None] + list(PROFESSION_MATCHES)
+    situations = [None] + list(SITUATION_MATCHES)
+    return ParsedQuery(
+        '',
+        age=age,
+        profession=professions[rng.integers(len(professions))],
+        life_situation=situations[rng.integers(len(situations))],
+        **{flag: bool(rng.integers(2)) for flag in RANKING_FLAGS}
+    )
+
+
+def verify_cohort_table(engine: InsuranceRecommendationEngine, table: CohortTable,
+                        samples: int = 1000, seed: int = 0) -> Dict:
+    """Compare table lookups against live scoring for randomly sampled profiles"""
+    rng = np.random.default_rng(seed)
+    checked = skipped = 0
+    mismatches = []
+    lookup_time = live_time = 0.0
+
+    for _ in range(samples):
+        profile = random_profile(rng)
+        top_n = int(rng.integers(1, table.top_k + 1))
+
+        start = time.perf_counter()
+        hit = table.lookup(profile, top_n, engine.catalog_version)
+        expected_start = time.perf_counter()
+        expected = engine._rank(profile, top_n)
+        live_time += time.perf_counter() - expected_start
+        if hit is None:
+            skipped += 1
+            continue
+        lookup_time += expected_start - start
+
+        checked += 1
+        if engine._recommendations_at(*hit) != expected:
+            mismatches.append((profile, top_n))
+
+    return {
+        'checked': checked,
+        'skipped': skipped,
+        'mismatches': mismatches,
+        'lookup_us': lookup_time / max(checked, 1) * 1e6,
+        'live_us': live_time / max(samples, 1) * 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalog', default='insurance_products.csv')
+    parser.add_argument('--keyword-match', default='substring', choices=['substring', 'token'])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='score every profile and write the table')
+    build_parser.add_argument('--out', default='cohort_table.npz')
+    build_parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    build_parser.add_argument('--ages', type=int, nargs=2, metavar=('MIN', 'MAX'), default=[0, MAX_PARSED_AGE],
+                              help='only build this age range; other ages fall back to live scoring')
+
+    verify_parser = subparsers.add_parser('verify', help='check sampled profiles against live scoring')
+    verify_parser.add_argument('--table', default='cohort_table.npz')
+    verify_parser.add_argument('--samples', type=int, default=1000)
+    verify_parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    engine = InsuranceRecommendationEngine(args.catalog, keyword_match=args.keyword_match, cache_size=0)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        ages = range(max(args.ages[0], 0), min(args.ages[1], MAX_PARSED_AGE) + 1)
+        table = build_cohort_table(engine, args.top_k, ages)
+        table.save(args.out)
+        print(f"✅ Built {table.product_ids.shape[0]:,} profiles x top {table.top_k} "
+              f"({table.nbytes / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s -> {args.out}")
+    elif args.command == 'verify':
+        table = CohortTable.load(args.table)
+        table.bind(engine)
+        report = verify_cohort_table(engine, table, args.samples, args.seed)
+        print(f"Checked {report['checked']} profiles ({report['skipped']} outside the table): "
+              f"{len(report['mismatches'])} mismatches")
+        print(f"Lookup {report['lookup_us']:.1f} us vs live scoring {report['live_us']:.1f} us")
+        for profile, top_n in report['mismatches'][:5]:
+            print(f"❌ top_n={top_n} {profile}")
+        if report['mismatches']:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
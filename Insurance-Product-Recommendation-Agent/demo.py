@@ -30,8 +30,9 @@ def run_demo():
         print(f"Query: {query}")
         print("-" * 40)
         
-        # Get recommendations
-        recommendations = engine.get_recommendations(query, top_n=3)
+        # Parse once, then get recommendations
+        parsed_query = engine.parse_query(query)
+        recommendations = engine.get_recommendations(parsed_query, top_n=3)
         
         if recommendations:
             # Display recommendations
@@ -50,7 +51,7 @@ def run_demo():
             
             # Get AI explanation
             print(f"\n🤖 AI Explanation:")
-            explanation = ai_agent.generate_personalized_explanation(recommendations, query)
+            explanation = ai_agent.generate_personalized_explanation(recommendations, parsed_query)
             print(explanation)
             
         else:
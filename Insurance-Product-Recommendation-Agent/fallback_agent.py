@@ -3,8 +3,8 @@ Alternative GenAI Agent implementation using free/local models
 This file provides alternatives when OpenAI API is not available
 """
 
-import re
-from typing import List, Dict
+from typing import List, Dict, Union
+from query_parser import ParsedQuery, parse_query
 
 class LocalGenAIAgent:
     """
@@ -15,56 +15,51 @@ class LocalGenAIAgent:
         # You can configure different free APIs here
         self.fallback_mode = True
         
-    def enhance_query_understanding(self, user_query: str) -> Dict:
+    def enhance_query_understanding(self, user_query: Union[str, ParsedQuery]) -> Dict:
         """
         Rule-based query understanding as fallback
         """
-        query_lower = user_query.lower()
+        parsed = parse_query(user_query)
         
         analysis = []
         
         # Age detection
-        age_match = re.search(r'\b(\d{1,2})\b', user_query)
-        if age_match:
-            analysis.append(f"Detected age: {age_match.group(1)} years")
+        if parsed.age is not None:
+            analysis.append(f"Detected age: {parsed.age} years")
         
         # Gender detection
-        if any(word in query_lower for word in ['female', 'woman', 'girl']):
-            analysis.append("Gender: Female")
-        elif any(word in query_lower for word in ['male', 'man', 'boy']):
-            analysis.append("Gender: Male")
+        if parsed.gender:
+            analysis.append(f"Gender: {parsed.gender.title()}")
         
         # Marital status
-        if any(word in query_lower for word in ['married', 'wife', 'husband']):
-            analysis.append("Marital Status: Married")
-        elif any(word in query_lower for word in ['unmarried', 'single']):
-            analysis.append("Marital Status: Single")
+        if parsed.marital_status:
+            analysis.append(f"Marital Status: {parsed.marital_status.title()}")
         
         # Insurance needs
         needs = []
-        if any(word in query_lower for word in ['health', 'medical']):
+        if parsed.wants_health:
             needs.append("Health Insurance")
-        if any(word in query_lower for word in ['accident', 'injury']):
+        if parsed.wants_accident:
             needs.append("Accident Coverage")
-        if any(word in query_lower for word in ['critical', 'cancer', 'heart']):
+        if parsed.wants_critical:
             needs.append("Critical Illness")
-        if any(word in query_lower for word in ['maternity', 'pregnancy']):
+        if parsed.wants_maternity:
             needs.append("Maternity Benefits")
         
         if needs:
             analysis.append(f"Insurance Needs: {', '.join(needs)}")
         
         # Budget preferences
-        if any(word in query_lower for word in ['low premium', 'cheap', 'affordable']):
+        if parsed.wants_low_premium:
             analysis.append("Budget Preference: Low Premium")
-        if any(word in query_lower for word in ['high coverage', 'comprehensive']):
+        if parsed.wants_high_coverage:
             analysis.append("Coverage Preference: High Coverage")
         
         return {
             "ai_analysis": "\n".join(analysis) if analysis else "Basic analysis of insurance requirements"
         }
     
-    def generate_personalized_explanation(self, recommendations: List[Dict], user_query: str) -> str:
+    def generate_personalized_explanation(self, recommendations: List[Dict], user_query: Union[str, ParsedQuery]) -> str:
         """
         Generate explanations using rule-based logic
         """
@@ -76,18 +71,18 @@ class LocalGenAIAgent:
         # Opening
         explanation_parts.append(f"Based on your requirements, I've found {len(recommendations)} suitable insurance products for you.")
         
-        # Analyze user query for key needs
-        query_lower = user_query.lower()
+        # Key needs from the parsed query
+        parsed = parse_query(user_query)
         
-        if any(word in query_lower for word in ['low premium', 'affordable', 'cheap']):
+        if parsed.wants_low_premium:
             explanation_parts.append("I've prioritized products with competitive premium rates to match your budget preferences.")
         
-        if any(word in query_lower for word in ['critical', 'cancer']):
+        if parsed.wants_critical:
             critical_products = [r for r in recommendations if r['critical_illness'] == 'Yes']
             if critical_products:
                 explanation_parts.append(f"{len(critical_products)} of the recommended products include critical illness coverage as requested.")
         
-        if any(word in query_lower for word in ['maternity', 'pregnancy']):
+        if parsed.wants_maternity:
             maternity_products = [r for r in recommendations if r['maternity'] == 'Yes']
             if maternity_products:
                 explanation_parts.append(f"{len(maternity_products)} products include maternity benefits for your family planning needs.")
@@ -1,14 +1,71 @@
-try:
-    import openai
-    from dotenv import load_dotenv
-    OPENAI_AVAILABLE = True
-    load_dotenv()
-except ImportError:
-    OPENAI_AVAILABLE = False
-
+import asyncio
+import atexit
+import concurrent.futures
+import importlib.util
+import json
 import os
-from typing import List, Dict
+import queue
+import re
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Optional, Tuple, Union
+from circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyHistogram
 from fallback_agent import LocalGenAIAgent
+from llm_cache import LLMResponseCache
+from query_parser import ParsedQuery
+
+# openai and dotenv are imported when the first GenAIAgent is created, so
+# importing this module (e.g. for the fallback path) stays cheap
+OPENAI_AVAILABLE = (importlib.util.find_spec('openai') is not None and
+                    importlib.util.find_spec('dotenv') is not None)
+openai = None
+
+OPENAI_MODEL = "gpt-3.5-turbo"
+# Seconds before a single OpenAI HTTP request is abandoned
+OPENAI_REQUEST_TIMEOUT = float(os.getenv('OPENAI_REQUEST_TIMEOUT', '20'))
+
+# Seconds each GenAI call may take in generate_insights before its section falls back
+GENAI_CALL_TIMEOUT = float(os.getenv('GENAI_CALL_TIMEOUT', '15'))
+# Latency budget (seconds) for the explanation and comparison; unset waits for the LLM.
+# With a deadline the rule-based text answers whenever the LLM is later than that;
+# for streamed sections (stream_insights, used by the app) it bounds the first chunk
+GENAI_DEADLINE = float(os.getenv('GENAI_DEADLINE')) if os.getenv('GENAI_DEADLINE') else None
+# Sections raced against LocalGenAIAgent in deadline mode
+HEDGED_SECTIONS = ('explanation', 'comparison')
+# One JSON-mode request for the analysis, summary and comparison instead of three calls
+GENAI_COMBINED = os.getenv('GENAI_COMBINED', '').lower() in ('1', 'true', 'yes')
+COMBINED_SECTIONS = ('analysis', 'summary', 'comparison')
+TOKEN_FIELDS = ('prompt_tokens', 'completion_tokens', 'total_tokens')
+
+
+def _import_openai() -> bool:
+    """Import openai and load .env on first use; False if the packages can't be imported"""
+    global openai, OPENAI_AVAILABLE
+    if openai is None and OPENAI_AVAILABLE:
+        try:
+            import openai as openai_module
+            from dotenv import load_dotenv
+            load_dotenv()
+            openai = openai_module
+        except ImportError:
+            OPENAI_AVAILABLE = False
+    return openai is not None
+
+
+def _query_text(user_query: Union[str, ParsedQuery]) -> str:
+    """Raw query text for prompts, whether or not the query was parsed already"""
+    if isinstance(user_query, ParsedQuery):
+        return user_query.original_query
+    return user_query
+
+
+def _text_chunks(text: str) -> Iterator[str]:
+    """
+    Line-sized chunks of a finished text, so cached and rule-based replies
+    stream like the API's without a UI update per word
+    """
+    return iter(re.findall(r'[^\n]*\n|[^\n]+', text))
+
 
 class GenAIAgent:
     """
@@ -17,16 +74,46 @@ class GenAIAgent:
     Falls back to rule-based logic if OpenAI is not available
     """
     
-    def __init__(self):
+    def __init__(self, cache: Optional[LLMResponseCache] = None, breaker: Optional[CircuitBreaker] = None,
+                 deadline: Optional[float] = GENAI_DEADLINE, combined: bool = GENAI_COMBINED):
         self.use_openai = False
         self.fallback_agent = LocalGenAIAgent()
+        self.deadline = deadline
+        # generate_insights/stream_insights make one structured request instead of three
+        self.combined = combined
+        # Token usage of every OpenAI request this agent made (cache hits excluded)
+        self._token_usage = dict.fromkeys(('requests',) + TOKEN_FIELDS + ('unmetered_requests',), 0)
+        # Which source answered each hedged section, and how long the LLM took (on time or not)
+        self._answer_sources = {section: {'llm': 0, 'fallback': 0, 'late_llm': 0} for section in HEDGED_SECTIONS}
+        self._llm_latency = {section: LatencyHistogram() for section in HEDGED_SECTIONS}
+        # Time to the first chunk of streamed sections, which is what the deadline bounds there
+        self._first_chunk_latency = {section: LatencyHistogram() for section in HEDGED_SECTIONS}
+        # Streams still filling the cache after missing the deadline
+        self._background = set()
+        self._stats_lock = threading.Lock()
+        # Long-lived event loop thread, so LLM calls outlive the request that started them
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        # One aiohttp session on that loop for every async call; openai 0.28 otherwise opens
+        # one per call and leaks it when a timeout cancels the call
+        self._session = None
+        # Failing calls trip the breaker for a while instead of disabling OpenAI for good
+        self.breaker = breaker or CircuitBreaker()
+        # Replies to identical requests (llm_cache.py); only used with OpenAI
+        self.cache = cache
         
-        if OPENAI_AVAILABLE:
+        if _import_openai():
             api_key = os.getenv('OPENAI_API_KEY')
             if api_key and api_key != 'your_openai_api_key_here' and api_key.strip():
                 try:
                     # Use classic OpenAI API approach (stable and reliable)
                     openai.api_key = api_key.strip()
+                    # An OpenAI-compatible endpoint instead of api.openai.com (e.g. openai_stub.py);
+                    # set here because .env is loaded after openai read its environment
+                    api_base = os.getenv('OPENAI_API_BASE')
+                    if api_base:
+                        openai.api_base = api_base.rstrip('/')
+                        print(f"🧪 Using OpenAI-compatible endpoint {openai.api_base}")
                     self.use_openai = True
                     print("✅ OpenAI API key configured successfully")
                 except Exception as e:
@@ -40,13 +127,205 @@ class GenAIAgent:
             print("⚠️ OpenAI package not available, using fallback agent")
             self.use_openai = False
         
-    def enhance_query_understanding(self, user_query: str) -> Dict:
+        if self.use_openai and self.cache is None:
+            try:
+                self.cache = LLMResponseCache()
+            except Exception as e:
+                print(f"⚠️ LLM response cache unavailable: {e}")
+        
+    def _request_started(self, request: Dict, use_cache: bool) -> Optional[str]:
+        """Cached reply, or None once the breaker lets the request go out"""
+        if use_cache and self.cache is not None:
+            cached = self.cache.get(request)
+            if cached is not None:
+                return cached
+        if not self.breaker.allow():
+            raise CircuitOpenError("OpenAI circuit is open")
+        return None
+    
+    def _request_failed(self, started: float):
+        if self.breaker.record_failure(time.perf_counter() - started):
+            print(f"🔌 OpenAI circuit opened, using fallback for the next {self.breaker.cooldown:g}s")
+    
+    def _request_succeeded(self, started: float, request: Dict, content: str, use_cache: bool) -> str:
+        self.breaker.record_success(time.perf_counter() - started)
+        if use_cache and self.cache is not None:
+            self.cache.put(request, content)
+        return content
+    
+    def _count_usage(self, tokens: Optional[Dict], usage: Optional[Dict]):
+        """Add a reply's token counts to the totals, and to usage if given; None if the API sent none"""
+        with self._stats_lock:
+            if tokens is None:
+                # Kept out of 'requests' so per-request token averages stay right
+                self._token_usage['unmetered_requests'] += 1
+                return
+            self._token_usage['requests'] += 1
+            for field in TOKEN_FIELDS:
+                self._token_usage[field] += tokens.get(field, 0)
+        if usage is not None:
+            usage.update({field: tokens.get(field, 0) for field in TOKEN_FIELDS}, cached=False)
+    
+    @staticmethod
+    def _cache_hit_usage(usage: Optional[Dict]):
+        if usage is not None:
+            usage.update(dict.fromkeys(TOKEN_FIELDS, 0), cached=True)
+    
+    def _chat_completion(self, request: Dict, use_cache: bool = True, usage: Optional[Dict] = None) -> str:
         """
-        Use GenAI to better understand user intent and extract structured information
+        One blocking chat completion, served from the response cache when possible;
+        returns the reply text and fills usage (if given) with its token counts
         """
-        if not self.use_openai:
-            return self.fallback_agent.enhance_query_understanding(user_query)
+        request = {'model': OPENAI_MODEL, **request}
+        cached = self._request_started(request, use_cache)
+        if cached is not None:
+            self._cache_hit_usage(usage)
+            return cached
+        started = time.perf_counter()
+        try:
+            response = openai.ChatCompletion.create(request_timeout=OPENAI_REQUEST_TIMEOUT, **request)
+        except Exception:
+            self._request_failed(started)
+            raise
+        self._count_usage(dict(response.get('usage') or {}), usage)
+        return self._request_succeeded(started, request, response.choices[0].message.content, use_cache)
+    
+    async def _chat_completion_async(self, request: Dict, use_cache: bool = True, usage: Optional[Dict] = None) -> str:
+        """One chat completion on the event loop, served from the response cache when possible"""
+        request = {'model': OPENAI_MODEL, **request}
+        cached = self._request_started(request, use_cache)
+        if cached is not None:
+            self._cache_hit_usage(usage)
+            return cached
+        started = time.perf_counter()
+        self._use_session()
+        try:
+            response = await openai.ChatCompletion.acreate(request_timeout=OPENAI_REQUEST_TIMEOUT, **request)
+        except (Exception, asyncio.CancelledError):
+            # Cancelled by generate_insights' timeout: as much a failure as an HTTP timeout
+            self._request_failed(started)
+            raise
+        self._count_usage(dict(response.get('usage') or {}), usage)
+        return self._request_succeeded(started, request, response.choices[0].message.content, use_cache)
+    
+    def token_usage(self) -> Dict:
+        """
+        OpenAI requests made and tokens used so far; 'unmetered_requests' counts
+        replies that came without token counts (streams from endpoints that don't report usage)
+        """
+        with self._stats_lock:
+            return dict(self._token_usage)
+    
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='genai-event-loop', daemon=True).start()
+                atexit.register(self.close)
+            return self._loop
+    
+    def _use_session(self):
+        """
+        Point openai at the agent's aiohttp session for the current task
+        (openai.aiosession is a ContextVar); calls on other loops keep openai's own
+        """
+        if asyncio.get_running_loop() is not self._loop:
+            return
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession()
+        openai.aiosession.set(self._session)
+    
+    def close(self):
+        """Close the aiohttp session and stop the event loop thread"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        atexit.unregister(self.close)
         
+        async def shutdown():
+            if self._session is not None:
+                await self._session.close()
+                self._session = None
+        
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=5)
+        except Exception as e:
+            print(f"⚠️ Closing the OpenAI session failed: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+    
+    def _run(self, coroutine):
+        """Run a coroutine on the agent's event loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._event_loop()).result()
+    
+    def _count_source(self, section: str, source: str):
+        with self._stats_lock:
+            self._answer_sources[section][source] += 1
+    
+    async def _hedged(self, section: str, request: Dict, fallback: Callable[[], str]) -> Tuple[str, str]:
+        """
+        Race the LLM against the rule-based text: (text, 'llm' or 'fallback')
+        A late LLM answer keeps running and lands in the response cache.
+        """
+        started = time.perf_counter()
+        # cached=True on a response cache hit, which says nothing about LLM latency
+        usage = {}
+        llm = asyncio.ensure_future(self._chat_completion_async(request, usage=usage))
+        answer = asyncio.shield(llm)
+        # The rule-based text is built on a worker thread while the request is in flight
+        fallback_text = asyncio.get_running_loop().run_in_executor(None, fallback)
+        try:
+            text = await asyncio.wait_for(answer, self.deadline)
+        except asyncio.TimeoutError:
+            llm.add_done_callback(lambda task: self._late_answer(section, started, task, usage))
+            self._count_source(section, 'fallback')
+            return await fallback_text, 'fallback'
+        except Exception as e:
+            self._report_failure(e, section)
+            self._count_source(section, 'fallback')
+            return await fallback_text, 'fallback'
+        if not usage.get('cached'):
+            with self._stats_lock:
+                self._llm_latency[section].record(time.perf_counter() - started)
+        self._count_source(section, 'llm')
+        return text, 'llm'
+    
+    def _late_answer(self, section: str, started: float, task: asyncio.Future, usage: Dict):
+        if task.cancelled() or task.exception() is not None:
+            return
+        with self._stats_lock:
+            if not usage.get('cached'):
+                self._llm_latency[section].record(time.perf_counter() - started)
+            self._answer_sources[section]['late_llm'] += 1
+    
+    def deadline_stats(self) -> Dict:
+        """
+        Per hedged section: answers by source ('late_llm' = LLM replies that
+        missed the deadline), LLM latency of non-streaming calls and time to
+        the first chunk of streamed ones, for tuning the deadline
+        """
+        with self._stats_lock:
+            return {section: {**self._answer_sources[section], 'llm_latency': self._llm_latency[section].stats(),
+                              'first_chunk_latency': self._first_chunk_latency[section].stats()}
+                    for section in HEDGED_SECTIONS}
+    
+    def _report_failure(self, error: Exception, section: str):
+        # Calls refused by an open breaker fall back quietly
+        if not isinstance(error, CircuitOpenError):
+            print(f"⚠️ OpenAI API call failed: {error}")
+            print(f"🔄 Using fallback {section}")
+    
+    def breaker_stats(self) -> Dict:
+        """Circuit breaker state and OpenAI latency histograms"""
+        return self.breaker.stats()
+    
+    def cache_stats(self) -> Dict:
+        """LLM response cache counters ({} without a cache)"""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    @staticmethod
+    def _query_understanding_request(user_query: Union[str, ParsedQuery]) -> Dict:
         system_prompt = """
         You are an expert insurance advisor. Analyze the user's query and extract structured information.
         
@@ -61,34 +340,43 @@ class GenAIAgent:
         Return the analysis in a structured format.
         """
         
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Analyze this insurance query: {user_query}"}
-                ],
-                temperature=0.3,
-                max_tokens=200
-            )
-            
-            return {"ai_analysis": response.choices[0].message.content}
-        except Exception as e:
-            print(f"⚠️ OpenAI API call failed: {e}")
-            print("🔄 Using fallback analysis")
-            self.use_openai = False  # Disable for future calls
-            return self.fallback_agent.enhance_query_understanding(user_query)
+        return {
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Analyze this insurance query: {_query_text(user_query)}"}
+            ],
+            'temperature': 0.3,
+            'max_tokens': 200
+        }
     
-    def generate_personalized_explanation(self, recommendations: List[Dict], user_query: str) -> str:
+    def _query_understanding_failed(self, error: Exception, user_query: Union[str, ParsedQuery]) -> Dict:
+        self._report_failure(error, 'analysis')
+        return self.fallback_agent.enhance_query_understanding(user_query)
+    
+    def enhance_query_understanding(self, user_query: Union[str, ParsedQuery]) -> Dict:
         """
-        Generate a personalized explanation using GenAI or fallback logic
+        Use GenAI to better understand user intent and extract structured information
         """
         if not self.use_openai:
-            return self.fallback_agent.generate_personalized_explanation(recommendations, user_query)
+            return self.fallback_agent.enhance_query_understanding(user_query)
         
-        if not recommendations:
-            return "I couldn't find suitable insurance products for your requirements. Please try adjusting your criteria."
+        try:
+            return {"ai_analysis": self._chat_completion(self._query_understanding_request(user_query))}
+        except Exception as e:
+            return self._query_understanding_failed(e, user_query)
+    
+    async def enhance_query_understanding_async(self, user_query: Union[str, ParsedQuery]) -> Dict:
+        """Non-blocking enhance_query_understanding"""
+        if not self.use_openai:
+            return self.fallback_agent.enhance_query_understanding(user_query)
         
+        try:
+            return {"ai_analysis": await self._chat_completion_async(self._query_understanding_request(user_query))}
+        except Exception as e:
+            return self._query_understanding_failed(e, user_query)
+    
+    @staticmethod
+    def _explanation_request(recommendations: List[Dict], user_query: Union[str, ParsedQuery]) -> Dict:
         products_summary = "\n".join([
             f"- {rec['name']}: ₹{rec['monthly_premium']}/month, Coverage: ₹{rec['coverage']:,}, "
             f"Critical Illness: {rec['critical_illness']}, Maternity: {rec['maternity']}, "
@@ -108,7 +396,7 @@ class GenAIAgent:
         """
         
         user_prompt = f"""
-        User Query: {user_query}
+        User Query: {_query_text(user_query)}
         
         Recommended Products:
         {products_summary}
@@ -116,34 +404,57 @@ class GenAIAgent:
         Please provide a personalized explanation for these recommendations.
         """
         
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"⚠️ OpenAI API call failed: {e}")
-            print("🔄 Using fallback explanation")
-            self.use_openai = False  # Disable for future calls
-            return self.fallback_agent.generate_personalized_explanation(recommendations, user_query)
+        return {
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            'temperature': 0.7,
+            'max_tokens': 500
+        }
     
-    def generate_comparative_analysis(self, recommendations: List[Dict]) -> str:
+    def _explanation_failed(self, error: Exception, recommendations: List[Dict],
+                            user_query: Union[str, ParsedQuery]) -> str:
+        self._report_failure(error, 'explanation')
+        return self.fallback_agent.generate_personalized_explanation(recommendations, user_query)
+    
+    def generate_personalized_explanation(self, recommendations: List[Dict], user_query: Union[str, ParsedQuery]) -> str:
         """
-        Generate a comparative analysis of recommended products
+        Generate a personalized explanation using GenAI or fallback logic
         """
         if not self.use_openai:
-            return self.fallback_agent.generate_comparative_analysis(recommendations)
+            return self.fallback_agent.generate_personalized_explanation(recommendations, user_query)
         
-        if len(recommendations) < 2:
-            return ""
+        if not recommendations:
+            return "I couldn't find suitable insurance products for your requirements. Please try adjusting your criteria."
+        
+        if self.deadline is not None:
+            return self._run(self.generate_personalized_explanation_async(recommendations, user_query))
         
+        try:
+            return self._chat_completion(self._explanation_request(recommendations, user_query))
+        except Exception as e:
+            return self._explanation_failed(e, recommendations, user_query)
+    
+    async def generate_personalized_explanation_async(self, recommendations: List[Dict],
+                                                      user_query: Union[str, ParsedQuery]) -> str:
+        """Non-blocking generate_personalized_explanation"""
+        if not self.use_openai or not recommendations:
+            return self.generate_personalized_explanation(recommendations, user_query)
+        
+        if self.deadline is not None:
+            text, _ = await self._hedged(
+                'explanation', self._explanation_request(recommendations, user_query),
+                lambda: self.fallback_agent.generate_personalized_explanation(recommendations, user_query))
+            return text
+        
+        try:
+            return await self._chat_completion_async(self._explanation_request(recommendations, user_query))
+        except Exception as e:
+            return self._explanation_failed(e, recommendations, user_query)
+    
+    @staticmethod
+    def _comparison_request(recommendations: List[Dict]) -> Dict:
         products_data = "\n".join([
             f"{i+1}. {rec['name']}: Premium ₹{rec['monthly_premium']}, Coverage ₹{rec['coverage']:,}, Co-pay {rec['co_pay']}%"
             for i, rec in enumerate(recommendations)
@@ -157,23 +468,400 @@ class GenAIAgent:
         Keep it concise and practical.
         """
         
+        return {
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Compare these insurance products:\n{products_data}"}
+            ],
+            'temperature': 0.5,
+            'max_tokens': 300
+        }
+    
+    def _comparison_failed(self, error: Exception, recommendations: List[Dict]) -> str:
+        self._report_failure(error, 'comparison')
+        return self.fallback_agent.generate_comparative_analysis(recommendations)
+    
+    def generate_comparative_analysis(self, recommendations: List[Dict]) -> str:
+        """
+        Generate a comparative analysis of recommended products
+        """
+        if not self.use_openai:
+            return self.fallback_agent.generate_comparative_analysis(recommendations)
+        
+        if len(recommendations) < 2:
+            return ""
+        
+        if self.deadline is not None:
+            return self._run(self.generate_comparative_analysis_async(recommendations))
+        
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Compare these insurance products:\n{products_data}"}
-                ],
-                temperature=0.5,
-                max_tokens=300
-            )
-            
-            return response.choices[0].message.content
+            return self._chat_completion(self._comparison_request(recommendations))
         except Exception as e:
-            print(f"⚠️ OpenAI API call failed: {e}")
-            print("🔄 Using fallback comparison")
-            self.use_openai = False  # Disable for future calls
-            return self.fallback_agent.generate_comparative_analysis(recommendations)
+            return self._comparison_failed(e, recommendations)
+    
+    async def generate_comparative_analysis_async(self, recommendations: List[Dict]) -> str:
+        """Non-blocking generate_comparative_analysis"""
+        if not self.use_openai or len(recommendations) < 2:
+            return self.generate_comparative_analysis(recommendations)
+        
+        if self.deadline is not None:
+            text, _ = await self._hedged(
+                'comparison', self._comparison_request(recommendations),
+                lambda: self.fallback_agent.generate_comparative_analysis(recommendations))
+            return text
+        
+        try:
+            return await self._chat_completion_async(self._comparison_request(recommendations))
+        except Exception as e:
+            return self._comparison_failed(e, recommendations)
+    
+    @staticmethod
+    def _combined_request(recommendations: List[Dict], user_query: Union[str, ParsedQuery]) -> Dict:
+        products_summary = "\n".join([
+            f"{i+1}. {rec['name']}: ₹{rec['monthly_premium']}/month, Coverage: ₹{rec['coverage']:,}, "
+            f"Critical Illness: {rec['critical_illness']}, Maternity: {rec['maternity']}, "
+            f"Accident: {rec['accident']}, Co-pay: {rec['co_pay']}%"
+            for i, rec in enumerate(recommendations)
+        ])
+        comparison = ("compare the products: best value for money, trade-offs between premium and coverage, "
+                      "suitable scenarios for each" if len(recommendations) > 1 else "an empty string")
+        
+        system_prompt = f"""
+        You are an expert and friendly insurance advisor. Reply with a JSON object with exactly these string fields:
+        - "analysis": what the user's query tells you (age, gender, marital status, insurance needs, budget
+          preferences, specific conditions), in a structured format
+        - "summary": a personalized, conversational explanation of why the recommended products fit the user,
+          their key benefits and practical advice; concise but informative
+        - "comparison": {comparison}; concise and practical
+        Use Indian Rupees (₹) for currency.
+        """
+        
+        user_prompt = f"""
+        User Query: {_query_text(user_query)}
+        
+        Recommended Products:
+        {products_summary}
+        """
+        
+        return {
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            'temperature': 0.5,
+            'max_tokens': 1000,
+            'response_format': {'type': 'json_object'}
+        }
+    
+    @staticmethod
+    def _combined_sections(reply: str) -> Dict[str, str]:
+        """Well-formed sections of a combined reply; missing or malformed ones are left out"""
+        text = reply.strip()
+        # Tolerate a reply wrapped in a ```json fence
+        fenced = re.match(r'^```(?:json)?\s*(.*?)\s*```$', text, re.DOTALL)
+        if fenced:
+            text = fenced.group(1)
+        try:
+            document = json.loads(text)
+        except ValueError:
+            return {}
+        if not isinstance(document, dict):
+            return {}
+        return {section: document[section].strip() for section in COMBINED_SECTIONS
+                if isinstance(document.get(section), str) and document[section].strip()}
+    
+    async def generate_combined_insights_async(self, recommendations: List[Dict],
+                                               user_query: Union[str, ParsedQuery]) -> Dict:
+        """
+        Analysis, summary and comparison from one JSON-mode request
+        Each section that is missing or malformed falls back to LocalGenAIAgent
+        on its own; 'sources' says which answered and 'usage' holds the tokens.
+        """
+        usage = dict.fromkeys(TOKEN_FIELDS, 0)
+        sections = {}
+        if self.use_openai and recommendations:
+            try:
+                reply = await self._chat_completion_async(self._combined_request(recommendations, user_query),
+                                                          usage=usage)
+                sections = self._combined_sections(reply)
+            except Exception as e:
+                self._report_failure(e, 'insights')
+        
+        sources = {section: 'llm' if section in sections else 'fallback' for section in COMBINED_SECTIONS}
+        if len(recommendations) < 2:
+            # Nothing to compare, whatever the reply says
+            sections['comparison'] = ""
+            sources['comparison'] = 'none'
+        if 'analysis' not in sections:
+            ai_analysis = self.fallback_agent.enhance_query_understanding(user_query)
+        else:
+            ai_analysis = {'ai_analysis': sections['analysis']}
+        if 'summary' not in sections:
+            sections['summary'] = self.fallback_agent.generate_personalized_explanation(recommendations, user_query)
+        if 'comparison' not in sections:
+            sections['comparison'] = self.fallback_agent.generate_comparative_analysis(recommendations)
+        return {'ai_analysis': ai_analysis, 'explanation': sections['summary'], 'comparison': sections['comparison'],
+                'sources': sources, 'usage': usage}
+    
+    def _combined_fallback(self, recommendations: List[Dict], user_query: Union[str, ParsedQuery]) -> Dict:
+        return {'ai_analysis': self.fallback_agent.enhance_query_understanding(user_query),
+                'explanation': self.fallback_agent.generate_personalized_explanation(recommendations, user_query),
+                'comparison': self.fallback_agent.generate_comparative_analysis(recommendations),
+                'sources': dict.fromkeys(COMBINED_SECTIONS, 'fallback'), 'usage': dict.fromkeys(TOKEN_FIELDS, 0)}
+    
+    @staticmethod
+    async def _within(name: str, call, fallback: Callable, timeout: float, timings: Dict):
+        """Await call for at most timeout seconds, else the fallback's result; seconds go to timings[name]"""
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            print(f"⏱️ OpenAI {name} call timed out after {timeout:g}s, using fallback")
+            return fallback()
+        finally:
+            timings[name] = time.perf_counter() - start
+    
+    async def generate_insights_async(self, recommendations: List[Dict], user_query: Union[str, ParsedQuery],
+                                      timeout: float = GENAI_CALL_TIMEOUT) -> Dict:
+        """
+        Query analysis, personalized explanation and comparison, requested concurrently
+        Each call gets its own timeout; a call that runs out falls back to the
+        rule-based text for that section only. 'timings' holds seconds per call.
+        """
+        timings = {}
+        if self.combined and self.use_openai and recommendations:
+            insights = await self._within('insights', self.generate_combined_insights_async(recommendations, user_query),
+                                          lambda: self._combined_fallback(recommendations, user_query),
+                                          timeout, timings)
+            return dict(insights, timings=timings)
+        
+        ai_analysis, explanation, comparison = await asyncio.gather(
+            self._within('analysis', self.enhance_query_understanding_async(user_query),
+                         lambda: self.fallback_agent.enhance_query_understanding(user_query), timeout, timings),
+            self._within('explanation', self.generate_personalized_explanation_async(recommendations, user_query),
+                         lambda: self.fallback_agent.generate_personalized_explanation(recommendations, user_query),
+                         timeout, timings),
+            self._within('comparison', self.generate_comparative_analysis_async(recommendations),
+                         lambda: self.fallback_agent.generate_comparative_analysis(recommendations), timeout, timings)
+        )
+        return {'ai_analysis': ai_analysis, 'explanation': explanation, 'comparison': comparison,
+                'timings': timings}
+    
+    def generate_insights(self, recommendations: List[Dict], user_query: Union[str, ParsedQuery],
+                          timeout: float = GENAI_CALL_TIMEOUT) -> Dict:
+        """
+        Blocking entry point to generate_insights_async (for Streamlit and scripts);
+        end-to-end latency is that of the slowest call instead of the sum
+        """
+        return self._run(self.generate_insights_async(recommendations, user_query, timeout))
+    
+    async def _chat_completion_stream(self, request: Dict, usage: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Chat completion in stream mode: reply text chunks as they are generated"""
+        request = {'model': OPENAI_MODEL, **request}
+        cached = self._request_started(request, True)
+        if cached is not None:
+            self._cache_hit_usage(usage)
+            for chunk in _text_chunks(cached):
+                yield chunk
+            return
+        started = time.perf_counter()
+        parts = []
+        tokens = None
+        self._use_session()
+        try:
+            response = await openai.ChatCompletion.acreate(stream=True, stream_options={'include_usage': True},
+                                                           request_timeout=OPENAI_REQUEST_TIMEOUT, **request)
+            async for event in response:
+                # With include_usage the last event has the token counts and no choices
+                if event.get('usage'):
+                    tokens = dict(event['usage'])
+                if not event.get('choices'):
+                    continue
+                delta = event.choices[0].delta.get('content')
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except (Exception, asyncio.CancelledError):
+            self._request_failed(started)
+            raise
+        except GeneratorExit:
+            # Closed by its reader (aclose() or garbage collection) before the reply ended:
+            # no outcome to record, but a half-open probe must not stay reserved
+            self.breaker.release()
+            raise
+        self._count_usage(tokens, usage)
+        self._request_succeeded(started, request, ''.join(parts), True)
+    
+    async def _stream_or_fallback(self, section: str, request: Dict, fallback: Callable[[], str]) -> AsyncIterator[str]:
+        """
+        The LLM's stream, or the rule-based text if it fails before its first chunk.
+        In deadline mode the first chunk must also arrive within the deadline; a
+        stream that misses it keeps running in the background to fill the cache.
+        """
+        usage = {}
+        chunks = self._chat_completion_stream(request, usage)
+        streamed = False
+        try:
+            if self.deadline is not None:
+                started = time.perf_counter()
+                first = asyncio.ensure_future(chunks.__anext__())
+                # Built on a worker thread while the request is in flight, as in _hedged
+                fallback_text = asyncio.get_running_loop().run_in_executor(None, fallback)
+                try:
+                    chunk = await asyncio.wait_for(asyncio.shield(first), self.deadline)
+                except asyncio.TimeoutError:
+                    self._finish_late_stream(section, started, first, chunks, usage)
+                    self._count_source(section, 'fallback')
+                    for chunk in _text_chunks(await fallback_text):
+                        yield chunk
+                    return
+                except StopAsyncIteration:
+                    self._count_source(section, 'llm')
+                    return
+                if not usage.get('cached'):
+                    with self._stats_lock:
+                        self._first_chunk_latency[section].record(time.perf_counter() - started)
+                self._count_source(section, 'llm')
+                streamed = True
+                yield chunk
+            async for chunk in chunks:
+                streamed = True
+                yield chunk
+        except Exception as e:
+            self._report_failure(e, section)
+            # Text already shown stays; only a stream that never started is replaced
+            if not streamed:
+                if self.deadline is not None:
+                    self._count_source(section, 'fallback')
+                for chunk in _text_chunks(fallback()):
+                    yield chunk
+    
+    def _finish_late_stream(self, section: str, started: float, first: asyncio.Future,
+                            chunks: AsyncIterator[str], usage: Dict):
+        """Read a stream that missed the deadline to its end, so the reply lands in the response cache"""
+        async def drain():
+            try:
+                await first
+                if not usage.get('cached'):
+                    with self._stats_lock:
+                        self._first_chunk_latency[section].record(time.perf_counter() - started)
+                async for _ in chunks:
+                    pass
+            except Exception:
+                # Already counted by the breaker; nobody is waiting for this text
+                return
+            self._count_source(section, 'late_llm')
+        
+        task = asyncio.ensure_future(drain())
+        # The loop only keeps weak references to tasks
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    async def stream_personalized_explanation_async(self, recommendations: List[Dict],
+                                                    user_query: Union[str, ParsedQuery]) -> AsyncIterator[str]:
+        """generate_personalized_explanation as text chunks, streamed from the API when available"""
+        if not self.use_openai or not recommendations:
+            for chunk in _text_chunks(self.generate_personalized_explanation(recommendations, user_query)):
+                yield chunk
+            return
+        async for chunk in self._stream_or_fallback(
+                'explanation', self._explanation_request(recommendations, user_query),
+                lambda: self.fallback_agent.generate_personalized_explanation(recommendations, user_query)):
+            yield chunk
+    
+    async def stream_comparative_analysis_async(self, recommendations: List[Dict]) -> AsyncIterator[str]:
+        """generate_comparative_analysis as text chunks, streamed from the API when available"""
+        if not self.use_openai or len(recommendations) < 2:
+            for chunk in _text_chunks(self.generate_comparative_analysis(recommendations)):
+                yield chunk
+            return
+        async for chunk in self._stream_or_fallback(
+                'comparison', self._comparison_request(recommendations),
+                lambda: self.fallback_agent.generate_comparative_analysis(recommendations)):
+            yield chunk
+    
+    def _iterate(self, chunks: AsyncIterator[str]) -> Iterator[str]:
+        """
+        Start an async chunk stream on the agent's loop right away and return
+        a blocking iterator over it; chunks buffer until they are consumed
+        """
+        buffer = queue.Queue()
+        
+        async def pump():
+            try:
+                async for chunk in chunks:
+                    buffer.put((chunk, None))
+            except Exception as e:
+                # Handed to the reader only: re-raising would leave an exception
+                # on a future nobody awaits ("Future exception was never retrieved")
+                buffer.put((None, e))
+                return
+            except BaseException as e:
+                # Cancellation still has to reach the loop
+                buffer.put((None, e))
+                raise
+            buffer.put((None, None))
+        
+        asyncio.run_coroutine_threadsafe(pump(), self._event_loop())
+        
+        def drain():
+            while True:
+                chunk, error = buffer.get()
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    return
+                yield chunk
+        
+        return drain()
+    
+    def stream_personalized_explanation(self, recommendations: List[Dict],
+                                        user_query: Union[str, ParsedQuery]) -> Iterator[str]:
+        """Blocking iterator over stream_personalized_explanation_async"""
+        return self._iterate(self.stream_personalized_explanation_async(recommendations, user_query))
+    
+    def stream_comparative_analysis(self, recommendations: List[Dict]) -> Iterator[str]:
+        """Blocking iterator over stream_comparative_analysis_async"""
+        return self._iterate(self.stream_comparative_analysis_async(recommendations))
+    
+    def stream_insights(self, recommendations: List[Dict], user_query: Union[str, ParsedQuery],
+                        timeout: float = GENAI_CALL_TIMEOUT) -> Dict:
+        """
+        Start all three GenAI calls at once for incremental rendering:
+        'ai_analysis' is a Future of the analysis dict, 'explanation' and
+        'comparison' are chunk iterators that fill while the others are read.
+        In deadline mode a stream whose first chunk misses the deadline is replaced
+        by the rule-based text.
+        In combined mode the three sections arrive together from one request.
+        """
+        if self.combined and self.use_openai and recommendations:
+            combined = asyncio.run_coroutine_threadsafe(
+                self._within('insights', self.generate_combined_insights_async(recommendations, user_query),
+                             lambda: self._combined_fallback(recommendations, user_query), timeout, {}),
+                self._event_loop())
+            ai_analysis = concurrent.futures.Future()
+            
+            def analysis_ready(future: concurrent.futures.Future):
+                if future.exception() is not None:
+                    ai_analysis.set_exception(future.exception())
+                else:
+                    ai_analysis.set_result(future.result()['ai_analysis'])
+            
+            combined.add_done_callback(analysis_ready)
+            
+            def section(name: str) -> Iterator[str]:
+                yield from _text_chunks(combined.result()[name])
+            
+            return {'ai_analysis': ai_analysis, 'explanation': section('explanation'),
+                    'comparison': section('comparison')}
+        
+        ai_analysis = asyncio.run_coroutine_threadsafe(
+            self._within('analysis', self.enhance_query_understanding_async(user_query),
+                         lambda: self.fallback_agent.enhance_query_understanding(user_query), timeout, {}),
+            self._event_loop())
+        return {'ai_analysis': ai_analysis,
+                'explanation': self.stream_personalized_explanation(recommendations, user_query),
+                'comparison': self.stream_comparative_analysis(recommendations)}
     
     def test_openai_connection(self) -> bool:
         """
@@ -183,14 +871,10 @@ class GenAIAgent:
             return False
         
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": "Test"}],
-                max_tokens=1,
-                temperature=0
-            )
+            self._chat_completion({'messages': [{"role": "user", "content": "Test"}], 'max_tokens': 1,
+                                   'temperature': 0}, use_cache=False)
             return True
         except Exception as e:
+            # Counted by the circuit breaker; a transient failure doesn't disable OpenAI
             print(f"❌ OpenAI connection test failed: {e}")
-            self.use_openai = False
             return False
@@ -0,0 +1,159 @@
+"""
+Disk-backed cache of LLM responses
+One SQLite file per host, shared by every app worker: WAL mode lets readers
+run alongside a writer, and writers queue on the database lock. Entries are
+keyed on a hash of the full request (model, prompts, temperature, max_tokens).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '.llm_cache.sqlite')
+# Seconds a response stays valid; 0 keeps entries until they are evicted
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', str(24 * 3600)))
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '10000'))
+# Evaluation runs set LLM_CACHE_BYPASS=1 so every request reaches the model
+LLM_CACHE_BYPASS = os.getenv('LLM_CACHE_BYPASS', '').lower() in ('1', 'true', 'yes')
+
+# Seconds a writer waits for another process's transaction before giving up
+BUSY_TIMEOUT = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def request_key(request: Dict) -> str:
+    """Stable hash of a chat completion request"""
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    SQLite LRU cache with TTL for chat completion replies
+    Counters are per process; size is the shared file's.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: Optional[float] = LLM_CACHE_TTL,
+                 maxsize: int = LLM_CACHE_SIZE, bypass: bool = LLM_CACHE_BYPASS, clock=time.time):
+        self.path = path
+        self.ttl = ttl or None
+        self.maxsize = maxsize
+        # Skip the cache entirely (no reads, no writes)
+        self.bypass = bypass
+        # Wall clock: entries are compared across processes
+        self.clock = clock
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit; writes open their own IMMEDIATE transaction
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def get(self, request: Dict) -> Optional[str]:
+        """Cached reply for request, or None on a miss"""
+        if self.bypass or self.maxsize <= 0:
+            return None
+        key = request_key(request)
+        now = self.clock()
+        try:
+            connection = self._connection()
+            row = connection.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+
+            response, created_at = row
+            if self.ttl is not None and now - created_at >= self.ttl:
+                connection.execute('DELETE FROM responses WHERE key = ? AND created_at = ?', (key, created_at))
+                self._count('expirations')
+                self._count('misses')
+                return None
+
+            connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            # A locked or broken cache file must never fail the request
+            print(f"⚠️ LLM cache read failed: {e}")
+            self._count('errors')
+            return None
+        self._count('hits')
+        return response
+
+    def put(self, request: Dict, response: str):
+        """Store a reply, evicting the least recently used entries beyond maxsize"""
+        if self.bypass or self.maxsize <= 0:
+            return
+        key = request_key(request)
+        now = self.clock()
+        try:
+            connection = self._connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)', (key, response, now, now))
+                evicted = connection.execute(
+                    'DELETE FROM responses WHERE key IN '
+                    '(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.maxsize,)
+                ).rowcount
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache write failed: {e}")
+            self._count('errors')
+            return
+        if evicted > 0:
+            self._count('evictions', evicted)
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM responses')
+
+    def stats(self) -> Dict:
+        """Counters for sizing the cache"""
+        size = self._connection().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': size,
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'errors': self.errors,
+                'bypass': self.bypass
+            }
@@ -0,0 +1,280 @@
+"""
+Local OpenAI-compatible stub server
+Speaks the ChatCompletion wire protocol (POST /v1/chat/completions, JSON or
+server-sent-event streaming) with deterministic templated replies, sampled
+latency and injected errors, so the GenAI layer can be benchmarked without
+the real API.
+Run:   python openai_stub.py --port 8765 --latency lognormal:0.8:0.5 --error-429 0.05
+Point: OPENAI_API_BASE=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub streamlit run app.py
+Stats: curl http://127.0.0.1:8765/stats
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+
+DEFAULT_TEMPLATE = "Stub answer for: {prompt}"
+
+# Filler vocabulary for replies longer than the template
+_WORDS = ('coverage', 'premium', 'plan', 'benefit', 'family', 'health', 'policy', 'claim', 'value',
+          'hospital', 'protection', 'budget', 'monthly', 'critical', 'accident', 'maternity')
+
+
+def latency_sampler(spec: str, rng: random.Random) -> Callable[[], float]:
+    """
+    Seconds-per-request sampler from a spec: fixed:S, uniform:LOW:HIGH,
+    exponential:MEAN or lognormal:MEDIAN:SIGMA
+    """
+    kind, *params = spec.split(':')
+    try:
+        values = [float(param) for param in params]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec {spec!r}")
+    shapes = {
+        'fixed': (1, lambda s: s),
+        'uniform': (2, lambda low, high: rng.uniform(low, high)),
+        'exponential': (1, lambda mean: rng.expovariate(1 / mean) if mean > 0 else 0.0),
+        'lognormal': (2, lambda median, sigma: rng.lognormvariate(math.log(median), sigma))
+    }
+    if kind not in shapes or len(values) != shapes[kind][0]:
+        raise ValueError(f"Invalid latency spec {spec!r}; expected fixed:S, uniform:LOW:HIGH, "
+                         f"exponential:MEAN or lognormal:MEDIAN:SIGMA")
+    sample = shapes[kind][1]
+    return lambda: max(0.0, sample(*values))
+
+
+class StubSettings:
+    """
+    Behaviour of the stub; attributes may be changed while it serves
+    (benchmarks switch error rates between phases)
+    """
+
+    def __init__(self, latency: str = 'fixed:0', token_interval: float = 0.0, error_429: float = 0.0,
+                 error_500: float = 0.0, timeout_rate: float = 0.0, hang_seconds: float = 60.0,
+                 reply_words: int = 60, template: str = DEFAULT_TEMPLATE, seed: int = 0):
+        for name, rate in (('error_429', error_429), ('error_500', error_500), ('timeout_rate', timeout_rate)):
+            if not 0 <= rate <= 1:
+                raise ValueError(f"{name} must be in [0, 1], got {rate}")
+        self.rng = random.Random(seed)
+        self.set_latency(latency)
+        # Seconds between streamed chunks (after the sampled time to first token)
+        self.token_interval = token_interval
+        self.error_429 = error_429
+        self.error_500 = error_500
+        # Requests that never answer within hang_seconds, to exercise client timeouts
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.reply_words = reply_words
+        self.template = template
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'ok': 0, 'streamed': 0, 'error_429': 0, 'error_500': 0, 'timeouts': 0}
+
+    def set_latency(self, spec: str):
+        self.sample_latency = latency_sampler(spec, self.rng)
+        self.latency = spec
+
+    def draw(self):
+        """(outcome, latency) for one request"""
+        with self.lock:
+            latency = self.sample_latency()
+            roll = self.rng.random()
+        if roll < self.timeout_rate:
+            return 'timeouts', self.hang_seconds
+        roll -= self.timeout_rate
+        if roll < self.error_429:
+            return 'error_429', latency
+        roll -= self.error_429
+        if roll < self.error_500:
+            return 'error_500', latency
+        return 'ok', latency
+
+    def count(self, outcome: str):
+        with self.lock:
+            self.counts['requests'] += 1
+            self.counts[outcome] += 1
+
+
+def stub_reply(request: Dict, settings: StubSettings) -> str:
+    """
+    Deterministic reply: the template, then filler words seeded by the request.
+    In JSON mode, an object with one such text per "key": named in the system prompt
+    """
+    messages = request.get('messages', [])
+    prompt = next((message['content'] for message in reversed(messages) if message.get('role') == 'user'), '')
+    first_line = next((line.strip() for line in prompt.splitlines() if line.strip()), '')
+    text = settings.template.format(prompt=first_line[:120], model=request.get('model', ''))
+
+    words = min(int(request.get('max_tokens') or settings.reply_words), settings.reply_words)
+    digest = hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).digest()
+    filler = [_WORDS[digest[i % len(digest)] % len(_WORDS)] for i in range(max(0, words - len(text.split())))]
+    reply = ' '.join([text] + filler)
+
+    if (request.get('response_format') or {}).get('type') == 'json_object':
+        system = next((message['content'] for message in messages if message.get('role') == 'system'), '')
+        keys = list(dict.fromkeys(re.findall(r'"(\w+)":', system))) or ['reply']
+        return json.dumps({key: f"{key}: {reply}" for key in keys}, ensure_ascii=False)
+    return reply
+
+
+def _usage(request: Dict, text: str) -> Dict:
+    """Token counts, approximated by words"""
+    prompt_tokens = sum(len(str(message.get('content', '')).split()) for message in request.get('messages', []))
+    completion_tokens = len(text.split())
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens}
+
+
+def _completion_id(request: Dict) -> str:
+    return 'chatcmpl-stub' + hashlib.sha1(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'OpenAIStub/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict = None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, error_type: str, headers: Dict = None):
+        self._send_json(status, {'error': {'message': message, 'type': error_type, 'param': None, 'code': None}},
+                        headers)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            settings = self.server.settings
+            with settings.lock:
+                self._send_json(200, dict(settings.counts, latency=settings.latency))
+        else:
+            self._send_error(404, f"Unknown path {self.path}", 'invalid_request_error')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_error(404, f"Unknown path {self.path}", 'invalid_request_error')
+            return
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            self._send_error(400, "Request body is not valid JSON", 'invalid_request_error')
+            return
+
+        settings = self.server.settings
+        outcome, latency = settings.draw()
+        settings.count(outcome)
+        time.sleep(latency)
+        if outcome == 'error_429':
+            self._send_error(429, "Rate limit reached (injected by stub)", 'rate_limit_error', {'Retry-After': '1'})
+        elif outcome == 'error_500':
+            self._send_error(500, "Internal server error (injected by stub)", 'server_error')
+        elif outcome == 'timeouts':
+            self._send_error(504, "Stub request hung past hang_seconds", 'timeout')
+        elif request.get('stream'):
+            self._stream(request, settings)
+        else:
+            self._complete(request, settings)
+
+    def _complete(self, request: Dict, settings: StubSettings):
+        text = stub_reply(request, settings)
+        self._send_json(200, {
+            'id': _completion_id(request),
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': _usage(request, text)
+        })
+
+    def _stream(self, request: Dict, settings: StubSettings):
+        """Server-sent events: one word per chunk, the usage if stream_options asks for it, then [DONE]"""
+        with settings.lock:
+            settings.counts['streamed'] += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        base = {'id': _completion_id(request), 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': request.get('model', 'stub')}
+        text = stub_reply(request, settings)
+        words = text.split(' ')
+        deltas = [{'role': 'assistant'}] + [{'content': word if i == 0 else ' ' + word} for i, word in enumerate(words)]
+        try:
+            for i, delta in enumerate(deltas):
+                if i > 1 and settings.token_interval:
+                    time.sleep(settings.token_interval)
+                self._event(dict(base, choices=[{'index': 0, 'delta': delta, 'finish_reason': None}]))
+            self._event(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))
+            if (request.get('stream_options') or {}).get('include_usage'):
+                self._event(dict(base, choices=[], usage=_usage(request, text)))
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout or cancelled request)
+            pass
+
+    def _event(self, payload: Dict):
+        self.wfile.write(b'data: ' + json.dumps(payload).encode('utf-8') + b'\n\n')
+        self.wfile.flush()
+
+
+def start_stub_server(settings: StubSettings = None, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    Serve the stub from a daemon thread; port=0 picks a free port.
+    The API base is f"http://{host}:{server.server_address[1]}/v1"; stop with server.shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.settings = settings or StubSettings()
+    threading.Thread(target=server.serve_forever, name='openai-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0',
+                        help='fixed:S, uniform:LOW:HIGH, exponential:MEAN or lognormal:MEDIAN:SIGMA (seconds)')
+    parser.add_argument('--token-interval', type=float, default=0.0, help='seconds between streamed chunks')
+    parser.add_argument('--error-429', type=float, default=0.0, help='fraction of requests rate limited')
+    parser.add_argument('--error-500', type=float, default=0.0, help='fraction of requests failing with 500')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='fraction of requests that hang')
+    parser.add_argument('--hang-seconds', type=float, default=60.0)
+    parser.add_argument('--reply-words', type=int, default=60)
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE, help='reply template; {prompt} and {model}')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency, args.token_interval, args.error_429, args.error_500, args.timeout_rate,
+                            args.hang_seconds, args.reply_words, args.template, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.settings = settings
+    print(f"🧪 OpenAI stub listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
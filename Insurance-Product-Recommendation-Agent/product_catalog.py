@@ -0,0 +1,604 @@
+"""
+Compact struct-of-arrays product catalog
+Typed NumPy columns replace the pandas DataFrame at serving time
+Convert: python product_catalog.py convert insurance_products.csv insurance_products.arrow
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import os
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas and pyarrow are only imported on the paths that need them (CSV
+# parsing, DataFrame export, columnar files); snapshots need neither
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+pa = feather = pq = None
+
+
+def _import_pyarrow():
+    global pa, feather, pq
+    if pa is None:
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required for Arrow/Feather and Parquet catalogs")
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.feather
+        import pyarrow.parquet
+        pa, feather, pq = pyarrow, pyarrow.feather, pyarrow.parquet
+
+# Catalog columns in CSV order
+CATALOG_COLUMNS = ['id', 'name', 'type', 'age_min', 'age_max', 'coverage', 'critical_illness',
+                   'maternity', 'accident', 'co_pay', 'monthly_premium']
+
+NUMERIC_DTYPES = {
+    'id': np.int32,
+    'age_min': np.int32,
+    'age_max': np.int32,
+    'coverage': np.int64,
+    'co_pay': np.uint8,
+    'monthly_premium': np.int32
+}
+
+# One bit per Yes/No benefit column, plus one for Health products
+FLAG_BITS = {'critical_illness': 1, 'maternity': 2, 'accident': 4}
+HEALTH_BIT = 8
+
+# Columnar files written by the converter store the catalog's own layout
+# (typed columns, packed flags, dictionary-encoded strings) so they map straight
+# into NumPy arrays; any other Arrow/Parquet file is read as the CSV columns
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+PARQUET_EXTENSIONS = ('.parquet',)
+PACKED_LAYOUT_KEY = b'product_catalog_layout'
+PACKED_LAYOUT_VERSION = b'1'
+PACKED_COLUMNS = list(NUMERIC_DTYPES) + ['flags', 'name', 'type']
+
+
+class StringTable:
+    """
+    Interned strings: each distinct value is stored once in a UTF-8 buffer
+    and every product holds a small integer code into it
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray, codes: np.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.codes = codes
+        self._values = None
+        self._lookup = None
+
+    @classmethod
+    def from_values(cls, values) -> 'StringTable':
+        import pandas as pd
+        # Codes follow first appearance, so the same column always interns the same way
+        codes, unique = pd.factorize(pd.Series(values, dtype=object).astype(str))
+        encoded = [value.encode('utf-8') for value in unique.tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(buffer, offsets, codes.astype(np.min_scalar_type(max(len(encoded) - 1, 0))))
+
+    def values(self) -> List[str]:
+        """Distinct strings, indexed by code"""
+        if self._values is None:
+            data = self.buffer.tobytes()
+            self._values = [data[start:end].decode('utf-8')
+                            for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())]
+        return self._values
+
+    @classmethod
+    def from_arrow(cls, array: 'pa.DictionaryArray') -> 'StringTable':
+        """Wrap a dictionary-encoded string column without copying its buffers"""
+        _import_pyarrow()
+        dictionary = array.dictionary
+        offset_dtype = np.int64 if pa.types.is_large_string(dictionary.type) else np.int32
+        _, offsets, data = dictionary.buffers()
+        offsets = np.frombuffer(offsets, dtype=offset_dtype)[dictionary.offset:dictionary.offset + len(dictionary) + 1]
+        buffer = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+        return cls(buffer, offsets, _arrow_to_numpy(array.indices))
+
+    def to_arrow(self) -> 'pa.DictionaryArray':
+        _import_pyarrow()
+        return pa.DictionaryArray.from_arrays(pa.array(self.codes.astype(np.int32)),
+                                              pa.array(self.values(), type=pa.string()))
+
+    def __getitem__(self, position: int) -> str:
+        code = self.codes[position]
+        return self.buffer[self.offsets[code]:self.offsets[code + 1]].tobytes().decode('utf-8')
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tolist())
+
+    def take(self, positions: np.ndarray) -> List[str]:
+        return [self[position] for position in positions]
+
+    def tolist(self) -> List[str]:
+        values = self.values()
+        return [values[code] for code in self.codes.tolist()]
+
+    def _with_value(self, value: str) -> Tuple['StringTable', int]:
+        """Table whose dictionary holds value (self if it already does), and value's code"""
+        if self._lookup is None:
+            self._lookup = {existing: code for code, existing in enumerate(self.values())}
+        if value in self._lookup:
+            return self, self._lookup[value]
+        start, end = int(self.offsets[0]), int(self.offsets[-1])
+        encoded = np.frombuffer(value.encode('utf-8'), dtype=np.uint8)
+        buffer = np.concatenate([self.buffer[start:end], encoded])
+        offsets = np.append(self.offsets - start, end - start + len(encoded)).astype(np.int64)
+        code = len(offsets) - 2
+        codes = self.codes.astype(np.promote_types(self.codes.dtype, np.min_scalar_type(code)), copy=False)
+        return StringTable(buffer, offsets, codes), code
+
+    def _with_codes(self, codes: np.ndarray) -> 'StringTable':
+        """Table over the same dictionary (and its decoded caches) with other codes"""
+        table = StringTable(self.buffer, self.offsets, codes)
+        table._values, table._lookup = self._values, self._lookup
+        return table
+
+    def replaced(self, position: int, value: str) -> 'StringTable':
+        """Copy with one row's string replaced; the dictionary is shared unless value is new"""
+        table, code = self._with_value(value)
+        codes = table.codes.copy()
+        codes[position] = code
+        return table._with_codes(codes)
+
+    def appended(self, value: str) -> 'StringTable':
+        table, code = self._with_value(value)
+        return table._with_codes(np.append(table.codes, code).astype(table.codes.dtype))
+
+    def removed(self, position: int) -> 'StringTable':
+        return self._with_codes(np.delete(self.codes, position))
+
+    def sliced(self, start: int, end: int) -> 'StringTable':
+        """Rows [start, end) as a view sharing the dictionary"""
+        return self._with_codes(self.codes[start:end])
+
+    def recode(self, other: 'StringTable') -> np.ndarray:
+        """Per-row codes of these strings in other's table (-1 where other lacks the string)"""
+        lookup = {value: code for code, value in enumerate(other.values())}
+        mapping = np.array([lookup.get(value, -1) for value in self.values()], dtype=np.int64)
+        return mapping[self.codes] if len(mapping) else np.full(len(self), -1, dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.offsets[-1] - self.offsets[0]) + self.offsets.nbytes + self.codes.nbytes
+
+
+def _single_chunk(array):
+    """One contiguous Arrow array (copies only if the column has several chunks)"""
+    if isinstance(array, pa.ChunkedArray):
+        return array.chunk(0) if array.num_chunks == 1 else array.combine_chunks()
+    return array
+
+
+def _arrow_to_numpy(array) -> np.ndarray:
+    """NumPy view of a null-free Arrow column"""
+    return _single_chunk(array).to_numpy(zero_copy_only=False)
+
+
+def encode_product(product: Dict) -> Tuple[Dict[str, int], int, str, str]:
+    """
+    Validate one CSV-shaped product (e.g. a dict from the pricing feed).
+    Returns its numeric fields, packed benefit flags, name and type.
+    """
+    missing = [column for column in CATALOG_COLUMNS if column not in product]
+    if missing:
+        raise ValueError(f"Product is missing fields: {missing}")
+
+    values = {}
+    for column, dtype in NUMERIC_DTYPES.items():
+        value = product[column]
+        if isinstance(value, (float, np.floating)) and not float(value).is_integer():
+            # int() would truncate 999.7 and fail on NaN with an unrelated message
+            raise ValueError(f"Field '{column}' must be a whole number, got {value!r}")
+        value = int(value)
+        info = np.iinfo(dtype)
+        if value < info.min or value > info.max:
+            raise ValueError(f"Field '{column}' does not fit in {np.dtype(dtype).name}")
+        values[column] = value
+
+    flags = 0
+    for column, bit in FLAG_BITS.items():
+        if product[column] not in ('Yes', 'No'):
+            raise ValueError(f"Field '{column}' must be 'Yes' or 'No', got {product[column]!r}")
+        if product[column] == 'Yes':
+            flags |= bit
+    if product['type'] == 'Health':
+        flags |= HEALTH_BIT
+    return values, flags, str(product['name']), str(product['type'])
+
+
+class ProductView:
+    """
+    Lightweight read-only view of one catalog product
+    Supports product['column'] like the pd.Series rows it replaces
+    """
+    __slots__ = ('catalog', 'position')
+
+    def __init__(self, catalog: 'ProductCatalog', position: int):
+        self.catalog = catalog
+        self.position = position
+
+    def __getitem__(self, column: str):
+        return self.catalog.value(self.position, column)
+
+    def get(self, column: str, default=None):
+        try:
+            return self[column]
+        except KeyError:
+            return default
+
+    def keys(self) -> List[str]:
+        return list(CATALOG_COLUMNS)
+
+    def to_dict(self) -> Dict:
+        return {column: self[column] for column in CATALOG_COLUMNS}
+
+    def __repr__(self) -> str:
+        return f"ProductView({self.to_dict()})"
+
+
+class ProductCatalog:
+    """
+    Insurance products as typed NumPy columns
+    Benefits and the Health type are packed into one uint8 of bit flags;
+    names and types are interned string tables
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], flags: np.ndarray, names: StringTable, types: StringTable):
+        self.columns = columns
+        self.flags = flags
+        self.names = names
+        self.types = types
+        self.size = len(flags)
+        self._fingerprint = None
+
+        self.id = columns['id']
+        self.age_min = columns['age_min']
+        self.age_max = columns['age_max']
+        self.coverage = columns['coverage']
+        self.co_pay = columns['co_pay']
+        self.monthly_premium = columns['monthly_premium']
+
+    @classmethod
+    def from_dataframe(cls, df: 'pd.DataFrame') -> 'ProductCatalog':
+        missing = [column for column in CATALOG_COLUMNS if column not in df.columns]
+        if missing:
+            raise ValueError(f"Catalog is missing columns: {missing}")
+
+        columns = {}
+        for column, dtype in NUMERIC_DTYPES.items():
+            values = df[column].to_numpy()
+            if values.dtype.kind not in 'iub':
+                # astype() would truncate 999.7 and turn NaN into a garbage integer
+                try:
+                    values = values.astype(np.float64)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Column '{column}' must be numeric")
+                if not np.isfinite(values).all() or (values != np.floor(values)).any():
+                    raise ValueError(f"Column '{column}' must hold whole numbers, without missing values")
+            info = np.iinfo(dtype)
+            if len(values) and (values.min() < info.min or values.max() > info.max):
+                raise ValueError(f"Column '{column}' does not fit in {np.dtype(dtype).name}")
+            columns[column] = values.astype(dtype)
+
+        flags = np.zeros(len(df), dtype=np.uint8)
+        for column, bit in FLAG_BITS.items():
+            values = df[column]
+            unexpected = set(values.unique()) - {'Yes', 'No'}
+            if unexpected:
+                raise ValueError(f"Column '{column}' must be 'Yes' or 'No', got {sorted(map(str, unexpected))}")
+            flags[(values == 'Yes').to_numpy()] |= bit
+        flags[(df['type'] == 'Health').to_numpy()] |= HEALTH_BIT
+
+        return cls(columns, flags, StringTable.from_values(df['name']), StringTable.from_values(df['type']))
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> 'ProductCatalog':
+        import pandas as pd
+        return cls.from_dataframe(pd.read_csv(csv_path, usecols=CATALOG_COLUMNS))
+
+    @classmethod
+    def from_arrow(cls, table: 'pa.Table') -> 'ProductCatalog':
+        """Build from an Arrow table in the packed layout (zero-copy) or with the CSV columns"""
+        _import_pyarrow()
+        metadata = table.schema.metadata or {}
+        if metadata.get(PACKED_LAYOUT_KEY) is None:
+            return cls.from_dataframe(table.select(CATALOG_COLUMNS).to_pandas())
+        if metadata[PACKED_LAYOUT_KEY] != PACKED_LAYOUT_VERSION:
+            raise ValueError(f"Unsupported catalog layout version {metadata[PACKED_LAYOUT_KEY].decode()}")
+
+        columns = {column: _arrow_to_numpy(table.column(column)).astype(dtype, copy=False)
+                   for column, dtype in NUMERIC_DTYPES.items()}
+        flags = _arrow_to_numpy(table.column('flags')).astype(np.uint8, copy=False)
+        names, types = (StringTable.from_arrow(_single_chunk(table.column(column))) for column in ('name', 'type'))
+        return cls(columns, flags, names, types)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ProductCatalog':
+        """
+        Load a catalog from CSV, Arrow IPC/Feather or Parquet
+        Arrow files are memory-mapped, so processes loading the same file share
+        its pages through the OS page cache; only catalog columns are read
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in ARROW_EXTENSIONS + PARQUET_EXTENSIONS:
+            return cls.from_csv(path)
+        _import_pyarrow()
+
+        if extension in PARQUET_EXTENSIONS:
+            schema = pq.read_schema(path)
+            columns = PACKED_COLUMNS if (schema.metadata or {}).get(PACKED_LAYOUT_KEY) else CATALOG_COLUMNS
+            table = pq.read_table(path, columns=columns, memory_map=True).replace_schema_metadata(schema.metadata)
+        else:
+            # Buffers reference the mapping directly; columns never selected are never paged in
+            table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+            columns = PACKED_COLUMNS if (table.schema.metadata or {}).get(PACKED_LAYOUT_KEY) else CATALOG_COLUMNS
+            table = table.select(columns).replace_schema_metadata(table.schema.metadata)
+        return cls.from_arrow(table)
+
+    @classmethod
+    def iter_file(cls, path: str, chunk_size: int) -> Iterator['ProductCatalog']:
+        """
+        Read a catalog file as consecutive catalogs of at most chunk_size
+        products, holding only one chunk in memory at a time
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in ARROW_EXTENSIONS + PARQUET_EXTENSIONS:
+            import pandas as pd
+            for chunk in pd.read_csv(path, usecols=CATALOG_COLUMNS, chunksize=chunk_size):
+                yield cls.from_dataframe(chunk)
+            return
+        _import_pyarrow()
+
+        if extension in PARQUET_EXTENSIONS:
+            source = pq.ParquetFile(path, memory_map=True)
+            metadata = source.schema_arrow.metadata
+            columns = PACKED_COLUMNS if (metadata or {}).get(PACKED_LAYOUT_KEY) else CATALOG_COLUMNS
+            batches = source.iter_batches(batch_size=chunk_size, columns=columns)
+        else:
+            reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+            metadata = reader.schema.metadata
+            columns = PACKED_COLUMNS if (metadata or {}).get(PACKED_LAYOUT_KEY) else CATALOG_COLUMNS
+            batches = (reader.get_batch(i).select(columns).slice(start, chunk_size)
+                       for i in range(reader.num_record_batches)
+                       for start in range(0, reader.get_batch(i).num_rows, chunk_size))
+
+        for batch in batches:
+            # A chunk's dictionary columns still reference the whole file's
+            # dictionary; re-encode them so each chunk only holds its own strings
+            arrays = [pa.compute.dictionary_encode(array.dictionary_decode())
+                      if pa.types.is_dictionary(array.type) else array for array in batch.columns]
+            table = pa.Table.from_arrays(arrays, names=batch.schema.names)
+            yield cls.from_arrow(table.replace_schema_metadata(metadata))
+
+    def to_snapshot(self) -> Dict[str, np.ndarray]:
+        """Every catalog array, for an engine snapshot"""
+        arrays = dict(self.columns)
+        arrays['flags'] = self.flags
+        for prefix, table in (('names', self.names), ('types', self.types)):
+            arrays[f'{prefix}.buffer'] = table.buffer
+            arrays[f'{prefix}.offsets'] = table.offsets
+            arrays[f'{prefix}.codes'] = table.codes
+        return arrays
+
+    @classmethod
+    def from_snapshot(cls, arrays: Dict[str, np.ndarray]) -> 'ProductCatalog':
+        names, types = (StringTable(arrays[f'{prefix}.buffer'], arrays[f'{prefix}.offsets'], arrays[f'{prefix}.codes'])
+                        for prefix in ('names', 'types'))
+        return cls({column: arrays[column] for column in NUMERIC_DTYPES}, arrays['flags'], names, types)
+
+    def to_arrow(self) -> 'pa.Table':
+        """Arrow table in the packed layout read back by from_arrow"""
+        _import_pyarrow()
+        arrays = {column: pa.array(self.columns[column]) for column in NUMERIC_DTYPES}
+        arrays['flags'] = pa.array(self.flags)
+        arrays['name'] = self.names.to_arrow()
+        arrays['type'] = self.types.to_arrow()
+        return pa.table(arrays, metadata={PACKED_LAYOUT_KEY: PACKED_LAYOUT_VERSION})
+
+    def save(self, path: str):
+        """Write an uncompressed Arrow IPC file (mappable) or a Parquet file, by extension"""
+        _import_pyarrow()
+        extension = os.path.splitext(path)[1].lower()
+        if extension in PARQUET_EXTENSIONS:
+            pq.write_table(self.to_arrow(), path)
+        elif extension in ARROW_EXTENSIONS:
+            # One record batch, so every column maps as a single contiguous buffer
+            feather.write_feather(self.to_arrow(), path, compression='uncompressed', chunksize=max(len(self), 1))
+        else:
+            raise ValueError(f"Unsupported catalog format: {extension}")
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, position: int) -> ProductView:
+        return ProductView(self, position)
+
+    def __iter__(self) -> Iterator[ProductView]:
+        return (ProductView(self, position) for position in range(self.size))
+
+    def flag(self, column: str) -> np.ndarray:
+        """Boolean mask of products with a 'Yes' in a benefit column"""
+        return (self.flags & FLAG_BITS[column]) != 0
+
+    @property
+    def is_health(self) -> np.ndarray:
+        return (self.flags & HEALTH_BIT) != 0
+
+    def value(self, position: int, column: str):
+        """One product field as a plain Python value ('Yes'/'No' for benefits)"""
+        if column in NUMERIC_DTYPES:
+            return int(self.columns[column][position])
+        if column in FLAG_BITS:
+            return 'Yes' if self.flags[position] & FLAG_BITS[column] else 'No'
+        if column == 'name':
+            return self.names[position]
+        if column == 'type':
+            return self.types[position]
+        raise KeyError(column)
+
+    def columns_at(self, positions: np.ndarray) -> Dict[str, list]:
+        """Plain Python column values for a few products, e.g. the top-N winners"""
+        result = {column: values[positions].tolist() for column, values in self.columns.items()}
+        flags = self.flags[positions]
+        for column, bit in FLAG_BITS.items():
+            result[column] = ['Yes' if flag & bit else 'No' for flag in flags.tolist()]
+        result['name'] = self.names.take(positions)
+        result['type'] = self.types.take(positions)
+        return result
+
+    def position_of(self, product_id: int) -> Optional[int]:
+        """Catalog position of a product id, None if it isn't in the catalog"""
+        positions = np.flatnonzero(self.id == product_id)
+        return int(positions[0]) if len(positions) else None
+
+    def replaced(self, position: int, product: Dict) -> Tuple['ProductCatalog', List[str]]:
+        """
+        Copy-on-write edit of one product. Columns the edit leaves alone are
+        shared with this catalog; only changed columns are copied. Also
+        returns the changed fields ('flags' for benefits and Health type).
+        """
+        values, flags, name, product_type = encode_product(product)
+        columns = dict(self.columns)
+        changed = []
+        for column, value in values.items():
+            if self.columns[column][position] != value:
+                columns[column] = self.columns[column].copy()
+                columns[column][position] = value
+                changed.append(column)
+
+        new_flags = self.flags
+        if self.flags[position] != flags:
+            new_flags = self.flags.copy()
+            new_flags[position] = flags
+            changed.append('flags')
+        names, types = self.names, self.types
+        if names[position] != name:
+            names = names.replaced(position, name)
+            changed.append('name')
+        if types[position] != product_type:
+            types = types.replaced(position, product_type)
+            changed.append('type')
+        return ProductCatalog(columns, new_flags, names, types), changed
+
+    def appended(self, product: Dict) -> 'ProductCatalog':
+        """Copy with one product added at the end"""
+        values, flags, name, product_type = encode_product(product)
+        columns = {column: np.append(array, array.dtype.type(values[column]))
+                   for column, array in self.columns.items()}
+        return ProductCatalog(columns, np.append(self.flags, np.uint8(flags)),
+                              self.names.appended(name), self.types.appended(product_type))
+
+    def removed(self, position: int) -> 'ProductCatalog':
+        """Copy without the product at position"""
+        columns = {column: np.delete(array, position) for column, array in self.columns.items()}
+        return ProductCatalog(columns, np.delete(self.flags, position),
+                              self.names.removed(position), self.types.removed(position))
+
+    def sliced(self, start: int, end: int) -> 'ProductCatalog':
+        """Products [start, end) as views of this catalog's arrays (no copies)"""
+        return ProductCatalog({column: array[start:end] for column, array in self.columns.items()},
+                              self.flags[start:end], self.names.sliced(start, end), self.types.sliced(start, end))
+
+    def diff(self, other: 'ProductCatalog') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Match other's products to this catalog by id.
+        Returns, per product of other, its position here (-1 if new) and
+        whether it is new or any of its fields changed.
+        """
+        if (self.id[1:] > self.id[:-1]).all():
+            # Catalogs are usually kept in id order; skip the sort
+            order, sorted_ids = np.arange(len(self)), self.id
+        else:
+            order = np.argsort(self.id, kind='stable')
+            sorted_ids = self.id[order]
+        for ids in (sorted_ids, other.id if (other.id[1:] > other.id[:-1]).all() else np.sort(other.id)):
+            if len(ids) > 1 and (ids[1:] == ids[:-1]).any():
+                raise ValueError("Catalog product ids must be unique to diff catalogs")
+
+        found = np.zeros(len(other), dtype=bool)
+        old_positions = np.full(len(other), -1, dtype=np.int64)
+        if len(self):
+            slots = np.minimum(np.searchsorted(sorted_ids, other.id), len(self) - 1)
+            found = sorted_ids[slots] == other.id
+            old_positions[found] = order[slots[found]]
+
+        matched = np.flatnonzero(found)
+        previous = old_positions[matched]
+        same = other.flags[matched] == self.flags[previous]
+        for column in NUMERIC_DTYPES:
+            same &= other.columns[column][matched] == self.columns[column][previous]
+        for mine, theirs in ((self.names, other.names), (self.types, other.types)):
+            same &= theirs.recode(mine)[matched] == mine.codes[previous]
+
+        changed = ~found
+        changed[matched[~same]] = True
+        return old_positions, changed
+
+    def to_dataframe(self) -> 'pd.DataFrame':
+        """Rebuild the CSV-shaped DataFrame"""
+        import pandas as pd
+        data = {column: self.columns[column].astype(np.int64) for column in NUMERIC_DTYPES}
+        for column in FLAG_BITS:
+            data[column] = np.where(self.flag(column), 'Yes', 'No')
+        data['name'] = self.names.tolist()
+        data['type'] = self.types.tolist()
+        return pd.DataFrame({column: data[column] for column in CATALOG_COLUMNS})
+
+    def fingerprint(self) -> str:
+        """Content hash; changes whenever any product field changes"""
+        if self._fingerprint is not None:
+            return self._fingerprint
+        digest = hashlib.sha1()
+        for column in NUMERIC_DTYPES:
+            digest.update(self.columns[column].tobytes())
+        digest.update(self.flags.tobytes())
+        for table in (self.names, self.types):
+            # Normalized so CSV, Arrow and Parquet copies of a catalog hash alike
+            start, end = int(table.offsets[0]), int(table.offsets[-1])
+            digest.update(table.buffer[start:end].tobytes())
+            digest.update((table.offsets - start).astype(np.int64).tobytes())
+            digest.update(table.codes.astype(np.int64).tobytes())
+        # Columns are never modified in place, so the hash is computed once
+        self._fingerprint = digest.hexdigest()[:16]
+        return self._fingerprint
+
+    @property
+    def nbytes(self) -> int:
+        return (sum(values.nbytes for values in self.columns.values()) + self.flags.nbytes +
+                self.names.nbytes + self.types.nbytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert_parser = subparsers.add_parser('convert', help='convert a catalog between CSV, Arrow/Feather and Parquet')
+    convert_parser.add_argument('source')
+    convert_parser.add_argument('target')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        catalog = ProductCatalog.from_file(args.source)
+        catalog.save(args.target)
+        start = time.perf_counter()
+        reloaded = ProductCatalog.from_file(args.target)
+        load_ms = (time.perf_counter() - start) * 1000
+        if reloaded.fingerprint() != catalog.fingerprint():
+            raise SystemExit(f"❌ {args.target} does not round-trip")
+        print(f"✅ Wrote {len(catalog):,} products to {args.target} "
+              f"({os.path.getsize(args.target) / 1e6:.2f} MB, loads in {load_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
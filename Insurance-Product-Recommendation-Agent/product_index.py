@@ -0,0 +1,390 @@
+"""
+Precomputed product indexes used by the recommendation engine
+Built once when the catalog is loaded so scoring needs only mask lookups
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Keyword matching semantics for product names
+SUBSTRING_MATCH = 'substring'  # legacy: keyword anywhere in the lowercased name
+TOKEN_MATCH = 'token'          # keyword equals a name token or a run of adjacent tokens
+MATCH_MODES = (SUBSTRING_MATCH, TOKEN_MATCH)
+
+# Longest run of adjacent tokens indexed as one term ('NewJobee' -> 'newjobee')
+MAX_TOKEN_RUN = 3
+
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+_TOKEN_PATTERN = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+
+def name_words(name: str) -> List[str]:
+    """Lowercased words of a product name, split on anything that isn't a letter or digit"""
+    return _WORD_PATTERN.findall(name.lower())
+
+
+def name_terms(name: str) -> List[str]:
+    """
+    Token-exact terms of a product name: CamelCase-split tokens plus the
+    concatenation of every run of up to MAX_TOKEN_RUN adjacent tokens
+    """
+    tokens = [token.lower() for token in _TOKEN_PATTERN.findall(name)]
+    terms = []
+    for start in range(len(tokens)):
+        for end in range(start + 1, min(start + MAX_TOKEN_RUN, len(tokens)) + 1):
+            terms.append(''.join(tokens[start:end]))
+    return terms
+
+
+def keyword_in_name(keyword: str, name: str, match_mode: str = SUBSTRING_MATCH) -> bool:
+    """Row-wise keyword test with the same semantics as ProductKeywordIndex"""
+    if match_mode == TOKEN_MATCH:
+        return ''.join(name_words(keyword)) in name_terms(name)
+    return keyword in name.lower()
+
+
+class PositionMap:
+    """
+    Where the unchanged products of an edited catalog came from: new
+    positions targets hold the old products at positions sources.
+    After a small edit both lists advance together in long runs, which
+    copy() moves as slices instead of gathering element by element.
+    """
+
+    def __init__(self, targets: np.ndarray, sources: np.ndarray):
+        self.targets = targets
+        self.sources = sources
+        breaks = np.flatnonzero((np.diff(targets) != 1) | (np.diff(sources) != 1)) + 1
+        self.runs = None
+        if len(breaks) <= len(targets) // 64:
+            starts = np.concatenate([[0], breaks]).astype(np.int64)
+            lengths = np.diff(np.concatenate([starts, [len(targets)]]))
+            self.runs = list(zip(targets[starts].tolist(), sources[starts].tolist(), lengths.tolist()))
+
+    def copy(self, target: np.ndarray, source: np.ndarray, axis: int = 0):
+        """target[targets] = source[sources] along axis"""
+        prefix = (slice(None),) * axis
+        if self.runs is None:
+            target[prefix + (self.targets,)] = source[prefix + (self.sources,)]
+            return
+        for target_start, source_start, length in self.runs:
+            target[prefix + (slice(target_start, target_start + length),)] = \
+                source[prefix + (slice(source_start, source_start + length),)]
+
+
+class ProductKeywordIndex:
+    """
+    Inverted index from product-name keywords to product masks
+    Names are tokenized once; every keyword and every keyword family value
+    (e.g. profession 'tech') resolves to a precomputed boolean mask
+    """
+
+    def __init__(self, names: List[str], families: Dict[str, Dict[str, List[str]]],
+                 match_mode: str = SUBSTRING_MATCH):
+        if match_mode not in MATCH_MODES:
+            raise ValueError(f"Unknown keyword match mode: {match_mode}")
+
+        self.match_mode = match_mode
+        self.families = families
+        self.size = len(names)
+        self._names = names
+        self._postings = None
+        self._posting_arrays = None
+
+        self.keyword_masks = {}
+        self.family_masks = {}
+        for family, values in families.items():
+            self.family_masks[family] = {}
+            for value, keywords in values.items():
+                mask = np.zeros(self.size, dtype=bool)
+                for keyword in keywords:
+                    mask |= self.keyword_mask(keyword)
+                self.family_masks[family][value] = mask
+
+    @property
+    def postings(self) -> Dict[str, np.ndarray]:
+        """term -> product positions, tokenized once per name (or mapped from a snapshot)"""
+        if self._postings is None:
+            if self._posting_arrays is not None:
+                terms, offsets, positions = self._posting_arrays
+                self._postings = {term: positions[offsets[i]:offsets[i + 1]] for i, term in enumerate(terms)}
+            else:
+                postings = {}
+                tokenize = name_terms if self.match_mode == TOKEN_MATCH else name_words
+                for position, name in enumerate(self._names):
+                    for term in set(tokenize(name)):
+                        postings.setdefault(term, []).append(position)
+                self._postings = {term: np.array(positions, dtype=np.int64)
+                                  for term, positions in postings.items()}
+        return self._postings
+
+    def updated(self, names, moves: PositionMap, changed: np.ndarray) -> 'ProductKeywordIndex':
+        """
+        Index for an edited catalog (see ProductCatalog.diff). Family masks of
+        unchanged products are copied; only new or changed names are matched.
+        Postings are rebuilt lazily, for keywords outside the families.
+        """
+        index = ProductKeywordIndex.__new__(ProductKeywordIndex)
+        index.match_mode = self.match_mode
+        index.families = self.families
+        index.size = len(names)
+        index._names = names
+        index._postings = None
+        index._posting_arrays = None
+        index.keyword_masks = {}
+
+        rematched = [(position, names[position]) for position in np.flatnonzero(changed).tolist()]
+        index.family_masks = {}
+        for family, values in self.families.items():
+            index.family_masks[family] = {}
+            for value, keywords in values.items():
+                mask = np.zeros(index.size, dtype=bool)
+                moves.copy(mask, self.family_masks[family][value])
+                for position, name in rematched:
+                    mask[position] = any(keyword_in_name(keyword, name, self.match_mode) for keyword in keywords)
+                index.family_masks[family][value] = mask
+        return index
+
+    def replaced(self, names, position: int) -> 'ProductKeywordIndex':
+        """
+        Index after one product was renamed in place. Only family masks whose
+        membership flips for that product are copied; the rest are shared.
+        """
+        index = ProductKeywordIndex.__new__(ProductKeywordIndex)
+        index.match_mode = self.match_mode
+        index.families = self.families
+        index.size = self.size
+        index._names = names
+        index._postings = None
+        index._posting_arrays = None
+        index.keyword_masks = {}
+
+        name = names[position]
+        index.family_masks = {}
+        for family, values in self.families.items():
+            index.family_masks[family] = dict(self.family_masks[family])
+            for value, keywords in values.items():
+                matches = any(keyword_in_name(keyword, name, self.match_mode) for keyword in keywords)
+                if matches != self.family_masks[family][value][position]:
+                    mask = self.family_masks[family][value].copy()
+                    mask[position] = matches
+                    index.family_masks[family][value] = mask
+        return index
+
+    def sliced(self, names, start: int, end: int) -> 'ProductKeywordIndex':
+        """Index over products [start, end): family masks are views, postings rebuilt lazily"""
+        index = ProductKeywordIndex.__new__(ProductKeywordIndex)
+        index.match_mode = self.match_mode
+        index.families = self.families
+        index.size = end - start
+        index._names = names
+        index._postings = None
+        index._posting_arrays = None
+        index.keyword_masks = {}
+        index.family_masks = {family: {value: mask[start:end] for value, mask in masks.items()}
+                              for family, masks in self.family_masks.items()}
+        return index
+
+    def to_snapshot(self, postings: bool = True) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """
+        Arrays and JSON metadata for an engine snapshot
+        Without postings the loaded index rebuilds them from the names if needed
+        """
+        arrays = {}
+        metadata = {'match_mode': self.match_mode, 'families': self.families}
+        if postings:
+            terms = sorted(self.postings)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(self.postings[term]) for term in terms])
+            arrays['posting_offsets'] = offsets
+            arrays['posting_positions'] = (np.concatenate([self.postings[term] for term in terms]) if terms
+                                           else np.zeros(0, dtype=np.int64))
+            metadata['terms'] = terms
+        for family, masks in self.family_masks.items():
+            arrays[f'family.{family}'] = (np.stack(list(masks.values())) if masks
+                                          else np.zeros((0, self.size), dtype=bool))
+        return arrays, metadata
+
+    @classmethod
+    def from_snapshot(cls, names, arrays: Dict[str, np.ndarray], metadata: Dict) -> 'ProductKeywordIndex':
+        index = cls.__new__(cls)
+        index.match_mode = metadata['match_mode']
+        index.families = metadata['families']
+        index.size = len(names)
+        index._names = names
+        index._postings = None
+        index._posting_arrays = None
+        if 'terms' in metadata:
+            index._posting_arrays = (metadata['terms'], arrays['posting_offsets'], arrays['posting_positions'])
+        index.keyword_masks = {}
+        index.family_masks = {
+            family: dict(zip(values, arrays[f'family.{family}']))
+            for family, values in metadata['families'].items()
+        }
+        return index
+
+    def keyword_mask(self, keyword: str) -> np.ndarray:
+        """Products whose name matches one keyword"""
+        if keyword in self.keyword_masks:
+            return self.keyword_masks[keyword]
+
+        mask = np.zeros(self.size, dtype=bool)
+        if self.match_mode == TOKEN_MATCH:
+            positions = self.postings.get(''.join(name_words(keyword)))
+            if positions is not None:
+                mask[positions] = True
+        elif _WORD_PATTERN.fullmatch(keyword):
+            # A letters-and-digits keyword can only match inside a single word
+            for term, positions in self.postings.items():
+                if keyword in term:
+                    mask[positions] = True
+        else:
+            for position, name in enumerate(self._names):
+                mask[position] = keyword in name.lower()
+
+        self.keyword_masks[keyword] = mask
+        return mask
+
+    def mask(self, family: str, value: str) -> np.ndarray:
+        """Precomputed mask for a keyword family value, None if the value has no keywords"""
+        return self.family_masks.get(family, {}).get(value)
+
+
+# Ages covered by the precomputed eligibility table
+MAX_INDEXED_AGE = 120
+
+
+def _packed_width(size: int) -> int:
+    return (size + 7) // 8
+
+
+def _pack(mask: np.ndarray) -> np.ndarray:
+    return np.packbits(mask, bitorder='little')
+
+
+class AgeEligibilityIndex:
+    """
+    Precomputed age eligibility masks
+    Eligibility only changes at age_min / age_max + 1 boundaries, so ages are
+    grouped into segments and one mask is stored per segment, packed 8
+    products to a byte (np.packbits, little bit order). mask(age) unpacks a
+    single row, which costs far less than the flatnonzero that follows it.
+    """
+
+    def __init__(self, age_min: np.ndarray, age_max: np.ndarray):
+        self.age_min = np.asarray(age_min)
+        self.age_max = np.asarray(age_max)
+        self.size = len(self.age_min)
+        self.age_to_row, self.segment_ages = self._segments(self.age_min, self.age_max)
+
+        # One packed mask per segment that contains an indexed age
+        self.segment_bits = np.empty((len(self.segment_ages), _packed_width(self.size)), dtype=np.uint8)
+        for row, age in enumerate(self.segment_ages):
+            self.segment_bits[row] = _pack((self.age_min <= age) & (self.age_max >= age))
+        self.segment_bits.setflags(write=False)
+
+        self.all_products = np.ones(self.size, dtype=bool)
+        self.all_products.setflags(write=False)
+
+    @staticmethod
+    def _segments(age_min: np.ndarray, age_max: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Segment row of every indexed age, and the first age of each segment"""
+        ages = np.arange(MAX_INDEXED_AGE + 1)
+        boundaries = np.unique(np.concatenate([age_min, age_max + 1]))
+        segment_of_age = np.searchsorted(boundaries, ages, side='right')
+        segments, first_age = np.unique(segment_of_age, return_index=True)
+        return np.searchsorted(segments, segment_of_age), first_age
+
+    def _row(self, row: int) -> np.ndarray:
+        return np.unpackbits(self.segment_bits[row], count=self.size, bitorder='little').view(bool)
+
+    def updated(self, age_min: np.ndarray, age_max: np.ndarray,
+                moves: PositionMap, changed: np.ndarray) -> 'AgeEligibilityIndex':
+        """
+        Index for an edited catalog (see ProductCatalog.diff). While the age
+        segments stay the same, unchanged products' bits are copied and only
+        changed products are evaluated; new segments mean a full rebuild.
+        """
+        age_min = np.asarray(age_min)
+        age_max = np.asarray(age_max)
+        age_to_row, segment_ages = self._segments(age_min, age_max)
+        if not np.array_equal(age_to_row, self.age_to_row):
+            return AgeEligibilityIndex(age_min, age_max)
+
+        positions = np.flatnonzero(changed)
+        segment_bits = np.empty((len(segment_ages), _packed_width(len(age_min))), dtype=np.uint8)
+        # Row by row, so only one unpacked mask is alive at a time
+        mask = np.empty(len(age_min), dtype=bool)
+        for row, age in enumerate(segment_ages):
+            moves.copy(mask, self._row(row))
+            mask[positions] = (age_min[positions] <= age) & (age_max[positions] >= age)
+            segment_bits[row] = _pack(mask)
+        return AgeEligibilityIndex.from_snapshot(age_min, age_max,
+                                                 {'segment_bits': segment_bits, 'age_to_row': age_to_row})
+
+    def replaced(self, age_min: np.ndarray, age_max: np.ndarray, position: int) -> 'AgeEligibilityIndex':
+        """Index after one product's age range was edited in place"""
+        age_min = np.asarray(age_min)
+        age_max = np.asarray(age_max)
+        age_to_row, segment_ages = self._segments(age_min, age_max)
+        if not np.array_equal(age_to_row, self.age_to_row):
+            return AgeEligibilityIndex(age_min, age_max)
+        segment_bits = self.segment_bits.copy()
+        byte, bit = divmod(position, 8)
+        eligible = (age_min[position] <= segment_ages) & (age_max[position] >= segment_ages)
+        column, flag = segment_bits[:, byte], np.uint8(1 << bit)
+        segment_bits[:, byte] = np.where(eligible, column | flag, column & ~flag)
+        return AgeEligibilityIndex.from_snapshot(age_min, age_max,
+                                                 {'segment_bits': segment_bits, 'age_to_row': age_to_row})
+
+    def sliced(self, age_min: np.ndarray, age_max: np.ndarray, start: int, end: int) -> 'AgeEligibilityIndex':
+        """Index of products [start, end); a view when start is a multiple of 8"""
+        if start % 8 == 0:
+            segment_bits = self.segment_bits[:, start // 8:start // 8 + _packed_width(end - start)]
+        else:
+            segment_bits = np.stack([_pack(self._row(row)[start:end]) for row in range(len(self.segment_bits))])
+        return AgeEligibilityIndex.from_snapshot(age_min, age_max,
+                                                 {'segment_bits': segment_bits, 'age_to_row': self.age_to_row})
+
+    def to_snapshot(self) -> Dict[str, np.ndarray]:
+        return {'segment_bits': self.segment_bits, 'age_to_row': self.age_to_row}
+
+    @classmethod
+    def from_snapshot(cls, age_min: np.ndarray, age_max: np.ndarray,
+                      arrays: Dict[str, np.ndarray]) -> 'AgeEligibilityIndex':
+        index = cls.__new__(cls)
+        index.age_min = np.asarray(age_min)
+        index.age_max = np.asarray(age_max)
+        index.size = len(index.age_min)
+        index.segment_bits = arrays['segment_bits']
+        index.segment_bits.setflags(write=False)
+        index.age_to_row = arrays['age_to_row']
+        index.segment_ages = np.unique(index.age_to_row, return_index=True)[1]
+        index.all_products = np.ones(index.size, dtype=bool)
+        index.all_products.setflags(write=False)
+        return index
+
+    def mask(self, age: int) -> np.ndarray:
+        """Read-only mask of products eligible at this age (every product when age is None)"""
+        if age is None:
+            return self.all_products
+        if 0 <= age <= MAX_INDEXED_AGE:
+            mask = self._row(self.age_to_row[age])
+            mask.setflags(write=False)
+            return mask
+        return (self.age_min <= age) & (self.age_max >= age)
+
+    def positions(self, age: int) -> np.ndarray:
+        """Catalog positions of the products eligible at this age"""
+        return np.flatnonzero(self.mask(age))
+
+    @property
+    def nbytes(self) -> int:
+        return self.segment_bits.nbytes + self.age_to_row.nbytes + self.all_products.nbytes
+
+    @property
+    def unpacked_nbytes(self) -> int:
+        """What the same index takes with one bool per product and segment"""
+        return len(self.segment_bits) * self.size + self.age_to_row.nbytes + self.all_products.nbytes
@@ -0,0 +1,334 @@
+"""
+Natural language query parsing for the recommendation engine
+All keyword families are compiled once into a single regular expression
+so a query is scanned in one pass
+"""
+
+import re
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Union
+
+# Categorical fields: the first value (in dict order) with a keyword in the query wins
+GENDER_KEYWORDS = {
+    'female': ['female', 'woman', 'girl'],
+    'male': ['male', 'man', 'boy']
+}
+
+MARITAL_KEYWORDS = {
+    'married': ['married', 'wife', 'husband'],
+    'single': ['unmarried', 'single']
+}
+
+PROFESSION_KEYWORDS = {
+    'student': ['student', 'college', 'university', 'intern'],
+    'tech': ['software', 'developer', 'engineer', 'tech', 'it', 'programmer', 'data scientist'],
+    'finance': ['banker', 'financial', 'investment', 'stock broker', 'insurance agent'],
+    'medical': ['doctor', 'nurse', 'medical professional', 'healthcare'],
+    'transport': ['driver', 'taxi', 'uber', 'ola', 'delivery', 'truck driver'],
+    'defense': ['army', 'navy', 'airforce', 'military', 'soldier', 'police'],
+    'sports': ['athlete', 'sports', 'player', 'fitness'],
+    'senior': ['senior citizen', 'retired', 'elderly', 'old age']
+}
+
+LIFE_SITUATION_KEYWORDS = {
+    'single_parent': ['single mother', 'single father', 'divorced', 'widow'],
+    'family': ['family', 'spouse', 'children'],
+    'pre_existing': ['diabetes', 'hypertension', 'heart disease', 'kidney']
+}
+
+CATEGORICAL_FIELDS = {
+    'gender': GENDER_KEYWORDS,
+    'marital_status': MARITAL_KEYWORDS,
+    'profession': PROFESSION_KEYWORDS,
+    'life_situation': LIFE_SITUATION_KEYWORDS
+}
+
+# Boolean fields: True when any keyword appears in the query
+FLAG_FIELDS = {
+    'wants_health': ['health', 'medical', 'hospital'],
+    'wants_accident': ['accident', 'injury'],
+    'wants_critical': ['critical', 'cancer', 'heart', 'stroke'],
+    'wants_maternity': ['maternity', 'pregnancy', 'childbirth'],
+    'wants_low_premium': ['low premium', 'cheap', 'affordable', 'budget'],
+    'wants_high_coverage': ['high coverage', 'maximum coverage', 'comprehensive']
+}
+
+AGE_PATTERN = r'\b(\d{1,2})\b'
+
+# Above this length CPython's substring search, which stops at the first hit
+# per family, beats scanning every position with the regex (benchmark.py parse)
+SINGLE_PASS_MAX_CHARS = 180
+
+# Digits outside 0-9 (Devanagari, Arabic-Indic, fullwidth, ...), which AGE_PATTERN's \d
+# matches but the single-pass pattern's literal branches don't
+_NON_ASCII_DIGIT = re.compile(r'(?![0-9])\d')
+
+
+def _trie_regex(words) -> str:
+    """
+    Regex alternation factored into a prefix trie. The top-level branches
+    are left ungrouped and each starts with a literal character, which lets
+    the regex engine skip non-candidate positions in C; optional suffixes
+    are greedy, so the longest keyword starting at a position wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return '|'.join(re.escape(char) + build(child) for char, child in sorted(trie.items()))
+
+
+# Output fields resolved from keyword hits, in parse_user_query order
+KEYWORD_FIELDS = ['gender', 'marital_status', 'wants_health', 'wants_accident', 'wants_critical',
+                  'wants_maternity', 'wants_low_premium', 'wants_high_coverage', 'profession',
+                  'life_situation']
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    """
+    Immutable result of parsing one user query
+    Produced once per request and shared by the engine, the explainer and
+    the GenAI agents; get() lets it stand in for the old preference dicts
+    """
+    original_query: str
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    marital_status: Optional[str] = None
+    wants_health: bool = False
+    wants_accident: bool = False
+    wants_critical: bool = False
+    wants_maternity: bool = False
+    wants_low_premium: bool = False
+    wants_high_coverage: bool = False
+    profession: Optional[str] = None
+    life_situation: Optional[str] = None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self) -> Dict:
+        """Same dict parse_user_query returns"""
+        return asdict(self)
+
+
+class QueryParser:
+    """
+    Single-pass keyword matcher for user queries
+    Keywords match as substrings of the lowercased query, exactly like the
+    original any(word in query_lower ...) checks
+    """
+
+    def __init__(self, max_single_pass_chars: int = SINGLE_PASS_MAX_CHARS):
+        # Longer queries go to the multi-scan parser (None: always single pass)
+        self.max_single_pass_chars = max_single_pass_chars
+
+        # One bit per (field, value) label
+        label_bits = {}
+        keyword_labels = {}
+        for field, values in CATEGORICAL_FIELDS.items():
+            for value, keywords in values.items():
+                label_bits[(field, value)] = 1 << len(label_bits)
+                for keyword in keywords:
+                    keyword_labels.setdefault(keyword, set()).add((field, value))
+        for field, keywords in FLAG_FIELDS.items():
+            label_bits[(field, True)] = 1 << len(label_bits)
+            for keyword in keywords:
+                keyword_labels.setdefault(keyword, set()).add((field, True))
+        self.label_bits = label_bits
+
+        # The scan reports the longest keyword at each start, so a hit also
+        # implies every keyword it contains ('female' -> 'male',
+        # 'single mother' -> 'single', 'unmarried' -> 'married')
+        self.keyword_bits = {}
+        for keyword in keyword_labels:
+            bits = 0
+            for other, labels in keyword_labels.items():
+                if other in keyword:
+                    for label in labels:
+                        bits |= label_bits[label]
+            self.keyword_bits[keyword] = bits
+
+        # Matches don't overlap either, so a keyword that starts inside a hit
+        # and runs past its end ('tech' after 'it' in 'itech') can be skipped.
+        # Those are the only possible misses; they are re-checked afterwards.
+        self.overlap_targets = {}
+        for keyword in keyword_labels:
+            self.overlap_targets[keyword] = [
+                (other, self.keyword_bits[other]) for other in keyword_labels
+                if any(other.startswith(keyword[offset:]) and len(other) > len(keyword) - offset
+                       for offset in range(1, len(keyword)))
+            ]
+
+        # Age: one or two digits on word boundaries (same as AGE_PATTERN). The
+        # leading boundary is a lookbehind after the first digit, and the
+        # pattern has no groups, so every top-level branch starts with a
+        # literal and the regex engine can skip non-candidate positions in C.
+        age = '|'.join(rf'{digit}(?<!\w{digit})\d?\b' for digit in '0123456789')
+        self.pattern = re.compile(f'{age}|{_trie_regex(keyword_labels)}')
+
+        # Keyword hits -> resolved field values, memoized per hit combination
+        self._resolved = {}
+
+    def _resolve(self, bits: int) -> tuple:
+        """Field values (KEYWORD_FIELDS order) for a combination of keyword hits"""
+        values = {}
+        for field, choices in CATEGORICAL_FIELDS.items():
+            values[field] = next((value for value in choices if bits & self.label_bits[(field, value)]), None)
+        for field in FLAG_FIELDS:
+            values[field] = bool(bits & self.label_bits[(field, True)])
+        return tuple(values[field] for field in KEYWORD_FIELDS)
+
+    def parse(self, query: str) -> Dict:
+        """Extract age, demographics, coverage wishes and preferences in one pass"""
+        if self.max_single_pass_chars is not None and len(query) > self.max_single_pass_chars:
+            return parse_user_query_legacy(query)
+        if not query.isascii() and _NON_ASCII_DIGIT.search(query):
+            return parse_user_query_legacy(query)
+        
+        query_lower = query.lower()
+        hits = self.pattern.findall(query_lower)
+        keyword_bits = self.keyword_bits
+        
+        age = next((int(text) for text in hits if text not in keyword_bits), None)
+        
+        distinct = set(hits)
+        bits = 0
+        for text in distinct:
+            bits |= keyword_bits.get(text, 0)
+        for text in distinct:
+            for target, target_bits in self.overlap_targets.get(text, ()):
+                if target_bits & ~bits and target in query_lower:
+                    bits |= target_bits
+
+        resolved = self._resolved.get(bits)
+        if resolved is None:
+            resolved = self._resolved[bits] = self._resolve(bits)
+        gender, marital_status, health, accident, critical, maternity, low_premium, high_coverage, \
+            profession, life_situation = resolved
+
+        return {
+            'age': age,
+            'gender': gender,
+            'marital_status': marital_status,
+            'wants_health': health,
+            'wants_accident': accident,
+            'wants_critical': critical,
+            'wants_maternity': maternity,
+            'wants_low_premium': low_premium,
+            'wants_high_coverage': high_coverage,
+            'profession': profession,
+            'life_situation': life_situation,
+            'original_query': query
+        }
+
+    def parse_query(self, query: Union[str, ParsedQuery]) -> ParsedQuery:
+        """Parse a query into a ParsedQuery (already parsed queries pass through)"""
+        if isinstance(query, ParsedQuery):
+            return query
+        return ParsedQuery(**self.parse(query))
+
+
+_default_parser = None
+
+
+def default_parser() -> QueryParser:
+    """Shared QueryParser; it only depends on the keyword tables, so one per process is enough"""
+    global _default_parser
+    if _default_parser is None:
+        _default_parser = QueryParser()
+    return _default_parser
+
+
+def parse_query(query: Union[str, ParsedQuery]) -> ParsedQuery:
+    """Parse with a shared module-level QueryParser"""
+    return default_parser().parse_query(query)
+
+
+def parse_user_query_legacy(query: str) -> Dict:
+    """
+    Original multi-scan parser, kept verbatim as the reference
+    implementation for benchmark.py and for checking QueryParser output
+    """
+    query_lower = query.lower()
+    
+    # Extract age
+    age_match = re.search(r'\b(\d{1,2})\b', query)
+    age = int(age_match.group(1)) if age_match else None
+    
+    # Extract gender/marital status
+    gender = None
+    marital_status = None
+    if any(word in query_lower for word in ['female', 'woman', 'girl']):
+        gender = 'female'
+    elif any(word in query_lower for word in ['male', 'man', 'boy']):
+        gender = 'male'
+        
+    if any(word in query_lower for word in ['married', 'wife', 'husband']):
+        marital_status = 'married'
+    elif any(word in query_lower for word in ['unmarried', 'single']):
+        marital_status = 'single'
+    
+    # Extract coverage preferences
+    wants_health = any(word in query_lower for word in ['health', 'medical', 'hospital'])
+    wants_accident = any(word in query_lower for word in ['accident', 'injury'])
+    wants_critical = any(word in query_lower for word in ['critical', 'cancer', 'heart', 'stroke'])
+    wants_maternity = any(word in query_lower for word in ['maternity', 'pregnancy', 'childbirth'])
+    
+    # Extract profession-specific needs
+    profession_keywords = {
+        'student': ['student', 'college', 'university', 'intern'],
+        'tech': ['software', 'developer', 'engineer', 'tech', 'it', 'programmer', 'data scientist'],
+        'finance': ['banker', 'financial', 'investment', 'stock broker', 'insurance agent'],
+        'medical': ['doctor', 'nurse', 'medical professional', 'healthcare'],
+        'transport': ['driver', 'taxi', 'uber', 'ola', 'delivery', 'truck driver'],
+        'defense': ['army', 'navy', 'airforce', 'military', 'soldier', 'police'],
+        'sports': ['athlete', 'sports', 'player', 'fitness'],
+        'senior': ['senior citizen', 'retired', 'elderly', 'old age']
+    }
+    
+    detected_profession = None
+    for profession, keywords in profession_keywords.items():
+        if any(keyword in query_lower for keyword in keywords):
+            detected_profession = profession
+            break
+    
+    # Extract specific life situations
+    life_situation = None
+    if any(word in query_lower for word in ['single mother', 'single father', 'divorced', 'widow']):
+        life_situation = 'single_parent'
+    elif any(word in query_lower for word in ['family', 'spouse', 'children']):
+        life_situation = 'family'
+    elif any(word in query_lower for word in ['diabetes', 'hypertension', 'heart disease', 'kidney']):
+        life_situation = 'pre_existing'
+    
+    # Extract premium preferences
+    wants_low_premium = any(word in query_lower for word in ['low premium', 'cheap', 'affordable', 'budget'])
+    wants_high_coverage = any(word in query_lower for word in ['high coverage', 'maximum coverage', 'comprehensive'])
+    
+    return {
+        'age': age,
+        'gender': gender,
+        'marital_status': marital_status,
+        'wants_health': wants_health,
+        'wants_accident': wants_accident,
+        'wants_critical': wants_critical,
+        'wants_maternity': wants_maternity,
+        'wants_low_premium': wants_low_premium,
+        'wants_high_coverage': wants_high_coverage,
+        'profession': detected_profession,
+        'life_situation': life_situation,
+        'original_query': query
+    }
@@ -1,7 +1,369 @@
-import pandas as pd
+import hashlib
+import os
+import threading
 import numpy as np
-from typing import List, Dict, Tuple
-import re
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple, Union
+from query_parser import ParsedQuery, default_parser
+from product_catalog import ProductCatalog, ProductView, FLAG_BITS, HEALTH_BIT
+from product_index import ProductKeywordIndex, AgeEligibilityIndex, PositionMap, keyword_in_name, SUBSTRING_MATCH
+from result_cache import RecommendationCache
+from snapshot import write_snapshot, read_snapshot, source_signature, check_source
+
+if TYPE_CHECKING:
+    # Scoring never touches pandas; only the DataFrame accessors below import it
+    import pandas as pd
+
+# Product-name keywords that earn the profession bonus
+PROFESSION_MATCHES = {
+    'student': ['student', 'college', 'teen', 'youth', 'graduate'],
+    'tech': ['tech', 'software', 'data', 'cyber', 'cloud', 'devops', 'startup'],
+    'finance': ['bank', 'financial', 'investment', 'stock', 'insurance', 'corporate'],
+    'medical': ['doctor', 'medical'],
+    'transport': ['driver', 'taxi', 'uber', 'delivery', 'truck', 'bike'],
+    'defense': ['army', 'navy', 'airforce', 'military', 'soldier', 'police', 'defense'],
+    'sports': ['sports', 'athlete'],
+    'senior': ['senior', 'retirement', 'elder']
+}
+
+# Product-name keywords that earn the life situation bonus
+SITUATION_MATCHES = {
+    'single_parent': ['single', 'mother', 'father', 'divorcee', 'widow'],
+    'family': ['family', 'multi'],
+    'pre_existing': ['diabetes', 'hypertension', 'heart', 'kidney', 'cancer']
+}
+
+# Product-name keywords that earn the age bonus, per age band
+AGE_BAND_MATCHES = {
+    'teen': ['teen', 'youth', 'student'],
+    'young': ['young', 'career', 'graduate', 'newjobee'],
+    'middle': ['professional', 'executive', 'middle'],
+    'senior': ['senior', 'retirement', 'elder']
+}
+
+
+def get_age_band(age: int) -> str:
+    """Map an age to its AGE_BAND_MATCHES key (None for 51-59 or no age)"""
+    if not age:
+        return None
+    if age <= 19:
+        return 'teen'
+    elif age <= 30:
+        return 'young'
+    elif age <= 50:
+        return 'middle'
+    elif age >= 60:
+        return 'senior'
+    return None
+
+
+# Query flag -> product feature mask it rewards
+FLAG_FEATURES = {
+    'wants_health': 'is_health',
+    'wants_accident': 'accident',
+    'wants_critical': 'critical_illness',
+    'wants_maternity': 'maternity'
+}
+
+# Upper bound on query x product score cells held in memory by the batch API
+BATCH_SCORE_CELLS = 1 << 22
+
+# Parsed fields that affect ranking; gender, marital status and the raw text
+# don't, so queries differing only in those share a result cache entry
+RANKING_FIELDS = ('age', 'profession', 'life_situation')
+RANKING_FLAGS = ('wants_health', 'wants_accident', 'wants_critical', 'wants_maternity',
+                 'wants_low_premium', 'wants_high_coverage')
+
+
+def ranking_key(user_prefs: Union[Dict, ParsedQuery]) -> Tuple:
+    """Canonical, hashable form of the preferences that decide the ranking"""
+    return (tuple(user_prefs.get(field) for field in RANKING_FIELDS) +
+            tuple(bool(user_prefs.get(flag)) for flag in RANKING_FLAGS))
+
+
+def next_catalog_version(version: str, operation: str, payload) -> str:
+    """
+    Version id for a runtime edit, chained from the previous version, so
+    publishing doesn't pay for hashing the whole catalog again
+    """
+    return hashlib.sha1(f"{version}:{operation}:{payload!r}".encode('utf-8')).hexdigest()[:16]
+
+
+def select_top(scores: np.ndarray, product_ids: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    Indices of the top_n scores, ordered by descending score and then
+    ascending product id. Ties are common (most terms are multiples of 0.5),
+    so the id tie-break keeps results deterministic whatever the catalog order.
+    argpartition finds the cut-off score in O(n); only the winners are sorted.
+    """
+    if top_n <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    
+    if top_n < len(scores):
+        threshold = scores[np.argpartition(-scores, top_n - 1)[top_n - 1]]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)
+        needed = top_n - len(above)
+        if len(tied) > needed:
+            tied = tied[np.argpartition(product_ids[tied], needed - 1)[:needed]]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(len(scores))
+    
+    return candidates[np.lexsort((product_ids[candidates], -scores[candidates]))]
+
+
+# Catalog-derived attributes, read through the engine's current CatalogState
+STATE_ATTRIBUTES = ('catalog', 'catalog_version', 'keyword_index', 'max_premium', 'max_coverage',
+                    'max_copay', 'features', 'age_index', 'matrix_columns', 'feature_matrix')
+
+# Changed products above this share of the catalog are rebuilt rather than patched
+FULL_REBUILD_FRACTION = 0.5
+
+
+class CatalogState:
+    """
+    Immutable catalog plus everything derived from it (feature columns,
+    keyword and age indexes, normalization maxima). The engine swaps in a
+    new state on reload; a request reads engine.state once and keeps it.
+    """
+    
+    def __init__(self, catalog: ProductCatalog, keyword_match: str, keyword_index: ProductKeywordIndex,
+                 age_index: AgeEligibilityIndex, maxima: Tuple[int, int, int], features: Dict,
+                 feature_matrix: Optional[np.ndarray] = None, catalog_version: Optional[str] = None,
+                 changes: Optional[Dict[str, int]] = None):
+        self.catalog = catalog
+        self.keyword_match = keyword_match
+        self.keyword_index = keyword_index
+        self.age_index = age_index
+        self.max_premium, self.max_coverage, self.max_copay = maxima
+        # Cached results are only served for the catalog version they were ranked against
+        self.catalog_version = catalog_version or catalog.fingerprint()
+        # Added/updated/removed product counts when this state came from a diff
+        self.changes = changes
+        self._products_df = None
+        
+        self.features = dict(features)
+        self.features.update(keyword_index.family_masks)
+        
+        # Catalog x feature matrix for batch scoring: one column per bonus
+        # that depends only on a query flag. All weights are multiples of 0.5,
+        # so any summation order is exact in float32.
+        self.matrix_columns = [(flag, True, weight, self.features[FLAG_FEATURES[flag]])
+                               for flag, weight in (('wants_health', 3.0), ('wants_accident', 2.0),
+                                                    ('wants_critical', 2.0), ('wants_maternity', 2.0))]
+        for family, weight in (('profession', 4.0), ('life_situation', 3.5), ('age_band', 2.5)):
+            for key, mask in self.features[family].items():
+                self.matrix_columns.append((family, key, weight, mask))
+        if feature_matrix is None:
+            feature_matrix = self._matrix_rows(slice(None))
+        self.feature_matrix = feature_matrix
+    
+    @classmethod
+    def build(cls, catalog: ProductCatalog, keyword_match: str, catalog_version: Optional[str] = None,
+              maxima: Optional[Tuple[int, int, int]] = None) -> 'CatalogState':
+        """
+        Precompute the NumPy feature columns used by the vectorized scorer.
+        Every column is derived with the same arithmetic as
+        calculate_relevance_score so both scorers agree bit for bit.
+        maxima (premium, coverage, co-pay) default to the catalog's own; a
+        chunk of a larger catalog is normalized with the whole catalog's.
+        """
+        keyword_index = ProductKeywordIndex(
+            catalog.names.tolist(),
+            {'profession': PROFESSION_MATCHES, 'life_situation': SITUATION_MATCHES, 'age_band': AGE_BAND_MATCHES},
+            match_mode=keyword_match
+        )
+        if maxima is None:
+            maxima = (int(catalog.monthly_premium.max()), int(catalog.coverage.max()), int(catalog.co_pay.max()))
+        return cls(catalog, keyword_match, keyword_index, AgeEligibilityIndex(catalog.age_min, catalog.age_max),
+                   maxima, cls._feature_columns(catalog, maxima), catalog_version=catalog_version)
+    
+    @staticmethod
+    def _feature_columns(catalog: ProductCatalog, maxima: Tuple[int, int, int],
+                         positions=slice(None)) -> Dict[str, np.ndarray]:
+        """Benefit masks and normalized premium/coverage/co-pay scores for some products"""
+        max_premium, max_coverage, max_copay = maxima
+        flags = catalog.flags[positions]
+        return {
+            'is_health': (flags & HEALTH_BIT) != 0,
+            'accident': (flags & FLAG_BITS['accident']) != 0,
+            'critical_illness': (flags & FLAG_BITS['critical_illness']) != 0,
+            'maternity': (flags & FLAG_BITS['maternity']) != 0,
+            'premium_score': (max_premium - catalog.monthly_premium[positions]) / max_premium,
+            'coverage_score': catalog.coverage[positions] / max_coverage,
+            'copay_score': (max_copay - catalog.co_pay[positions]) / max_copay
+        }
+    
+    def _matrix_rows(self, positions) -> np.ndarray:
+        """feature_matrix rows for some products"""
+        return np.column_stack(
+            [mask[positions] * weight for _, _, weight, mask in self.matrix_columns]
+        ).astype(np.float32)
+    
+    def updated(self, catalog: ProductCatalog, diff: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                catalog_version: Optional[str] = None) -> 'CatalogState':
+        """
+        State for an edited catalog, patched from this one: rows of unchanged
+        products are copied by position, only added or updated products are
+        re-derived, and maxima are recomputed only if a maximum was removed.
+        diff is ProductCatalog.diff(self.catalog, catalog) when already known.
+        """
+        if diff is None:
+            try:
+                diff = self.catalog.diff(catalog)
+            except ValueError:
+                # Duplicate ids can't be matched up; derive everything afresh
+                return CatalogState.build(catalog, self.keyword_match, catalog_version)
+        old_positions, changed = diff
+        n_changed = int(changed.sum())
+        added = int((old_positions < 0).sum())
+        changes = {'added': added, 'updated': n_changed - added,
+                   'removed': len(self.catalog) - (len(catalog) - added)}
+        if n_changed > FULL_REBUILD_FRACTION * len(catalog):
+            state = CatalogState.build(catalog, self.keyword_match, catalog_version)
+            state.changes = changes
+            return state
+        
+        kept = np.flatnonzero(~changed)
+        sources = old_positions[kept]
+        fresh = np.flatnonzero(changed)
+        moves = PositionMap(kept, sources)
+        
+        # A maximum only has to be searched for again if its holder left or changed
+        dropped = np.ones(len(self.catalog), dtype=bool)
+        dropped[sources] = False
+        maxima = []
+        for column, current in (('monthly_premium', self.max_premium), ('coverage', self.max_coverage),
+                                ('co_pay', self.max_copay)):
+            if (self.catalog.columns[column][dropped] == current).any():
+                maxima.append(int(catalog.columns[column].max()))
+            else:
+                maxima.append(max(current, int(catalog.columns[column][fresh].max(initial=current))))
+        maxima = tuple(maxima)
+        
+        if maxima == (self.max_premium, self.max_coverage, self.max_copay):
+            features = {}
+            patch = self._feature_columns(catalog, maxima, fresh)
+            for name, values in patch.items():
+                column = np.empty(len(catalog), dtype=values.dtype)
+                moves.copy(column, self.features[name])
+                column[fresh] = values
+                features[name] = column
+        else:
+            features = self._feature_columns(catalog, maxima)
+        
+        keyword_index = self.keyword_index.updated(catalog.names, moves, changed)
+        age_index = self.age_index.updated(catalog.age_min, catalog.age_max, moves, changed)
+        state = CatalogState(catalog, self.keyword_match, keyword_index, age_index, maxima, features,
+                             feature_matrix=np.empty((len(catalog), len(self.matrix_columns)), dtype=np.float32),
+                             catalog_version=catalog_version, changes=changes)
+        moves.copy(state.feature_matrix, self.feature_matrix)
+        state.feature_matrix[fresh] = state._matrix_rows(fresh)
+        return state
+    
+    def replaced(self, position: int, catalog: ProductCatalog, changed: List[str],
+                 catalog_version: Optional[str] = None) -> 'CatalogState':
+        """
+        State after one product was edited in place (ProductCatalog.replaced).
+        Copy-on-write: every column, mask and index the edit can't affect is
+        shared with this state; the rest are copied and patched at position.
+        """
+        maxima = [self.max_premium, self.max_coverage, self.max_copay]
+        for slot, column in enumerate(('monthly_premium', 'coverage', 'co_pay')):
+            if column not in changed:
+                continue
+            value, current = int(catalog.columns[column][position]), maxima[slot]
+            if value > current:
+                maxima[slot] = value
+            elif self.catalog.columns[column][position] == current:
+                # The old maximum was edited down; another product may hold it too
+                maxima[slot] = int(catalog.columns[column].max())
+        maxima = tuple(maxima)
+        
+        # A new maximum rescales its whole score column; other edits patch one row
+        score_inputs = {'premium_score': 'monthly_premium', 'coverage_score': 'coverage', 'copay_score': 'co_pay'}
+        old_maxima = (self.max_premium, self.max_coverage, self.max_copay)
+        rescaled = [name for slot, name in enumerate(score_inputs) if maxima[slot] != old_maxima[slot]]
+        full = self._feature_columns(catalog, maxima) if rescaled else {}
+        patch = self._feature_columns(catalog, maxima, np.array([position]))
+        features = {}
+        for name, values in patch.items():
+            if name in rescaled:
+                features[name] = full[name]
+            elif score_inputs.get(name, 'flags') in changed:
+                features[name] = self.features[name].copy()
+                features[name][position] = values[0]
+            else:
+                features[name] = self.features[name]
+        
+        keyword_index = self.keyword_index
+        if 'name' in changed:
+            keyword_index = self.keyword_index.replaced(catalog.names, position)
+        age_index = self.age_index
+        if 'age_min' in changed or 'age_max' in changed:
+            age_index = self.age_index.replaced(catalog.age_min, catalog.age_max, position)
+        
+        feature_matrix = self.feature_matrix
+        if 'flags' in changed or 'name' in changed:
+            feature_matrix = self.feature_matrix.copy()
+        state = CatalogState(catalog, self.keyword_match, keyword_index, age_index, maxima, features,
+                             feature_matrix=feature_matrix, catalog_version=catalog_version,
+                             changes={'added': 0, 'updated': 1, 'removed': 0})
+        if feature_matrix is not self.feature_matrix:
+            state.feature_matrix[position] = state._matrix_rows(np.array([position]))[0]
+        return state
+    
+    def shard(self, start: int, end: int) -> 'CatalogState':
+        """Products [start, end) as a state of zero-copy views, for scoring one shard"""
+        catalog = self.catalog.sliced(start, end)
+        age_index = self.age_index.sliced(catalog.age_min, catalog.age_max, start, end)
+        features = {name: values[start:end] for name, values in self.features.items()
+                    if isinstance(values, np.ndarray)}
+        return CatalogState(catalog, self.keyword_match, self.keyword_index.sliced(catalog.names, start, end),
+                            age_index, (self.max_premium, self.max_coverage, self.max_copay), features,
+                            feature_matrix=self.feature_matrix[start:end],
+                            catalog_version=f"{self.catalog_version}:{start}-{end}")
+    
+    def to_snapshot(self, postings: bool = True) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Arrays and JSON metadata for an engine snapshot"""
+        arrays = {f'catalog.{name}': array for name, array in self.catalog.to_snapshot().items()}
+        arrays.update({f'age.{name}': array for name, array in self.age_index.to_snapshot().items()})
+        keyword_arrays, keyword_metadata = self.keyword_index.to_snapshot(postings)
+        arrays.update({f'keywords.{name}': array for name, array in keyword_arrays.items()})
+        for name, value in self.features.items():
+            if isinstance(value, np.ndarray):
+                arrays[f'features.{name}'] = value
+        arrays['feature_matrix'] = self.feature_matrix
+        
+        metadata = {
+            'catalog_version': self.catalog_version,
+            'keyword_match': self.keyword_match,
+            'keywords': keyword_metadata,
+            'max_premium': self.max_premium,
+            'max_coverage': self.max_coverage,
+            'max_copay': self.max_copay
+        }
+        return arrays, metadata
+    
+    @classmethod
+    def from_snapshot(cls, arrays: Dict[str, np.ndarray], metadata: Dict) -> 'CatalogState':
+        def group(prefix):
+            return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+        
+        catalog = ProductCatalog.from_snapshot(group('catalog.'))
+        keyword_index = ProductKeywordIndex.from_snapshot(catalog.names, group('keywords.'), metadata['keywords'])
+        age_index = AgeEligibilityIndex.from_snapshot(catalog.age_min, catalog.age_max, group('age.'))
+        maxima = (metadata['max_premium'], metadata['max_coverage'], metadata['max_copay'])
+        return cls(catalog, metadata['keyword_match'], keyword_index, age_index, maxima, group('features.'),
+                   feature_matrix=arrays['feature_matrix'], catalog_version=metadata['catalog_version'])
+    
+    @property
+    def products_df(self) -> 'pd.DataFrame':
+        """DataFrame copy of the catalog, built on first access (scoring never needs it)"""
+        if self._products_df is None:
+            self._products_df = self.catalog.to_dataframe()
+        return self._products_df
+
 
 class InsuranceRecommendationEngine:
     """
@@ -9,100 +371,222 @@ class InsuranceRecommendationEngine:
     Uses rule-based logic combined with scoring algorithms
     """
     
-    def __init__(self, csv_path: str):
-        self.products_df = pd.read_csv(csv_path)
+    def __init__(self, csv_path: str, vectorized: bool = True, keyword_match: str = SUBSTRING_MATCH,
+                 cache_size: int = 1024, cache_ttl: Optional[float] = None):
+        # Typed struct-of-arrays catalog from CSV or a memory-mapped columnar file;
+        # products_df is only built on demand
+        self.catalog_path = csv_path
+        self._init_serving_state(vectorized, keyword_match, cache_size, cache_ttl)
+        # Stat before reading, so an edit made while loading is picked up by the next poll
+        self._source_stat = self._stat_source()
+        self.state = CatalogState.build(ProductCatalog.from_file(csv_path), keyword_match)
+    
+    def _init_serving_state(self, vectorized: bool, keyword_match: str, cache_size: int, cache_ttl: Optional[float]):
+        """Per-process state that isn't derived from the catalog"""
         self.user_profile = {}
-        
+        self.query_parser = default_parser()
+        # Score the whole catalog with NumPy instead of DataFrame.apply
+        self.vectorized = vectorized
+        # 'substring' (legacy) or 'token' product-name keyword matching
+        self.keyword_match = keyword_match
+        # Ranked results per (ranking preferences, top_n); cache_size=0 disables it
+        self.result_cache = RecommendationCache(maxsize=cache_size, ttl=cache_ttl)
+        # Optional precomputed top-K per profile (cohort_table.py)
+        self.cohort_table = None
+        # Catalog writers (hot reload, upsert_product, remove_product) take turns;
+        # readers never lock, they just read self.state once per request
+        self._write_lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = None
+        # Optional multi-process scorer for very large catalogs (sharded_executor.py)
+        self.executor = None
+    
+    def __getattr__(self, name: str):
+        # engine.catalog, engine.features, ... always mean the current state's
+        if name in STATE_ATTRIBUTES:
+            state = self.__dict__.get('state')
+            if state is not None:
+                return getattr(state, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+    
+    def _stat_source(self) -> Optional[Tuple[int, int]]:
+        """(size, mtime) of the catalog file, None if it doesn't exist"""
+        try:
+            stat = os.stat(self.catalog_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+    
+    def reload_if_changed(self) -> bool:
+        """
+        Poll the catalog file; if it changed, apply the new catalog as a diff
+        and publish it. Returns True when a new catalog version is live.
+        Requests already running finish on the state they started with.
+        """
+        with self._write_lock:
+            signature = self._stat_source()
+            if signature is None or signature == self._source_stat:
+                return False
+            # Recorded before parsing, so a broken file is reported once, not on every poll
+            self._source_stat = signature
+            catalog = ProductCatalog.from_file(self.catalog_path)
+            if catalog.fingerprint() == self.state.catalog_version:
+                # Touched or rewritten with the same content
+                return False
+            self.state = self.state.updated(catalog)
+            return True
+    
+    def upsert_product(self, product: Dict) -> str:
+        """
+        Insert a product, or replace the one with the same id, and publish the
+        result as a new catalog version (returned). Requests keep scoring
+        against the version they hold. Edits aren't written to the catalog
+        file; the next change to the file replaces them.
+        """
+        with self._write_lock:
+            state = self.state
+            position = state.catalog.position_of(int(product['id']))
+            if position is None:
+                catalog = state.catalog.appended(product)
+                kept = np.arange(len(state.catalog))
+                diff = (np.append(kept, -1), np.append(np.zeros(len(kept), dtype=bool), True))
+                new_state = state.updated(catalog, diff, next_catalog_version(state.catalog_version, 'upsert', product))
+            else:
+                catalog, changed = state.catalog.replaced(position, product)
+                if not changed:
+                    return state.catalog_version
+                new_state = state.replaced(position, catalog, changed,
+                                           next_catalog_version(state.catalog_version, 'upsert', product))
+            self.state = new_state
+            return new_state.catalog_version
+    
+    def remove_product(self, product_id: int) -> str:
+        """Remove a product by id and publish the new catalog version (returned)"""
+        with self._write_lock:
+            state = self.state
+            position = state.catalog.position_of(product_id)
+            if position is None:
+                raise ValueError(f"No product with id {product_id}")
+            if len(state.catalog) == 1:
+                raise ValueError("Cannot remove the last product in the catalog")
+            diff = (np.delete(np.arange(len(state.catalog)), position), np.zeros(len(state.catalog) - 1, dtype=bool))
+            self.state = state.updated(state.catalog.removed(position), diff,
+                                       next_catalog_version(state.catalog_version, 'remove', product_id))
+            return self.state.catalog_version
+    
+    def watch_catalog(self, interval: float = 5.0):
+        """Hot-reload the catalog from a daemon thread polling every interval seconds"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        stop = threading.Event()
+        
+        def poll():
+            while not stop.wait(interval):
+                try:
+                    if self.reload_if_changed():
+                        changes = self.state.changes or {}
+                        print(f"🔄 Catalog reloaded (version {self.catalog_version}): "
+                              f"+{changes.get('added', '?')} ~{changes.get('updated', '?')} "
+                              f"-{changes.get('removed', '?')} products")
+                except Exception as e:
+                    print(f"❌ Catalog reload failed, still serving version {self.catalog_version}: {e}")
+        
+        self._stop_watching = stop
+        self._watcher = threading.Thread(target=poll, name='catalog-watcher', daemon=True)
+        self._watcher.start()
+    
+    def stop_watching(self):
+        """Stop the watch_catalog thread"""
+        if self._watcher is not None:
+            self._stop_watching.set()
+            self._watcher.join()
+            self._watcher = None
+    
+    def use_executor(self, executor):
+        """
+        Score large catalogs with a ShardedExecutor; catalogs below its
+        threshold (and executor=None) stay single-process
+        """
+        self.executor = executor
+    
+    def _sharded(self, state: CatalogState, prefs_list: List[ParsedQuery], top_n: int) -> Optional[List[List[Dict]]]:
+        """Ranked recommendations from the executor, None if it doesn't take this catalog"""
+        if not self.vectorized or self.executor is None or not self.executor.handles(state):
+            return None
+        ranked = self.executor.rank(state, prefs_list, top_n)
+        if ranked is None:
+            return None
+        return [self._recommendations_at(positions, scores, state) for positions, scores in ranked]
+    
+    def save_snapshot(self, path: str):
+        """
+        Write every derived structure (catalog arrays, indexes, feature columns)
+        to a binary snapshot that load_snapshot maps back without rebuilding
+        """
+        arrays, metadata = self.state.to_snapshot()
+        metadata['source'] = source_signature(self.catalog_path)
+        write_snapshot(path, arrays, metadata)
+    
+    @classmethod
+    def load_snapshot(cls, path: str, source_path: Optional[str] = None, vectorized: bool = True,
+                      cache_size: int = 1024, cache_ttl: Optional[float] = None) -> 'InsuranceRecommendationEngine':
+        """
+        Engine from a save_snapshot file, mapped zero-copy.
+        The schema version is always checked; the catalog file (source_path, or
+        the one recorded in the snapshot if it still exists) must be unchanged.
+        """
+        arrays, metadata = read_snapshot(path)
+        source_path = source_path or metadata['source']['path']
+        source_stat = None
+        if os.path.exists(source_path):
+            check_source(metadata['source'], source_path)
+            source_stat = (metadata['source']['size'], metadata['source']['mtime_ns'])
+        
+        engine = cls.__new__(cls)
+        engine.catalog_path = source_path
+        engine._init_serving_state(vectorized, metadata['keyword_match'], cache_size, cache_ttl)
+        engine._source_stat = source_stat
+        engine.state = CatalogState.from_snapshot(arrays, metadata)
+        return engine
+    
     def parse_user_query(self, query: str) -> Dict:
         """
         Extract key information from user natural language query
         """
-        query_lower = query.lower()
-        
-        # Extract age
-        age_match = re.search(r'\b(\d{1,2})\b', query)
-        age = int(age_match.group(1)) if age_match else None
-        
-        # Extract gender/marital status
-        gender = None
-        marital_status = None
-        if any(word in query_lower for word in ['female', 'woman', 'girl']):
-            gender = 'female'
-        elif any(word in query_lower for word in ['male', 'man', 'boy']):
-            gender = 'male'
-            
-        if any(word in query_lower for word in ['married', 'wife', 'husband']):
-            marital_status = 'married'
-        elif any(word in query_lower for word in ['unmarried', 'single']):
-            marital_status = 'single'
-        
-        # Extract coverage preferences
-        wants_health = any(word in query_lower for word in ['health', 'medical', 'hospital'])
-        wants_accident = any(word in query_lower for word in ['accident', 'injury'])
-        wants_critical = any(word in query_lower for word in ['critical', 'cancer', 'heart', 'stroke'])
-        wants_maternity = any(word in query_lower for word in ['maternity', 'pregnancy', 'childbirth'])
-        
-        # Extract profession-specific needs
-        profession_keywords = {
-            'student': ['student', 'college', 'university', 'intern'],
-            'tech': ['software', 'developer', 'engineer', 'tech', 'it', 'programmer', 'data scientist'],
-            'finance': ['banker', 'financial', 'investment', 'stock broker', 'insurance agent'],
-            'medical': ['doctor', 'nurse', 'medical professional', 'healthcare'],
-            'transport': ['driver', 'taxi', 'uber', 'ola', 'delivery', 'truck driver'],
-            'defense': ['army', 'navy', 'airforce', 'military', 'soldier', 'police'],
-            'sports': ['athlete', 'sports', 'player', 'fitness'],
-            'senior': ['senior citizen', 'retired', 'elderly', 'old age']
-        }
-        
-        detected_profession = None
-        for profession, keywords in profession_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                detected_profession = profession
-                break
-        
-        # Extract specific life situations
-        life_situation = None
-        if any(word in query_lower for word in ['single mother', 'single father', 'divorced', 'widow']):
-            life_situation = 'single_parent'
-        elif any(word in query_lower for word in ['family', 'spouse', 'children']):
-            life_situation = 'family'
-        elif any(word in query_lower for word in ['diabetes', 'hypertension', 'heart disease', 'kidney']):
-            life_situation = 'pre_existing'
-        
-        # Extract premium preferences
-        wants_low_premium = any(word in query_lower for word in ['low premium', 'cheap', 'affordable', 'budget'])
-        wants_high_coverage = any(word in query_lower for word in ['high coverage', 'maximum coverage', 'comprehensive'])
-        
-        return {
-            'age': age,
-            'gender': gender,
-            'marital_status': marital_status,
-            'wants_health': wants_health,
-            'wants_accident': wants_accident,
-            'wants_critical': wants_critical,
-            'wants_maternity': wants_maternity,
-            'wants_low_premium': wants_low_premium,
-            'wants_high_coverage': wants_high_coverage,
-            'profession': detected_profession,
-            'life_situation': life_situation,
-            'original_query': query
-        }
+        return self.query_parser.parse(query)
+    
+    def parse_query(self, query: Union[str, ParsedQuery]) -> ParsedQuery:
+        """
+        Parse once per request; pass the result to get_recommendations,
+        explain_recommendation and the GenAI agents
+        """
+        return self.query_parser.parse_query(query)
+    
+    @property
+    def products_df(self) -> 'pd.DataFrame':
+        """DataFrame copy of the current catalog, built on first access (scoring never needs it)"""
+        return self.state.products_df
     
-    def filter_by_age(self, age: int) -> pd.DataFrame:
+    def use_cohort_table(self, table):
+        """Answer queries from a precomputed CohortTable built for this catalog"""
+        table.bind(self)
+        self.cohort_table = table
+    
+    def filter_by_age(self, age: int) -> 'pd.DataFrame':
         """Filter products based on age eligibility"""
+        state = self.state
         if age is None:
-            return self.products_df
-        return self.products_df[
-            (self.products_df['age_min'] <= age) & 
-            (self.products_df['age_max'] >= age)
-        ]
+            return state.products_df
+        return state.products_df[state.age_index.mask(age)]
     
-    def calculate_relevance_score(self, product: pd.Series, user_prefs: Dict) -> float:
+    def calculate_relevance_score(self, product: Union[ProductView, 'pd.Series'], user_prefs: Dict,
+                                  state: Optional[CatalogState] = None) -> float:
         """
         Enhanced relevance score calculation with profession and situation matching
         """
+        state = state or self.state
         score = 0.0
-        product_name_lower = product['name'].lower()
+        product_name = product['name']
         
         # Coverage type matching (base scoring)
         if user_prefs.get('wants_health') and product['type'] == 'Health':
@@ -116,119 +600,219 @@ class InsuranceRecommendationEngine:
         
         # Profession-specific matching (NEW)
         profession = user_prefs.get('profession')
-        if profession:
-            profession_matches = {
-                'student': ['student', 'college', 'teen', 'youth', 'graduate'],
-                'tech': ['tech', 'software', 'data', 'cyber', 'cloud', 'devops', 'startup'],
-                'finance': ['bank', 'financial', 'investment', 'stock', 'insurance', 'corporate'],
-                'medical': ['doctor', 'medical'],
-                'transport': ['driver', 'taxi', 'uber', 'delivery', 'truck', 'bike'],
-                'defense': ['army', 'navy', 'airforce', 'military', 'soldier', 'police', 'defense'],
-                'sports': ['sports', 'athlete'],
-                'senior': ['senior', 'retirement', 'elder']
-            }
-            
-            if profession in profession_matches:
-                for keyword in profession_matches[profession]:
-                    if keyword in product_name_lower:
-                        score += 4.0  # High bonus for profession match
-                        break
+        if profession in PROFESSION_MATCHES:
+            for keyword in PROFESSION_MATCHES[profession]:
+                if keyword_in_name(keyword, product_name, state.keyword_match):
+                    score += 4.0  # High bonus for profession match
+                    break
         
         # Life situation matching (NEW)
         life_situation = user_prefs.get('life_situation')
-        if life_situation:
-            situation_matches = {
-                'single_parent': ['single', 'mother', 'father', 'divorcee', 'widow'],
-                'family': ['family', 'multi'],
-                'pre_existing': ['diabetes', 'hypertension', 'heart', 'kidney', 'cancer']
-            }
-            
-            if life_situation in situation_matches:
-                for keyword in situation_matches[life_situation]:
-                    if keyword in product_name_lower:
-                        score += 3.5  # High bonus for situation match
-                        break
+        if life_situation in SITUATION_MATCHES:
+            for keyword in SITUATION_MATCHES[life_situation]:
+                if keyword_in_name(keyword, product_name, state.keyword_match):
+                    score += 3.5  # High bonus for situation match
+                    break
         
         # Age-specific product matching (NEW)
-        age = user_prefs.get('age')
-        if age:
-            age_keywords = []
-            if age <= 19:
-                age_keywords = ['teen', 'youth', 'student']
-            elif age <= 30:
-                age_keywords = ['young', 'career', 'graduate', 'newjobee']
-            elif age <= 50:
-                age_keywords = ['professional', 'executive', 'middle']
-            elif age >= 60:
-                age_keywords = ['senior', 'retirement', 'elder']
-            
-            for keyword in age_keywords:
-                if keyword in product_name_lower:
+        age_band = get_age_band(user_prefs.get('age'))
+        if age_band:
+            for keyword in AGE_BAND_MATCHES[age_band]:
+                if keyword_in_name(keyword, product_name, state.keyword_match):
                     score += 2.5
                     break
         
         # Premium preferences
         if user_prefs.get('wants_low_premium'):
             # Normalize premium score (lower premium = higher score)
-            max_premium = self.products_df['monthly_premium'].max()
-            premium_score = (max_premium - product['monthly_premium']) / max_premium
+            premium_score = (state.max_premium - product['monthly_premium']) / state.max_premium
             score += premium_score * 2.0
         
         # Coverage amount preferences
         if user_prefs.get('wants_high_coverage'):
             # Normalize coverage score (higher coverage = higher score)
-            max_coverage = self.products_df['coverage'].max()
-            coverage_score = product['coverage'] / max_coverage
+            coverage_score = product['coverage'] / state.max_coverage
             score += coverage_score * 1.5
         
         # Co-pay penalty (lower co-pay is better)
-        max_copay = self.products_df['co_pay'].max()
-        copay_score = (max_copay - product['co_pay']) / max_copay
+        copay_score = (state.max_copay - product['co_pay']) / state.max_copay
         score += copay_score * 0.5
         
         return score
     
-    def get_recommendations(self, query: str, top_n: int = 3) -> List[Dict]:
+    def score_products(self, user_prefs: Dict, state: Optional[CatalogState] = None) -> np.ndarray:
         """
-        Main recommendation function
+        Vectorized relevance scores for every product in the catalog.
+        Terms are added in the same order as calculate_relevance_score,
+        so the result matches the row-wise scorer exactly.
         """
-        # Parse user query
-        user_prefs = self.parse_user_query(query)
+        state = state or self.state
+        features = state.features
+        scores = np.zeros(len(state.catalog), dtype=np.float64)
         
-        # Filter by age
-        eligible_products = self.filter_by_age(user_prefs.get('age'))
+        # Coverage type matching (base scoring)
+        if user_prefs.get('wants_health'):
+            scores[features['is_health']] += 3.0
+        if user_prefs.get('wants_accident'):
+            scores[features['accident']] += 2.0
+        if user_prefs.get('wants_critical'):
+            scores[features['critical_illness']] += 2.0
+        if user_prefs.get('wants_maternity'):
+            scores[features['maternity']] += 2.0
+        
+        # Profession, life situation and age-band bonuses are single index lookups
+        bonuses = (('profession', user_prefs.get('profession'), 4.0),
+                   ('life_situation', user_prefs.get('life_situation'), 3.5),
+                   ('age_band', get_age_band(user_prefs.get('age')), 2.5))
+        for family, value, weight in bonuses:
+            mask = state.keyword_index.mask(family, value)
+            if mask is not None:
+                scores[mask] += weight
+        
+        # Premium, coverage and co-pay terms
+        if user_prefs.get('wants_low_premium'):
+            scores += features['premium_score'] * 2.0
+        if user_prefs.get('wants_high_coverage'):
+            scores += features['coverage_score'] * 1.5
+        scores += features['copay_score'] * 0.5
         
-        if eligible_products.empty:
-            return []
+        return scores
+    
+    def _query_matrix(self, prefs_list: List[Dict], state: CatalogState) -> np.ndarray:
+        """Turn parsed preferences into a query x feature selector matrix"""
+        matrix = np.zeros((len(prefs_list), len(state.matrix_columns)), dtype=np.float32)
+        for row, user_prefs in enumerate(prefs_list):
+            selected = {
+                'profession': user_prefs.get('profession'),
+                'life_situation': user_prefs.get('life_situation'),
+                'age_band': get_age_band(user_prefs.get('age'))
+            }
+            for col, (key, value, _, _) in enumerate(state.matrix_columns):
+                if key in selected:
+                    matrix[row, col] = selected[key] == value
+                else:
+                    matrix[row, col] = bool(user_prefs.get(key))
+        return matrix
+    
+    def score_products_batch(self, prefs_list: List[Dict], state: Optional[CatalogState] = None) -> np.ndarray:
+        """
+        Relevance scores for many queries at once (queries x products).
+        The keyword and benefit bonuses come from one matrix multiply, the
+        normalized premium/coverage/co-pay terms are then added in the same
+        order as score_products, so every row equals the single-query scores.
+        """
+        state = state or self.state
+        features = state.features
+        scores = (self._query_matrix(prefs_list, state) @ state.feature_matrix.T).astype(np.float64)
         
-        # Calculate scores
-        eligible_products = eligible_products.copy()
-        eligible_products['relevance_score'] = eligible_products.apply(
-            lambda row: self.calculate_relevance_score(row, user_prefs), axis=1
-        )
+        low_premium = np.array([bool(p.get('wants_low_premium')) for p in prefs_list], dtype=bool)
+        high_coverage = np.array([bool(p.get('wants_high_coverage')) for p in prefs_list], dtype=bool)
+        scores[low_premium] += features['premium_score'] * 2.0
+        scores[high_coverage] += features['coverage_score'] * 1.5
+        scores += features['copay_score'] * 0.5
         
-        # Sort by score and return top N
-        top_products = eligible_products.nlargest(top_n, 'relevance_score')
+        return scores
+    
+    def get_recommendations_batch(self, queries: List[Union[str, ParsedQuery]], top_n: int = 3) -> List[List[Dict]]:
+        """
+        Recommendations for many queries, one ranked list per query.
+        Equivalent to calling get_recommendations for each query in turn.
+        """
+        prefs_list = [self.parse_query(query) for query in queries]
+        state = self.state
+        sharded = self._sharded(state, prefs_list, top_n)
+        if sharded is not None:
+            return sharded
+        n_products = len(state.catalog)
+        block_size = max(1, BATCH_SCORE_CELLS // max(n_products, 1))
+        
+        results = []
+        for start in range(0, len(prefs_list), block_size):
+            block = prefs_list[start:start + block_size]
+            scores = self.score_products_batch(block, state)
+            
+            for row, user_prefs in enumerate(block):
+                # Per-query age eligibility (queries without an age see everything)
+                positions = state.age_index.positions(user_prefs.get('age'))
+                top = positions[select_top(scores[row, positions], state.catalog.id[positions], top_n)]
+                results.append(self._recommendations_at(top, scores[row, top], state))
+        
+        return results
+    
+    def _recommendations_at(self, positions: np.ndarray, scores: np.ndarray,
+                            state: Optional[CatalogState] = None) -> List[Dict]:
+        """Build recommendation dicts for catalog positions straight from the catalog arrays"""
+        columns = (state or self.state).catalog.columns_at(positions)
+        relevance_scores = scores.tolist()
         
         recommendations = []
-        for _, product in top_products.iterrows():
+        for i in range(len(positions)):
             recommendations.append({
-                'id': product['id'],
-                'name': product['name'],
-                'type': product['type'],
-                'coverage': product['coverage'],
-                'monthly_premium': product['monthly_premium'],
-                'critical_illness': product['critical_illness'],
-                'maternity': product['maternity'],
-                'accident': product['accident'],
-                'co_pay': product['co_pay'],
-                'relevance_score': product['relevance_score'],
-                'age_range': f"{product['age_min']}-{product['age_max']}"
+                'id': columns['id'][i],
+                'name': columns['name'][i],
+                'type': columns['type'][i],
+                'coverage': columns['coverage'][i],
+                'monthly_premium': columns['monthly_premium'][i],
+                'critical_illness': columns['critical_illness'][i],
+                'maternity': columns['maternity'][i],
+                'accident': columns['accident'][i],
+                'co_pay': columns['co_pay'][i],
+                'relevance_score': relevance_scores[i],
+                'age_range': f"{columns['age_min'][i]}-{columns['age_max'][i]}"
             })
         
         return recommendations
     
-    def explain_recommendation(self, product: Dict, user_prefs: Dict) -> str:
+    def get_recommendations(self, query: Union[str, ParsedQuery], top_n: int = 3) -> List[Dict]:
+        """
+        Main recommendation function
+        Results are ordered by descending relevance_score, ties by ascending product id
+        """
+        # Parse user query (unless the caller already did)
+        user_prefs = self.parse_query(query)
+        # One catalog state for the whole request, even if a reload lands meanwhile
+        state = self.state
+        
+        if self.cohort_table is not None:
+            hit = self.cohort_table.lookup(user_prefs, top_n, state.catalog_version)
+            if hit is not None:
+                return self._recommendations_at(*hit, state)
+        
+        cache_key = (ranking_key(user_prefs), top_n)
+        recommendations = self.result_cache.get(cache_key, state.catalog_version)
+        if recommendations is None:
+            recommendations = self._rank(user_prefs, top_n, state)
+            self.result_cache.put(cache_key, recommendations, state.catalog_version)
+        return recommendations
+    
+    def cache_stats(self) -> Dict:
+        """Result cache hit/miss/eviction counters"""
+        return self.result_cache.stats()
+    
+    def _rank(self, user_prefs: ParsedQuery, top_n: int, state: Optional[CatalogState] = None) -> List[Dict]:
+        """Score and rank the age-eligible products for one parsed query"""
+        state = state or self.state
+        # Age eligibility is a precomputed mask over the catalog
+        positions = state.age_index.positions(user_prefs.get('age'))
+        if len(positions) == 0:
+            return []
+        
+        sharded = self._sharded(state, [user_prefs], top_n)
+        if sharded is not None:
+            return sharded[0]
+        
+        if self.vectorized:
+            scores = self.score_products(user_prefs, state)[positions]
+        else:
+            # Row-wise scoring over lightweight product views
+            scores = np.array([self.calculate_relevance_score(state.catalog[position], user_prefs, state)
+                               for position in positions.tolist()], dtype=np.float64)
+        
+        # Select on the raw score array; dicts are built for the winners only
+        top = select_top(scores, state.catalog.id[positions], top_n)
+        return self._recommendations_at(positions[top], scores[top], state)
+    
+    def explain_recommendation(self, product: Dict, user_prefs: Union[Dict, ParsedQuery]) -> str:
         """
         Generate explanation for why this product was recommended
         """
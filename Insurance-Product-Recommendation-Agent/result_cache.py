@@ -0,0 +1,82 @@
+"""
+In-process cache of recommendation results
+Keyed on canonical parsed preferences, so differently worded queries that
+parse to the same profile share one entry
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+
+class RecommendationCache:
+    """
+    Bounded LRU cache with optional TTL
+    Entries are keyed on the catalog version too, so a result is only served
+    for the catalog it came from. Requests still running on an older version
+    neither see nor clear the newer entries; stale ones age out of the LRU.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, catalog_version: Hashable) -> Optional[List[Dict]]:
+        """Cached recommendations for key, or None on a miss"""
+        key = (catalog_version, key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, recommendations = entry
+            if expires_at is not None and self.clock() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(recommendation) for recommendation in recommendations]
+
+    def put(self, key: Hashable, recommendations: List[Dict], catalog_version: Hashable):
+        """Store a copy of recommendations, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+        key = (catalog_version, key)
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, [dict(recommendation) for recommendation in recommendations])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Counters for sizing the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
@@ -0,0 +1,214 @@
+"""
+Multi-process sharded scoring
+The engine's catalog state is published once per catalog version into a
+shared memory block; worker processes map it zero-copy, each scores a shard
+of the catalog, and the per-shard top-N lists are merged in the caller.
+Usage: engine.use_executor(ShardedExecutor(workers=8))
+"""
+
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from query_parser import ParsedQuery
+from recommendation_engine import InsuranceRecommendationEngine, CatalogState, BATCH_SCORE_CELLS, select_top
+from snapshot import array_layout, arrays_from_buffer
+
+# Smaller catalogs score faster in-process than the round trip to the pool costs.
+# `benchmark.py shards` on one core: a query takes 3.1 ms in-process at 100k
+# products and 8.0 ms at 200k, and the pool adds 3-6 ms. N workers save about
+# (1 - 1/N) of the in-process time, so with 4 cores that break-even is near 200k.
+# Re-measure on the serving hardware and set SHARDING_THRESHOLD to match
+SHARDING_THRESHOLD = int(os.getenv('SHARDING_THRESHOLD', '200000'))
+
+
+class _Published:
+    """A catalog version's shared memory block and the rank() calls still using it"""
+
+    def __init__(self, state: CatalogState, block: SharedMemory, layout: Dict, metadata: Dict):
+        self.state = state
+        self.block = block
+        self.layout = layout
+        self.metadata = metadata
+        self.users = 0
+        self.retired = False
+
+
+class ShardedExecutor:
+    """
+    Process pool that scores catalog shards held in shared memory
+    Workers are spawned on first use and kept; a new catalog version (reload,
+    upsert_product) is published to a new block, and the old one is unlinked
+    once the last rank() call still scoring it has finished.
+    """
+
+    def __init__(self, workers: Optional[int] = None, min_products: int = SHARDING_THRESHOLD,
+                 shards: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.shards = shards or self.workers
+        self.min_products = min_products
+        self._pool = None
+        self._lock = threading.Lock()
+        self._published = None  # _Published for the latest catalog version
+        self._in_use = []  # Older versions with rank() calls still running
+
+    def handles(self, state: CatalogState) -> bool:
+        """Whether this catalog is large enough to be worth sharding"""
+        return self.workers > 1 and len(state.catalog) >= self.min_products
+
+    def _acquire(self, state: CatalogState) -> _Published:
+        """The state's shared memory block, published once per catalog version and held until _return"""
+        with self._lock:
+            if self._published is None or self._published.state is not state:
+                arrays, metadata = state.to_snapshot(postings=False)
+                layout, size = array_layout(arrays)
+                block = SharedMemory(create=True, size=max(size, 1))
+                for name, array in arrays.items():
+                    if array.size:
+                        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf,
+                                          offset=layout[name]['offset'])
+                        view[...] = array
+                        del view
+                self._retire()
+                self._published = _Published(state, block, layout, metadata)
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context('spawn'))
+            self._published.users += 1
+            return self._published
+
+    def _return(self, published: _Published):
+        with self._lock:
+            published.users -= 1
+            if published.retired and published.users == 0:
+                self._in_use.remove(published)
+                _unlink(published.block)
+
+    def _retire(self):
+        """Replace the latest version: unlink its block now if unused, else when its last user returns it"""
+        if self._published is not None:
+            if self._published.users:
+                self._published.retired = True
+                self._in_use.append(self._published)
+            else:
+                _unlink(self._published.block)
+            self._published = None
+
+    def rank(self, state: CatalogState, prefs_list: List[ParsedQuery],
+             top_n: int) -> Optional[List[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        (catalog positions, scores) of the top_n products per query, in the
+        same order as select_top over the whole catalog; None if a worker
+        died or lost the shared block, so the caller can score in-process
+        """
+        published = self._acquire(state)
+        try:
+            # Shards start on byte boundaries of the packed age masks, so slicing them doesn't copy
+            bounds = (np.linspace(0, len(state.catalog), self.shards + 1).astype(np.int64) // 8 * 8).tolist()
+            bounds[-1] = len(state.catalog)
+            futures = [self._pool.submit(_rank_shard, published.block.name, published.layout, published.metadata,
+                                         start, end, prefs_list, top_n)
+                       for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+            shard_results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            print("❌ Sharded scoring worker died, restarting the pool")
+            with self._lock:
+                self._pool = None
+            return None
+        except OSError as e:
+            # Includes FileNotFoundError: the block is gone (e.g. removed from /dev/shm)
+            print(f"⚠️ Sharded scoring failed ({e}), scoring in-process")
+            return None
+        finally:
+            self._return(published)
+
+        results = []
+        for query in range(len(prefs_list)):
+            positions = np.concatenate([shard[query][0] for shard in shard_results])
+            scores = np.concatenate([shard[query][1] for shard in shard_results])
+            top = select_top(scores, state.catalog.id[positions], top_n)
+            results.append((positions[top], scores[top]))
+        return results
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+            self._retire()
+            # Nothing can use the older blocks once the pool is gone
+            for published in self._in_use:
+                _unlink(published.block)
+            self._in_use.clear()
+
+    def __enter__(self) -> 'ShardedExecutor':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _unlink(block: SharedMemory):
+    """Unmap and remove a block; workers that still map it keep their mapping"""
+    block.close()
+    block.unlink()
+
+
+# Worker-side: the attached block with its full state, and the shard views of it
+_worker_block = None
+_worker_shards = {}
+_worker_scorer = None
+
+
+def _detach():
+    """Drop every array over the attached block, then unmap it"""
+    global _worker_block
+    if _worker_block is not None:
+        block = _worker_block[0]
+        _worker_shards.clear()
+        _worker_block = None
+        block.close()
+
+
+def _shard_state(block_name: str, layout: Dict, metadata: Dict, start: int, end: int) -> CatalogState:
+    global _worker_block, _worker_scorer
+    if _worker_block is None or _worker_block[0].name != block_name:
+        _detach()
+        # Spawned workers share the parent's resource tracker, which unlinks the block if the parent dies
+        block = SharedMemory(name=block_name)
+        _worker_block = (block, CatalogState.from_snapshot(arrays_from_buffer(block.buf, layout), metadata))
+    if _worker_scorer is None:
+        # The engine's scoring methods, without loading a catalog
+        _worker_scorer = InsuranceRecommendationEngine.__new__(InsuranceRecommendationEngine)
+        _worker_scorer._init_serving_state(True, metadata['keyword_match'], 0, None)
+        atexit.register(_detach)
+    if (start, end) not in _worker_shards:
+        _worker_shards[(start, end)] = _worker_block[1].shard(start, end)
+    return _worker_shards[(start, end)]
+
+
+def _rank_shard(block_name: str, layout: Dict, metadata: Dict, start: int, end: int,
+                prefs_list: List[ParsedQuery], top_n: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Top top_n (catalog positions, scores) per query within products [start, end)"""
+    shard = _shard_state(block_name, layout, metadata, start, end)
+    results = []
+    block_size = max(1, BATCH_SCORE_CELLS // max(end - start, 1))
+    for first in range(0, len(prefs_list), block_size):
+        block = prefs_list[first:first + block_size]
+        # Same scorer as the single-process path for the same call
+        if len(prefs_list) == 1:
+            scores = _worker_scorer.score_products(block[0], shard)[None, :]
+        else:
+            scores = _worker_scorer.score_products_batch(block, shard)
+        for row, user_prefs in enumerate(block):
+            positions = shard.age_index.positions(user_prefs.get('age'))
+            top = positions[select_top(scores[row, positions], shard.catalog.id[positions], top_n)]
+            results.append((top + start, scores[row, top]))
+    return results
@@ -0,0 +1,112 @@
+"""
+Binary engine snapshots
+A snapshot is a small JSON header followed by 64-byte aligned raw arrays.
+Loading maps the file read-only and wraps each array in place, so a worker
+starts without parsing the catalog or rebuilding any index.
+"""
+
+import hashlib
+import json
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b'IPRSNAP\0'
+# Bump whenever the set or meaning of snapshot arrays changes
+SNAPSHOT_SCHEMA_VERSION = 3
+ARRAY_ALIGNMENT = 64
+
+# magic, schema version, header length
+_PREAMBLE = struct.Struct('<8sIQ')
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_signature(path: str) -> Dict:
+    """Identity of the catalog file a snapshot was built from"""
+    stat = os.stat(path)
+    return {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_sha1(path)}
+
+
+def check_source(recorded: Dict, path: str):
+    """Raise ValueError if the catalog file no longer matches the snapshot"""
+    stat = os.stat(path)
+    if stat.st_size == recorded['size'] and stat.st_mtime_ns == recorded['mtime_ns']:
+        return
+    # Touched but possibly unchanged: only the content hash decides
+    if stat.st_size != recorded['size'] or file_sha1(path) != recorded['sha1']:
+        raise ValueError(f"Snapshot is stale: {path} changed since it was taken")
+
+
+def array_layout(arrays: Dict[str, np.ndarray]) -> Tuple[Dict[str, Dict], int]:
+    """dtype, shape and aligned byte offset of every array, plus the total size"""
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    return layout, offset
+
+
+def arrays_from_buffer(buffer, layout: Dict[str, Dict]) -> Dict[str, np.ndarray]:
+    """Zero-copy arrays over a buffer laid out by array_layout"""
+    arrays = {}
+    for name, entry in layout.items():
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        if count == 0:
+            arrays[name] = np.zeros(entry['shape'], dtype=dtype)
+        else:
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                         offset=entry['offset']).reshape(entry['shape'])
+    return arrays
+
+
+def write_snapshot(path: str, arrays: Dict[str, np.ndarray], metadata: Dict):
+    """Write arrays and metadata atomically (workers never map a half-written file)"""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout, offset = array_layout(arrays)
+
+    header = json.dumps({'arrays': layout, 'metadata': metadata}).encode('utf-8')
+    data_start = _aligned(_PREAMBLE.size + len(header))
+
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, 'wb') as target:
+        target.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_SCHEMA_VERSION, len(header)))
+        target.write(header)
+        for name, array in arrays.items():
+            target.seek(data_start + layout[name]['offset'])
+            target.write(array.tobytes())
+        target.truncate(data_start + offset)
+    os.replace(temp_path, path)
+
+
+def read_snapshot(path: str) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """Map a snapshot read-only; returns zero-copy arrays and the metadata"""
+    with open(path, 'rb') as source:
+        magic, version, header_length = _PREAMBLE.unpack(source.read(_PREAMBLE.size))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not an engine snapshot")
+        if version != SNAPSHOT_SCHEMA_VERSION:
+            raise ValueError(f"Snapshot schema version {version} is not supported "
+                             f"(expected {SNAPSHOT_SCHEMA_VERSION}); rebuild it with save_snapshot")
+        header = json.loads(source.read(header_length).decode('utf-8'))
+
+    data_start = _aligned(_PREAMBLE.size + header_length)
+    mapped: Optional[np.memmap] = None
+    if os.path.getsize(path) > data_start:
+        mapped = np.memmap(path, dtype=np.uint8, mode='r', offset=data_start)
+
+    return arrays_from_buffer(mapped, header['arrays']), header['metadata']
@@ -0,0 +1,272 @@
+"""
+Streaming out-of-core recommendations
+The catalog file (CSV, Arrow/Feather or Parquet) is read in fixed-size chunks;
+each chunk is scored with the vectorized scorer and only a bounded top-N heap
+per query is kept, so peak memory is O(chunk + N) whatever the catalog size.
+Normalization maxima come from stored statistics or a first pass over the
+file, so scores match in-memory scoring exactly.
+Stats:     python streaming_engine.py --catalog catalog.csv stats
+Recommend: python streaming_engine.py --catalog catalog.csv recommend "I am 30, software engineer"
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from product_catalog import ProductCatalog, StringTable
+from product_index import ProductKeywordIndex, SUBSTRING_MATCH
+from query_parser import ParsedQuery
+from recommendation_engine import (InsuranceRecommendationEngine, CatalogState, BATCH_SCORE_CELLS,
+                                   PROFESSION_MATCHES, SITUATION_MATCHES, AGE_BAND_MATCHES,
+                                   get_age_band, ranking_key, select_top)
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Catalog statistics are stored next to the catalog: catalog.csv.stats.json
+STATISTICS_SUFFIX = '.stats.json'
+
+
+def compute_statistics(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """
+    First pass over the catalog: product count, the scorer's normalization
+    maxima and a content hash (of the chunks' fingerprints, in the same pass)
+    """
+    stat = os.stat(path)
+    source = {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    digest = hashlib.sha1()
+    products, max_premium, max_coverage, max_copay = 0, None, None, None
+    for chunk in ProductCatalog.iter_file(path, chunk_size):
+        products += len(chunk)
+        max_premium = max(int(chunk.monthly_premium.max()), max_premium or 0)
+        max_coverage = max(int(chunk.coverage.max()), max_coverage or 0)
+        max_copay = max(int(chunk.co_pay.max()), max_copay or 0)
+        digest.update(chunk.fingerprint().encode('ascii'))
+    if not products:
+        raise ValueError(f"Catalog {path} has no products")
+    return {'source': source, 'content_hash': digest.hexdigest(), 'products': products, 'max_premium': max_premium,
+            'max_coverage': max_coverage, 'max_copay': max_copay}
+
+
+def save_statistics(path: str, statistics: Dict):
+    with open(path + STATISTICS_SUFFIX, 'w') as target:
+        json.dump(statistics, target, indent=2)
+
+
+def load_statistics(path: str) -> Optional[Dict]:
+    """Stored statistics for the catalog, None if missing or the file changed (size or mtime) since"""
+    if not os.path.exists(path + STATISTICS_SUFFIX):
+        return None
+    with open(path + STATISTICS_SUFFIX) as source:
+        statistics = json.load(source)
+    stat = os.stat(path)
+    recorded = statistics['source']
+    if 'content_hash' not in statistics or (stat.st_size, stat.st_mtime_ns) != (recorded['size'], recorded['mtime_ns']):
+        return None
+    return statistics
+
+
+def catalog_statistics(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    return load_statistics(path) or compute_statistics(path, chunk_size)
+
+
+def queried_families(prefs_list: List[ParsedQuery]) -> Dict[str, Dict[str, List[str]]]:
+    """The keyword families restricted to the values these queries look up"""
+    families = (('profession', PROFESSION_MATCHES, lambda prefs: prefs.get('profession')),
+                ('life_situation', SITUATION_MATCHES, lambda prefs: prefs.get('life_situation')),
+                ('age_band', AGE_BAND_MATCHES, lambda prefs: get_age_band(prefs.get('age'))))
+    return {family: {value: matches[value] for value in sorted({str(lookup(prefs)) for prefs in prefs_list})
+                     if value in matches}
+            for family, matches, lookup in families}
+
+
+class ChunkKeywords:
+    """Keyword family masks of one chunk, matched once per distinct product name"""
+
+    def __init__(self, names: StringTable, families: Dict[str, Dict[str, List[str]]], match_mode: str):
+        distinct = ProductKeywordIndex(names.values(), families, match_mode=match_mode)
+        self.family_masks = {family: {value: mask[names.codes] for value, mask in masks.items()}
+                             for family, masks in distinct.family_masks.items()}
+
+    def mask(self, family: str, value: str) -> Optional[np.ndarray]:
+        return self.family_masks.get(family, {}).get(value)
+
+
+class ChunkAges:
+    """Age eligibility of one chunk, evaluated per query instead of precomputing every age segment"""
+
+    def __init__(self, catalog: ProductCatalog):
+        self.age_min = catalog.age_min
+        self.age_max = catalog.age_max
+
+    def positions(self, age: Optional[int]) -> np.ndarray:
+        if age is None:
+            return np.arange(len(self.age_min))
+        return np.flatnonzero((self.age_min <= age) & (self.age_max >= age))
+
+
+class ChunkState:
+    """
+    What score_products reads from one chunk: the catalog, its feature columns
+    and the keyword masks of the queried values (no feature matrix)
+    """
+
+    def __init__(self, catalog: ProductCatalog, keyword_index: ChunkKeywords, features: Dict):
+        self.catalog = catalog
+        self.keyword_index = keyword_index
+        self.age_index = ChunkAges(catalog)
+        self.features = dict(features)
+        self.features.update(keyword_index.family_masks)
+
+
+class StreamingRecommendationEngine(InsuranceRecommendationEngine):
+    """
+    Recommendation engine over a catalog that is never fully loaded
+    Every query streams the catalog once, so batch queries together with
+    get_recommendations_batch. Snapshots, hot reload, runtime edits and
+    cohort tables need the in-memory engine.
+    """
+
+    def __init__(self, csv_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, keyword_match: str = SUBSTRING_MATCH,
+                 statistics: Optional[Dict] = None, cache_size: int = 1024, cache_ttl: Optional[float] = None):
+        self.catalog_path = csv_path
+        self.chunk_size = chunk_size
+        self._init_serving_state(True, keyword_match, cache_size, cache_ttl)
+        self._use_statistics(statistics or catalog_statistics(csv_path, chunk_size))
+
+    def _use_statistics(self, statistics: Dict):
+        self.statistics = statistics
+        self.maxima = (statistics['max_premium'], statistics['max_coverage'], statistics['max_copay'])
+        # Cached results are tied to the file content the statistics describe
+        self.catalog_version = statistics['content_hash'][:16]
+
+    def _chunks(self, prefs_list: List[ParsedQuery],
+                batch: bool) -> Iterator[Tuple[int, Union[ChunkState, CatalogState]]]:
+        """
+        (offset, scoring state) per catalog chunk, normalized with the whole
+        catalog's maxima. Only what the scorer reads is built: feature columns
+        and the keyword masks of the queried values, plus the (narrow) feature
+        matrix when batch scoring.
+        """
+        stat = os.stat(self.catalog_path)
+        recorded = self.statistics['source']
+        if (stat.st_size, stat.st_mtime_ns) != (recorded['size'], recorded['mtime_ns']):
+            # The maxima may be stale; take them from the file as it is now
+            self._use_statistics(compute_statistics(self.catalog_path, self.chunk_size))
+
+        families = queried_families(prefs_list)
+        offset = 0
+        for index, chunk in enumerate(ProductCatalog.iter_file(self.catalog_path, self.chunk_size)):
+            keyword_index = ChunkKeywords(chunk.names, families, self.keyword_match)
+            features = CatalogState._feature_columns(chunk, self.maxima)
+            if batch:
+                yield offset, CatalogState(chunk, self.keyword_match, keyword_index, ChunkAges(chunk), self.maxima,
+                                           features, catalog_version=f"{self.catalog_version}:{index}")
+            else:
+                yield offset, ChunkState(chunk, keyword_index, features)
+            offset += len(chunk)
+
+    def _push_top(self, heap: List, state: Union[ChunkState, CatalogState], offset: int, positions: np.ndarray,
+                  scores: np.ndarray, top_n: int):
+        """Merge a chunk's top_n into the bounded heap of (score, -id, -offset position, recommendation)"""
+        winners = select_top(scores, state.catalog.id[positions], top_n)
+        top = positions[winners]
+        recommendations = self._recommendations_at(top, scores[winners], state)
+        for position, recommendation in zip(top.tolist(), recommendations):
+            # Same order as select_top over the whole catalog: score, then id, then catalog position
+            entry = (recommendation['relevance_score'], -recommendation['id'], -(offset + position), recommendation)
+            if len(heap) < top_n:
+                heapq.heappush(heap, entry)
+            elif entry[:3] > heap[0][:3]:
+                heapq.heapreplace(heap, entry)
+            else:
+                break
+
+    @staticmethod
+    def _ranked(heap: List) -> List[Dict]:
+        return [entry[3] for entry in sorted(heap, key=lambda entry: entry[:3], reverse=True)]
+
+    def get_recommendations(self, query: Union[str, ParsedQuery], top_n: int = 3) -> List[Dict]:
+        """
+        Main recommendation function, one pass over the catalog
+        Results are ordered by descending relevance_score, ties by ascending product id
+        """
+        user_prefs = self.parse_query(query)
+        cache_key = (ranking_key(user_prefs), top_n)
+        recommendations = self.result_cache.get(cache_key, self.catalog_version)
+        if recommendations is None:
+            recommendations = self._rank(user_prefs, top_n)
+            self.result_cache.put(cache_key, recommendations, self.catalog_version)
+        return recommendations
+
+    def _rank(self, user_prefs: ParsedQuery, top_n: int, state: Optional[CatalogState] = None) -> List[Dict]:
+        """Score the catalog chunk by chunk, keeping the running top_n"""
+        heap = []
+        if top_n <= 0:
+            return []
+        for offset, chunk in self._chunks([user_prefs], batch=False):
+            positions = chunk.age_index.positions(user_prefs.get('age'))
+            if len(positions):
+                self._push_top(heap, chunk, offset, positions,
+                               self.score_products(user_prefs, chunk)[positions], top_n)
+        return self._ranked(heap)
+
+    def get_recommendations_batch(self, queries: List[Union[str, ParsedQuery]], top_n: int = 3) -> List[List[Dict]]:
+        """
+        Recommendations for many queries from a single pass over the catalog.
+        Equivalent to calling get_recommendations for each query in turn.
+        """
+        prefs_list = [self.parse_query(query) for query in queries]
+        heaps = [[] for _ in prefs_list]
+        if top_n <= 0:
+            return heaps
+        block_size = max(1, BATCH_SCORE_CELLS // self.chunk_size)
+
+        for offset, chunk in self._chunks(prefs_list, batch=True):
+            for start in range(0, len(prefs_list), block_size):
+                block = prefs_list[start:start + block_size]
+                scores = self.score_products_batch(block, chunk)
+                for row, user_prefs in enumerate(block):
+                    positions = chunk.age_index.positions(user_prefs.get('age'))
+                    if len(positions):
+                        self._push_top(heaps[start + row], chunk, offset, positions, scores[row, positions], top_n)
+
+        return [self._ranked(heap) for heap in heaps]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalog', default='insurance_products.csv')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--keyword-match', default='substring', choices=['substring', 'token'])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('stats', help='first pass over the catalog; store its statistics')
+
+    recommend_parser = subparsers.add_parser('recommend', help='stream the catalog for one query')
+    recommend_parser.add_argument('query')
+    recommend_parser.add_argument('--top-n', type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == 'stats':
+        start = time.perf_counter()
+        statistics = compute_statistics(args.catalog, args.chunk_size)
+        save_statistics(args.catalog, statistics)
+        print(f"✅ {statistics['products']:,} products scanned in {time.perf_counter() - start:.1f}s "
+              f"-> {args.catalog + STATISTICS_SUFFIX}")
+    elif args.command == 'recommend':
+        engine = StreamingRecommendationEngine(args.catalog, args.chunk_size, args.keyword_match, cache_size=0)
+        start = time.perf_counter()
+        recommendations = engine.get_recommendations(args.query, top_n=args.top_n)
+        for rank, product in enumerate(recommendations, 1):
+            print(f"{rank}. {product['name']} (id {product['id']}) score {product['relevance_score']:.2f}")
+        print(f"Streamed in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()